@@ -0,0 +1,509 @@
+"""End-to-end throughput benchmark of MigrationController.migrate() on synthetic content
+items, segments and renditions. Tables are created in DynamoDB Local, or in moto when no
+endpoint is given, and migrated into a local mongod with the flat and hierarchical flows.
+Every run reports documents per second, throughput and latency percentiles of the read,
+convert, write and mark stages and its peak RSS. Results are stored as JSON and compared
+against a baseline file of a previous run.
+
+Run from the repository root:
+    python -m migration.benchmarks.end_to_end_benchmark --endpoint-url http://localhost:8000 \
+        --items 200 --output results.json --baseline baseline.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from functools import wraps
+from typing import Callable, Dict, List
+
+import boto3
+from pymongo import MongoClient
+
+from migration.benchmarks.normalizer_benchmark import generate_content_segment
+from migration.migration_utility.configuration.db_configuration import DbConfigurator
+from migration.migration_utility.configuration.document_configuration import (
+    DocumentConfiguration,
+)
+from migration.migration_utility.configuration.migration_configuration import (
+    MigrationConfigurator,
+)
+from migration.migration_utility.controller.migration_controller import MigrationController
+from migration_utility.enums import Databases, ReadMode
+
+DESTINATION_DATABASE_NAME = "migration_benchmark"
+INTERNAL_DATABASE_NAME = "migration_benchmark_internal"
+CREATED_AT = "2021-06-09T00:00:00+00:00"
+
+
+def generate_content_item(rnd: random.Random, item_id: str, words: int) -> dict:
+    """Generates a content item shaped like the ones read from DynamoDB."""
+
+    return {
+        "id": item_id,
+        "model_type": "CONTENT_ITEM",
+        "created_at": CREATED_AT,
+        "organization_id": "".join(rnd.choices("0123456789abcdef", k=32)),
+        "title": " ".join(f"word{rnd.randint(0, 999)}" for _ in range(12)),
+        "description": " ".join(f"word{rnd.randint(0, 999)}" for _ in range(words)),
+        "duration": Decimal(str(round(rnd.random() * 3600, 3))),
+        "status": rnd.choice(["READY", "PROCESSING", "FAILED"]),
+        "labels": {f"label{i}": Decimal(str(round(rnd.random(), 4))) for i in range(10)},
+    }
+
+
+def generate_content_rendition(rnd: random.Random, item_id: str) -> dict:
+    """Generates a content rendition shaped like the ones read from DynamoDB."""
+
+    return {
+        "id": "".join(rnd.choices("0123456789abcdef", k=32)),
+        "content_item_id": item_id,
+        "model_type": "CONTENT_RENDITION",
+        "created_at": CREATED_AT,
+        "format": rnd.choice(["mp4", "webm", "hls"]),
+        "width": Decimal(rnd.choice([640, 1280, 1920])),
+        "height": Decimal(rnd.choice([360, 720, 1080])),
+        "bitrate": Decimal(rnd.randint(500, 8000)),
+        "url": f"https://cdn.example.com/{item_id}/{rnd.randint(0, 10 ** 6)}",
+    }
+
+
+def table_names(prefix: str) -> Dict[str, str]:
+    """Returns table names of the document types."""
+
+    return {
+        "content_item": f"{prefix}content-items",
+        "content_segment": f"{prefix}content-segments",
+        "content_rendition": f"{prefix}content-renditions",
+    }
+
+
+def create_tables(dynamodb, prefix: str):
+    """Creates the source tables with the indexes the document configurations query."""
+
+    for doc_type, table_name in table_names(prefix).items():
+        attributes = ["id", "model_type", "created_at"]
+        indexes = [
+            {
+                "IndexName": "model-type-created-at-index",
+                "KeySchema": [
+                    {"AttributeName": "model_type", "KeyType": "HASH"},
+                    {"AttributeName": "created_at", "KeyType": "RANGE"},
+                ],
+                "Projection": {"ProjectionType": "ALL"},
+            }
+        ]
+
+        if doc_type != "content_item":
+            attributes.append("content_item_id")
+            indexes.append(
+                {
+                    "IndexName": "content-item-index",
+                    "KeySchema": [{"AttributeName": "content_item_id", "KeyType": "HASH"}],
+                    "Projection": {"ProjectionType": "ALL"},
+                }
+            )
+
+        dynamodb.create_table(
+            TableName=table_name,
+            KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+            AttributeDefinitions=[
+                {"AttributeName": attribute, "AttributeType": "S"} for attribute in attributes
+            ],
+            GlobalSecondaryIndexes=indexes,
+            BillingMode="PAY_PER_REQUEST",
+        ).wait_until_exists()
+
+
+def populate_tables(
+    dynamodb, prefix: str, items: int, segments: int, renditions: int, words: int
+) -> List[str]:
+    """Fills the source tables with synthetic documents.
+
+    Returns: IDs of the generated content items
+    """
+
+    rnd = random.Random(42)
+    names = table_names(prefix)
+    item_ids = ["".join(rnd.choices("0123456789abcdef", k=32)) for _ in range(items)]
+
+    with dynamodb.Table(names["content_item"]).batch_writer() as writer:
+        for item_id in item_ids:
+            writer.put_item(Item=generate_content_item(rnd, item_id, words))
+
+    with dynamodb.Table(names["content_segment"]).batch_writer() as writer:
+        for item_id in item_ids:
+            for _ in range(segments):
+                writer.put_item(
+                    Item={**generate_content_segment(rnd, words), "content_item_id": item_id}
+                )
+
+    with dynamodb.Table(names["content_rendition"]).batch_writer() as writer:
+        for item_id in item_ids:
+            for _ in range(renditions):
+                writer.put_item(Item=generate_content_rendition(rnd, item_id))
+
+    return item_ids
+
+
+def flat_document_configs(prefix: str) -> List[DocumentConfiguration]:
+    """Returns configurations of the flat flow, like configs/doc_cfg_all.py."""
+
+    return [
+        DocumentConfiguration(
+            type=doc_type,
+            collection_name=table_name,
+            query_index_name="model-type-created-at-index",
+            queries=[
+                {"field_name": "model_type", "operation": "eq", "value": doc_type.upper()},
+                {"field_name": "created_at", "operation": "gte", "value": CREATED_AT},
+            ],
+        )
+        for doc_type, table_name in table_names(prefix).items()
+    ]
+
+
+def hierarchical_document_configs(prefix: str, item_ids: List[str]) -> List[DocumentConfiguration]:
+    """Returns configurations of the hierarchical flow, like configs/doc_cfg_hier.py."""
+
+    names = table_names(prefix)
+    document_cfgs = []
+
+    for item_id in item_ids:
+        document_cfgs.append(
+            DocumentConfiguration(
+                type="content_item",
+                collection_name=names["content_item"],
+                queries=[{"field_name": "id", "operation": "eq", "value": item_id}],
+            )
+        )
+
+        for doc_type in ("content_segment", "content_rendition"):
+            document_cfgs.append(
+                DocumentConfiguration(
+                    type=doc_type,
+                    collection_name=names[doc_type],
+                    related_document={"type": "content_item", "relation_field": "content_item_id"},
+                    queries=[
+                        {"field_name": "content_item_id", "operation": "eq", "value": item_id}
+                    ],
+                    query_index_name="content-item-index",
+                )
+            )
+
+    return document_cfgs
+
+
+class StageRecorder:
+    """Records durations and document counts of the calls that make up the stages of a
+    migration. Calls are timed by wrapping methods of the client instances, the
+    migration code itself is not changed."""
+
+    def __init__(self):
+        """Initializes an empty recorder."""
+
+        self.calls: Dict[str, List[tuple]] = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, obj, method_name: str, stage: str, count: Callable):
+        """Replaces the method of the instance with a timed one.
+
+        Args:
+            obj: instance whose method is timed
+            method_name: name of the method
+            stage: name of the stage the calls belong to
+            count: function of the arguments and the result returning the document count
+        """
+
+        method = getattr(obj, method_name)
+
+        @wraps(method)
+        def timed(*args, **kwargs):
+            started_at = time.perf_counter()
+            result = method(*args, **kwargs)
+            duration = time.perf_counter() - started_at
+
+            with self._lock:
+                self.calls.setdefault(stage, []).append((duration, count(args, kwargs, result)))
+
+            return result
+
+        setattr(obj, method_name, timed)
+
+    def instrument(self, controller: MigrationController):
+        """Times the reads, conversions, writes and marks of the controller."""
+
+        read_count = lambda args, kwargs, result: len(result.documents) if result else 0
+
+        for method_name in ("find", "find_document", "batch_get", "query_all"):
+            if hasattr(controller.source_db_client, method_name):
+                self.wrap(controller.source_db_client, method_name, "read", read_count)
+
+        self.wrap(
+            controller.container_manager,
+            "convert_documents",
+            "convert",
+            lambda args, kwargs, result: len(result),
+        )
+        self.wrap(
+            controller.destination_db_client,
+            "batch_write",
+            "write",
+            lambda args, kwargs, result: result.processed_count,
+        )
+        self.wrap(
+            controller.source_db_client,
+            "batch_update",
+            "mark",
+            lambda args, kwargs, result: len(kwargs.get("updates") or args[1]),
+        )
+
+    def summary(self) -> Dict[str, dict]:
+        """Returns throughput and latency percentiles of every stage."""
+
+        stages = {}
+
+        for stage, calls in self.calls.items():
+            durations = sorted(duration for duration, _ in calls)
+            documents = sum(count for _, count in calls)
+            busy_seconds = sum(durations)
+
+            stages[stage] = {
+                "calls": len(calls),
+                "documents": documents,
+                "busy_seconds": round(busy_seconds, 4),
+                "docs_per_sec": round(documents / busy_seconds, 1) if busy_seconds else None,
+                "p50_ms": round(percentile(durations, 50) * 1000, 3),
+                "p95_ms": round(percentile(durations, 95) * 1000, 3),
+                "p99_ms": round(percentile(durations, 99) * 1000, 3),
+            }
+
+        return stages
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Returns the nearest-rank percentile of sorted values."""
+
+    if not sorted_values:
+        return 0.0
+
+    rank = max(int(round(q / 100 * len(sorted_values) + 0.5)) - 1, 0)
+
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def run_scenario(args: argparse.Namespace, flow: str, mode: str, item_ids: List[str]) -> dict:
+    """Migrates all synthetic documents once. Runs in a forked process, so the peak RSS
+    belongs to this run only."""
+
+    mongo_client = MongoClient(host=args.mongo_uri)
+    mongo_client.drop_database(DESTINATION_DATABASE_NAME)
+    mongo_client.drop_database(INTERNAL_DATABASE_NAME)
+
+    document_cfgs = (
+        hierarchical_document_configs(args.table_prefix, item_ids)
+        if flow == "hierarchical"
+        else flat_document_configs(args.table_prefix)
+    )
+    controller = MigrationController(
+        source_db_config=DbConfigurator(
+            database=Databases.DYNAMODB,
+            batch_size=args.batch_size,
+            read_mode=ReadMode(args.read_mode),
+            endpoint_url=args.endpoint_url,
+        ),
+        destination_db_config=DbConfigurator(
+            database=Databases.MONGODB,
+            database_name=DESTINATION_DATABASE_NAME,
+            connection_string=args.mongo_uri,
+            batch_size=args.batch_size,
+        ),
+        internal_db_config=DbConfigurator(
+            database=Databases.MONGODB,
+            database_name=INTERNAL_DATABASE_NAME,
+            connection_string=args.mongo_uri,
+            batch_size=args.batch_size,
+        ),
+        document_configs=iter(document_cfgs),
+        flow=flow,
+        migration_config=MigrationConfigurator(
+            pipelined=mode == "pipelined",
+            batched_hierarchy=mode == "batched",
+        ),
+    )
+
+    recorder = StageRecorder()
+    recorder.instrument(controller)
+
+    started_at = time.perf_counter()
+    controller.migrate(force_migration=True)
+    seconds = time.perf_counter() - started_at
+
+    database = controller.destination_db_client.client_connector
+    documents = sum(
+        database[name].count_documents({}) for name in table_names(args.table_prefix).values()
+    )
+
+    return {
+        "documents": documents,
+        "seconds": round(seconds, 3),
+        "docs_per_sec": round(documents / seconds, 1),
+        # Linux reports kilobytes
+        "peak_rss_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stages": recorder.summary(),
+    }
+
+
+def _run_in_child(connection, *args):
+    """Sends the result of a scenario, or its failure, back to the parent process."""
+
+    try:
+        connection.send(run_scenario(*args))
+    except BaseException as exc:
+        connection.send({"error": repr(exc)})
+    finally:
+        connection.close()
+
+
+def run_isolated(args: argparse.Namespace, flow: str, mode: str, item_ids: List[str]) -> dict:
+    """Runs the scenario in a forked process. Forking keeps tables of the in-process
+    moto backend visible to the run."""
+
+    context = multiprocessing.get_context("fork")
+    parent_connection, child_connection = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_run_in_child, args=(child_connection, args, flow, mode, item_ids)
+    )
+    process.start()
+    result = parent_connection.recv()
+    process.join()
+
+    return result
+
+
+def compare(results: dict, baseline: dict):
+    """Prints throughput of the runs relative to the baseline."""
+
+    print(f"\nCompared to the baseline of {baseline.get('started_at')}")
+
+    for name, scenario in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+
+        if not base or "error" in scenario or "error" in base:
+            continue
+
+        print(
+            f"{name:<26} {scenario['docs_per_sec']:10.1f} docs/s  "
+            f"{scenario['docs_per_sec'] / base['docs_per_sec']:6.2f}x  "
+            f"rss {scenario['peak_rss_mib'] - base['peak_rss_mib']:+8.1f} MiB"
+        )
+
+        for stage, stats in scenario["stages"].items():
+            base_stats = base["stages"].get(stage)
+
+            if base_stats and stats["docs_per_sec"] and base_stats["docs_per_sec"]:
+                print(
+                    f"  {stage:<24} {stats['docs_per_sec']:10.1f} docs/s  "
+                    f"{stats['docs_per_sec'] / base_stats['docs_per_sec']:6.2f}x  "
+                    f"p95 {stats['p95_ms'] - base_stats['p95_ms']:+9.2f} ms"
+                )
+
+
+def run_benchmark(args: argparse.Namespace) -> dict:
+    """Generates the source tables and migrates them once per flow and mode."""
+
+    dynamodb = boto3.resource("dynamodb", endpoint_url=args.endpoint_url)
+    started_at = time.perf_counter()
+    create_tables(dynamodb, args.table_prefix)
+    item_ids = populate_tables(
+        dynamodb, args.table_prefix, args.items, args.segments, args.renditions, args.words
+    )
+    print(f"Generated {args.items * (1 + args.segments + args.renditions)} documents "
+          f"in {time.perf_counter() - started_at:.1f}s")
+
+    results = {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "parameters": {
+            key: value for key, value in vars(args).items() if key not in ("output", "baseline")
+        },
+        "scenarios": {},
+    }
+
+    try:
+        for flow in args.flows:
+            for mode in args.modes:
+                if mode == "batched" and flow != "hierarchical":
+                    continue
+
+                name = f"{flow}/{mode}"
+                scenario = run_isolated(args, flow, mode, item_ids)
+                results["scenarios"][name] = scenario
+
+                if "error" in scenario:
+                    print(f"{name:<26} failed --> {scenario['error']}")
+                    continue
+
+                print(
+                    f"{name:<26} {scenario['documents']:8} docs  {scenario['seconds']:8.2f}s  "
+                    f"{scenario['docs_per_sec']:10.1f} docs/s  {scenario['peak_rss_mib']:8.1f} MiB"
+                )
+
+                for stage, stats in scenario["stages"].items():
+                    print(
+                        f"  {stage:<24} {stats['documents']:8} docs  {stats['calls']:6} calls  "
+                        f"p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  "
+                        f"p99 {stats['p99_ms']:8.2f} ms"
+                    )
+    finally:
+        for table_name in table_names(args.table_prefix).values():
+            dynamodb.Table(table_name).delete()
+
+    return results
+
+
+def main(args: argparse.Namespace):
+    # DynamoDB Local and moto accept any credentials
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+
+    if args.endpoint_url:
+        results = run_benchmark(args)
+    else:
+        from moto import mock_aws
+
+        with mock_aws():
+            results = run_benchmark(args)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            compare(results, json.load(baseline))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--endpoint-url", default=None, help="DynamoDB Local endpoint, moto is used when omitted")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017", help="Connection string of the local mongod")
+    parser.add_argument("--table-prefix", default="benchmark-", help="Prefix of the generated tables")
+    parser.add_argument("--items", type=int, default=100, help="Number of generated content items")
+    parser.add_argument("--segments", type=int, default=10, help="Number of content segments per item")
+    parser.add_argument("--renditions", type=int, default=3, help="Number of content renditions per item")
+    parser.add_argument("--words", type=int, default=200, help="Number of words per item and segment, controls document sizes")
+    parser.add_argument("--batch-size", type=int, default=100, help="Batch size of the source and destination clients")
+    parser.add_argument("--read-mode", default=ReadMode.RAW.value, choices=[mode.value for mode in ReadMode], help="DynamoDB read mode")
+    parser.add_argument("--flows", nargs="+", default=["flat", "hierarchical"], choices=["flat", "hierarchical"], help="Migration flows to run")
+    parser.add_argument("--modes", nargs="+", default=["sequential", "pipelined"], choices=["sequential", "pipelined", "batched"], help="Ways of running the flows, batched applies to the hierarchical flow")
+    parser.add_argument("--output", default=None, help="Path of the JSON file the results are stored in")
+    parser.add_argument("--baseline", default=None, help="Path of the JSON results of a previous run to compare against")
+
+    main(parser.parse_args())
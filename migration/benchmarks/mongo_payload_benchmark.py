@@ -0,0 +1,94 @@
+"""Benchmark of MongoDB bulk payload construction with shallow projections against the
+deepcopy it replaced. Reports CPU time and peak traced memory per batch.
+
+Run from the repository root:
+    python -m migration.benchmarks.mongo_payload_benchmark --documents 2000 --batch-size 100
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from copy import deepcopy
+
+from pymongo import UpdateOne
+
+from migration.benchmarks.normalizer_benchmark import generate_content_segment
+from migration.migration_utility.db_clients.mongodb.mongodb_client import MongoDbClient
+
+
+def deepcopy_update_payload(documents):
+    """The payload construction previously done by MongoDbClient."""
+
+    bulk_list = []
+
+    for doc in deepcopy(documents):
+        doc_id = doc["_id"]
+
+        if doc.get("is_migrated") is True:
+            doc.pop("_id")
+
+        if doc.get("is_migrated"):
+            doc.pop("is_migrated")
+
+        if doc.get("migrated_at"):
+            doc.pop("migrated_at")
+
+        bulk_list.append(UpdateOne({"_id": doc_id}, {"$set": doc}, upsert=True))
+
+    return bulk_list
+
+
+def measure(func, batches):
+    """Returns CPU seconds and peak traced bytes per batch, averaged over the batches."""
+
+    cpu_time = 0
+    peak = 0
+
+    for batch in batches:
+        tracemalloc.start()
+        started_at = time.process_time()
+        payload = func(batch)
+        cpu_time += time.process_time() - started_at
+        peak += tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del payload
+
+    return cpu_time / len(batches), peak / len(batches)
+
+
+def main(document_count: int, batch_size: int):
+    rnd = random.Random(42)
+    documents = [generate_content_segment(rnd) for _ in range(document_count)]
+
+    for i, doc in enumerate(documents):
+        doc["_id"] = doc["id"]
+        doc["is_migrated"] = i % 2 == 0
+
+    batches = [documents[i: i + batch_size] for i in range(0, len(documents), batch_size)]
+    client = MongoDbClient(batch_size=batch_size, connection_string="", database_name="")
+
+    print(f"{len(batches)} batches of {batch_size} content segments")
+
+    results = {}
+
+    for name, func in (
+        ("deepcopy", deepcopy_update_payload),
+        ("shallow projection", client._compose_bulk_update_payload),
+    ):
+        cpu_time, peak = measure(func, batches)
+        results[name] = (cpu_time, peak)
+        print(f"{name:<20} {cpu_time * 1000:9.2f} ms CPU/batch  {peak / 1024:10.1f} KiB peak/batch")
+
+    (old_cpu, old_peak), (new_cpu, new_peak) = results.values()
+    print(f"{'':<20} {old_cpu / new_cpu:9.2f}x less CPU  {old_peak / new_peak:10.2f}x less memory")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--documents", type=int, default=2000, help="Number of generated documents")
+    parser.add_argument("--batch-size", type=int, default=100, help="Number of documents per batch")
+
+    args = parser.parse_args()
+
+    main(document_count=args.documents, batch_size=args.batch_size)
@@ -0,0 +1,101 @@
+"""Microbenchmark of DocumentNormalizer against the simplejson round trip it replaced,
+and of the raw AttributeValue translation against deserialization followed by normalizing.
+
+Run from the repository root:
+    python -m migration.benchmarks.normalizer_benchmark --documents 2000
+"""
+import argparse
+import random
+import string
+import timeit
+from decimal import Decimal
+
+import simplejson
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from migration.migration_utility.converters import DocumentNormalizer
+from migration_utility.enums import NumberMode
+
+
+def generate_content_segment(rnd: random.Random, words: int = 200) -> dict:
+    """Generates a content segment shaped like the ones read from DynamoDB."""
+
+    def text(n: int) -> str:
+        return " ".join(
+            "".join(rnd.choices(string.ascii_lowercase, k=rnd.randint(3, 9)))
+            for _ in range(n)
+        )
+
+    return {
+        "id": "".join(rnd.choices("0123456789abcdef", k=32)),
+        "content_item_id": "".join(rnd.choices("0123456789abcdef", k=32)),
+        "model_type": "CONTENT_SEGMENT",
+        "created_at": "2021-06-09T00:00:00+00:00",
+        "position": Decimal(rnd.randint(0, 10_000)),
+        "confidence": Decimal(str(round(rnd.random(), 6))),
+        "text": text(words),
+        "tags": [text(1) for _ in range(5)],
+        "words": [
+            {
+                "word": text(1),
+                "start": Decimal(str(round(i * 0.37, 2))),
+                "end": Decimal(str(round(i * 0.37 + 0.3, 2))),
+                "score": Decimal(str(round(rnd.random(), 4))),
+                "speaker": Decimal(rnd.randint(0, 3)),
+            }
+            for i in range(words)
+        ],
+        "metadata": {"language": "en", "version": Decimal(3), "flags": [True, False, None]},
+    }
+
+
+def simplejson_round_trip(documents):
+    """The conversion previously done by ContainerManager."""
+
+    return [simplejson.loads(simplejson.dumps(doc, use_decimal=True)) for doc in documents]
+
+
+def main(document_count: int, repeat: int):
+    rnd = random.Random(42)
+    documents = [generate_content_segment(rnd) for _ in range(document_count)]
+
+    def report(name, func, docs):
+        best = min(timeit.repeat(lambda: func(docs), number=1, repeat=repeat))
+        print(f"{name:<28} {best * 1000:9.1f} ms total  {best / len(docs) * 1e6:8.1f} us/doc")
+        return best
+
+    print(f"{document_count} content segments, best of {repeat} runs")
+    baseline = report("simplejson round trip", simplejson_round_trip, documents)
+
+    for number_mode in NumberMode:
+        normalizer = DocumentNormalizer(number_mode=number_mode)
+        best = report(f"normalizer ({number_mode.value})", normalizer.normalize_documents, documents)
+        print(f"{'':<28} {baseline / best:9.2f}x faster than the round trip")
+
+    # Raw read mode translates wire-format items instead of deserializing them first
+    serializer = TypeSerializer()
+    deserializer = TypeDeserializer()
+    raw_items = [{k: serializer.serialize(v) for k, v in doc.items()} for doc in documents]
+
+    def deserialize_and_normalize(items):
+        return normalizer.normalize_documents(
+            [{k: deserializer.deserialize(v) for k, v in item.items()} for item in items]
+        )
+
+    def translate(items):
+        return [normalizer.translate_item(item) for item in items]
+
+    normalizer = DocumentNormalizer(number_mode=NumberMode.INT)
+    resource_best = report("deserialize + normalize", deserialize_and_normalize, raw_items)
+    raw_best = report("raw translate (int)", translate, raw_items)
+    print(f"{'':<28} {resource_best / raw_best:9.2f}x faster than deserializing")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--documents", type=int, default=2000, help="Number of generated documents")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs")
+
+    args = parser.parse_args()
+
+    main(document_count=args.documents, repeat=args.repeat)
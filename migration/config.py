@@ -1,23 +1,70 @@
 import os
-from migration_utility.enums import Databases, FieldQueryOperation
+from typing import Iterable
+
+from migration_utility.enums import (
+    Databases,
+    FieldQueryOperation,
+    MarkingMode,
+    NumberMode,
+    ReadMode,
+    UpdateMode,
+)
 
 #from configs.doc_cfg_all import FlatConfig
 from configs.doc_cfg_hier import HierarchicalConfig
 
-document_cfgs = HierarchicalConfig(id_file_path="/Users/tigrankhazhakyan/dev/work/repos/migration_repo/migration/id_list.txt").document_cfgs
-#document_cfgs = FlatConfig().document_cfgs
+# Overridden with --id_list_path
+id_list_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "id_list.txt")
+
+
+def document_cfgs(id_list_path: str = id_list_path) -> Iterable[dict]:
+    """Returns document configurations, generated lazily while they are migrated."""
+
+    return HierarchicalConfig(id_file_path=id_list_path).document_cfgs
+    #return FlatConfig().document_cfgs
 
 # DB CONFIGURATION SECTION
 
 source_db_cfg = {
     "database": Databases.DYNAMODB,
-    "batch_size": 50
+    "batch_size": 50,
+    # True resizes batches between min_batch_size and max_batch_size by latency
+    "adaptive_batch_size": False,
+    # Tables read with full scans are split into this many parallel segments
+    "scan_segments": 1,
+    # ReadMode.RAW reads with the low-level client and skips boto3 deserialization
+    "read_mode": ReadMode.RESOURCE,
+    # UpdateMode.CONCURRENT marks documents one by one from update_workers threads
+    # instead of in transactions of 25
+    "update_mode": UpdateMode.TRANSACTIONAL,
+    "update_workers": 16,
+    # Capacity governor is off unless budgets are set. Budgets are RCU and WCU per
+    # second of the whole run, shared by all of its processes and nodes. Take them
+    # from the provisioned capacity of the table minus what the application needs, e.g.
+    # "read_capacity_units": 500,
+    # "write_capacity_units": 100,
+    # Windows override the budgets at times of day, e.g. off-peak hours. Windows
+    # that end before they start continue past midnight, e.g.
+    # "capacity_schedule": [
+    #     {
+    #         "start": "22:00",
+    #         "end": "06:00",
+    #         "read_capacity_units": 2000,
+    #         "write_capacity_units": 400,
+    #     }
+    # ],
+    # Number of nodes that migrate the same tables and share the budgets above
+    # "capacity_nodes": 1,
+    # e.g. http://localhost:8000 to migrate from DynamoDB Local
+    "endpoint_url": os.environ.get("DYNAMODB_ENDPOINT_URL"),
 }
 destination_db_cfg = {
     "database": Databases.MONGODB,
     "database_name": f"redacted-ai-{os.environ.get('PROJECT_ID')}",
     "batch_size": 50,
     "connection_string": os.environ.get("DEST_CONN_STR"),
+    # False writes unordered bulks that continue past failed documents
+    "ordered_writes": True,
 }
 internal_db_cfg = {
     "database": Databases.MONGODB,
@@ -25,3 +72,23 @@ internal_db_cfg = {
     "batch_size": 50,
     "connection_string": os.environ.get("INT_CONN_STR")
 }
+
+# MIGRATION PROCESS SECTION
+
+migration_cfg = {
+    "pipelined": False,
+    "queue_size": 4,
+    "convert_workers": 1,
+    "write_workers": 2,
+    "mark_workers": 2,
+    # True reads parents with BatchGetItem and writes families group by group
+    "batched_hierarchy": False,
+    "parent_group_size": 100,
+    "child_query_workers": 16,
+    "number_mode": NumberMode.INT,
+    "marking_mode": MarkingMode.SOURCE,
+    "incremental": False,
+    "asynchronous": False,
+    "async_concurrency": 32,
+    "use_uvloop": True,
+}
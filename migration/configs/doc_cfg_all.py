@@ -17,6 +17,7 @@ class FlatConfig:
             "type": "content_item",
             "collection_name": f"redacted-content-items-{os.environ.get('PROJECT_ID')}",
             "query_index_name": "model-type-created-at-index",
+            "watermark_field": "created_at",
             "queries": [
                 {
                     "field_name": "model_type",
@@ -47,6 +48,7 @@ class FlatConfig:
                 }
             ],
             "query_index_name": "model-type-created-at-index",
+            "watermark_field": "created_at",
         }
 
         content_rendition_cfg = {
@@ -65,6 +67,7 @@ class FlatConfig:
                 },
             ],
             "query_index_name": "model-type-created-at-index",
+            "watermark_field": "created_at",
         }
 
         organization_cfg = {
@@ -77,7 +80,8 @@ class FlatConfig:
                     "value": "ORGANIZATION",
                 }
             ],
-            "query_index_name": "model-type-created-at-index"
+            "query_index_name": "model-type-created-at-index",
+            "watermark_field": "created_at"
         }
 
         user_cfg = {
@@ -90,7 +94,8 @@ class FlatConfig:
                     "value": "USER",
                 }
             ],
-            "query_index_name": "model-type-created-at-index"
+            "query_index_name": "model-type-created-at-index",
+            "watermark_field": "created_at"
         }
 
         allow_deny_list_cfg = {
@@ -103,7 +108,8 @@ class FlatConfig:
                     "value": "ALLOW_DENY_LIST",
                 }
             ],
-            "query_index_name": "model-type-created-at-index"
+            "query_index_name": "model-type-created-at-index",
+            "watermark_field": "created_at"
         }
 
         allow_deny_keyword_cfg = {
@@ -116,7 +122,8 @@ class FlatConfig:
                     "value": "ALLOW_DENY_KEYWORD",
                 }
             ],
-            "query_index_name": "model-type-created-at-index"
+            "query_index_name": "model-type-created-at-index",
+            "watermark_field": "created_at"
         }
 
         content_collection_cfg = {
@@ -129,7 +136,8 @@ class FlatConfig:
                     "value": "CONTENT_COLLECTION",
                 }
             ],
-            "query_index_name": "model-type-created-at-index"
+            "query_index_name": "model-type-created-at-index",
+            "watermark_field": "created_at"
         }
 
         return [
@@ -1,7 +1,9 @@
 import os
 
 # DOCUMENT CONFIGURATION SECTION
-from typing import List
+from typing import Iterator
+
+from migration_utility.id_list import read_id_list
 
 
 class HierarchicalConfig:
@@ -9,27 +11,15 @@ class HierarchicalConfig:
         self.id_file_path = id_file_path
 
     @property
-    def document_cfgs(self) -> List[dict]:
-        id_list = self.get_id_list_from_file()
-        doc_configs = []
-
-        for doc_id in id_list:
-            doc_configs.extend(
-                self.generate_hier_configs(content_item_id=doc_id)
-            )
-
-        doc_configs.extend(self.generate_flat_configs())
-
-        return doc_configs
-
-    def get_id_list_from_file(self) -> List[str]:
-        id_list = []
+    def document_cfgs(self) -> Iterator[dict]:
+        # Configurations are generated lazily while the ID file is streamed
+        for doc_id in self.get_id_list_from_file():
+            yield from self.generate_hier_configs(content_item_id=doc_id)
 
-        with open(self.id_file_path) as fh:
-            for doc_id in fh.readlines():
-                id_list.append(doc_id.strip())
+        yield from self.generate_flat_configs()
 
-        return id_list
+    def get_id_list_from_file(self) -> Iterator[str]:
+        return read_id_list(self.id_file_path)
 
     def generate_hier_configs(self, content_item_id: str):
         content_item_cfg = {
@@ -85,7 +75,8 @@ class HierarchicalConfig:
                     "value": "ORGANIZATION",
                 }
             ],
-            "query_index_name": "model-type-created-at-index"
+            "query_index_name": "model-type-created-at-index",
+            "watermark_field": "created_at"
         }
 
         user_cfg = {
@@ -98,7 +89,8 @@ class HierarchicalConfig:
                     "value": "USER",
                 }
             ],
-            "query_index_name": "model-type-created-at-index"
+            "query_index_name": "model-type-created-at-index",
+            "watermark_field": "created_at"
         }
 
         allow_deny_list_cfg = {
@@ -111,7 +103,8 @@ class HierarchicalConfig:
                     "value": "ALLOW_DENY_LIST",
                 }
             ],
-            "query_index_name": "model-type-created-at-index"
+            "query_index_name": "model-type-created-at-index",
+            "watermark_field": "created_at"
         }
 
         allow_deny_keyword_cfg = {
@@ -124,7 +117,8 @@ class HierarchicalConfig:
                     "value": "ALLOW_DENY_KEYWORD",
                 }
             ],
-            "query_index_name": "model-type-created-at-index"
+            "query_index_name": "model-type-created-at-index",
+            "watermark_field": "created_at"
         }
 
         content_collection_cfg = {
@@ -137,7 +131,8 @@ class HierarchicalConfig:
                     "value": "CONTENT_COLLECTION",
                 }
             ],
-            "query_index_name": "model-type-created-at-index"
+            "query_index_name": "model-type-created-at-index",
+            "watermark_field": "created_at"
         }
 
         return [
@@ -1,42 +1,168 @@
 import argparse
+import os
+from functools import partial
 
 from migration.config import (
     document_cfgs,
     source_db_cfg,
     destination_db_cfg,
     internal_db_cfg,
+    migration_cfg,
 )
 from migration.migration_utility.configuration.db_configuration import DbConfigurator
+from migration.migration_utility.configuration.migration_configuration import (
+    MigrationConfigurator,
+)
 from migration.migration_utility.configuration.document_configuration import (
     DocumentConfiguration,
 )
 from migration.migration_utility.controller.migration_controller import (
     MigrationController,
 )
+from migration.migration_utility.controller.sharding import (
+    ShardedMigrationCoordinator,
+    ShardProgressReporter,
+)
+from migration.migration_utility.controller.work_queue import (
+    MongoWorkQueue,
+    WorkQueueRunner,
+)
+from migration.migration_utility.enums import MarkingMode, MetricsExporterKind
 import sys
 
 
 def main(
         reset_migration: bool = False,
         force_migration: bool = False,
-        flow: str = "flat"
+        flow: str = "flat",
+        pipelined: bool = False,
+        asynchronous: bool = False,
+        marking_mode: str = None,
+        id_list_path: str = None,
+        processes: int = 1,
+        shard_index: int = 0,
+        shard_count: int = 1,
+        progress_queue=None,
+        work_queue: bool = False,
+        incremental: bool = False,
+        cdc: bool = False,
+        cdc_duration: float = None,
+        verify: bool = False,
+        metrics_exporter: str = None,
 ):
     """main."""
 
-    document_config_models = [DocumentConfiguration(**cfg) for cfg in document_cfgs]
-    source_db_cfg_model = DbConfigurator(**source_db_cfg)
-    destination_db_cfg_model = DbConfigurator(**destination_db_cfg)
+    if processes > 1 and not cdc and not verify:
+        # Every worker process runs main() for its own shard
+        ShardedMigrationCoordinator(
+            shard_count=processes,
+            worker=partial(
+                main,
+                reset_migration=reset_migration,
+                force_migration=force_migration,
+                flow=flow,
+                pipelined=pipelined,
+                asynchronous=asynchronous,
+                marking_mode=marking_mode,
+                id_list_path=id_list_path,
+                work_queue=work_queue,
+                incremental=incremental,
+                metrics_exporter=metrics_exporter,
+            ),
+            internal_db_client=DbConfigurator(**internal_db_cfg).create_client(),
+            progress_interval=MigrationConfigurator(**migration_cfg).progress_interval,
+        ).run()
+        return
+
+    def document_config_models():
+        cfgs = document_cfgs(id_list_path) if id_list_path else document_cfgs()
+
+        # Lists are small, so their collections count into the progress from the start.
+        # Generated models are created one by one as the controller reaches them
+        if isinstance(cfgs, list):
+            return [DocumentConfiguration(**cfg) for cfg in cfgs]
+
+        return (DocumentConfiguration(**cfg) for cfg in cfgs)
+
+    # Shards and work queue workers consume equal shares of the capacity budgets
+    source_db_cfg_model = DbConfigurator(**source_db_cfg).share_capacity(processes=shard_count)
+    destination_db_cfg_model = DbConfigurator(**destination_db_cfg).share_capacity(
+        processes=shard_count
+    )
     internal_db_cfg_model = DbConfigurator(**internal_db_cfg)
+    migration_cfg_model = MigrationConfigurator(**migration_cfg)
+
+    if pipelined:
+        migration_cfg_model.pipelined = True
+    if asynchronous:
+        migration_cfg_model.asynchronous = True
+    if marking_mode:
+        migration_cfg_model.marking_mode = MarkingMode(marking_mode)
+    if work_queue:
+        migration_cfg_model.work_queue = True
+    if incremental:
+        migration_cfg_model.incremental = True
+    if metrics_exporter:
+        migration_cfg_model.metrics_exporter = MetricsExporterKind(metrics_exporter)
+    if shard_count > 1 and not migration_cfg_model.work_queue:
+        migration_cfg_model.shard_count = shard_count
+        migration_cfg_model.shard_index = shard_index
+    elif shard_count > 1:
+        # Worker processes of the queue publish their metrics side by side
+        root, extension = os.path.splitext(migration_cfg_model.metrics_path)
+        migration_cfg_model.metrics_port += shard_index
+        migration_cfg_model.metrics_path = f"{root}.{shard_index}{extension}"
 
-    migration_ctrl = MigrationController(
+    create_controller = partial(
+        MigrationController,
         source_db_config=source_db_cfg_model,
         destination_db_config=destination_db_cfg_model,
         internal_db_config=internal_db_cfg_model,
-        document_configs=document_config_models,
-        flow=flow
+        flow=flow,
+        migration_config=migration_cfg_model,
     )
 
-    migration_ctrl.migrate(reset_migration=reset_migration, force_migration=force_migration)
+    if cdc:
+        # Stream shards are spread over the threads of a single process
+        create_controller(document_configs=document_config_models()).replicate_changes(
+            duration=cdc_duration
+        )
+        return
+
+    if verify:
+        # Source scans are segmented and bucket queries run on threads of a single process
+        create_controller(document_configs=document_config_models()).verify()
+        return
+
+    if migration_cfg_model.work_queue:
+        # Processes of all nodes lease work units instead of fixed shards
+        runner = WorkQueueRunner(
+            work_queue=MongoWorkQueue(
+                db_client=internal_db_cfg_model.create_client(),
+                lease_duration=migration_cfg_model.lease_duration,
+                max_attempts=migration_cfg_model.work_unit_max_attempts,
+            ),
+            migration_config=migration_cfg_model,
+            document_configs_factory=document_config_models,
+            controller_factory=create_controller,
+            scan_segments=source_db_cfg_model.scan_segments,
+        )
+        run = partial(runner.run, force_migration=force_migration)
+    else:
+        runner = create_controller(document_configs=document_config_models())
+        run = partial(runner.migrate, reset_migration=reset_migration, force_migration=force_migration)
+
+    if progress_queue is None:
+        run()
+        return
+
+    with ShardProgressReporter(
+        controller=runner,
+        shard_index=shard_index,
+        progress_queue=progress_queue,
+        interval=migration_cfg_model.progress_interval,
+    ):
+        run()
 
 
 if __name__ == "__main__":
@@ -46,11 +172,32 @@ if __name__ == "__main__":
     parser.add_argument("--force", action="store_true", help="Forces a repeated migration over all documents")
     parser.add_argument("--id_list_path", default=None, help="Path to a file with list of IDs to migrate")
     parser.add_argument("--flow", default="flat", help="Specifies the migration flow")
+    parser.add_argument("--pipeline", action="store_true", help="Runs fetch, write and marking as concurrent stages")
+    parser.add_argument("--marking", default=None, choices=[mode.value for mode in MarkingMode], help="Where migrated documents are remembered: source marks or internal ledger")
+    parser.add_argument("--processes", type=int, default=1, help="Splits the migration into shards migrated by this number of worker processes")
+    parser.add_argument("--work_queue", action="store_true", help="Leases work units from the internal database, so workers on several nodes migrate together")
+    parser.add_argument("--incremental", action="store_true", help="Reads only documents created after the high-water mark of the previous successful run")
+    parser.add_argument("--async", dest="asynchronous", action="store_true", help="Migrates collections concurrently with asyncio-native clients")
+    parser.add_argument("--cdc", action="store_true", help="Replicates changes from DynamoDB Streams into the destination after the backfill")
+    parser.add_argument("--cdc_duration", type=float, default=None, help="Seconds to replicate changes for, replicates until interrupted by default")
+    parser.add_argument("--verify", action="store_true", help="Compares the destination with the source by bucket digests and saves mismatching document IDs")
+    parser.add_argument("--metrics", default=None, choices=[kind.value for kind in MetricsExporterKind], help="Publishes per-stage metrics on a Prometheus endpoint or into a JSON file")
 
     args = parser.parse_args()
 
     main(
         reset_migration=args.reset,
         force_migration=args.force,
-        flow=args.flow
+        flow=args.flow,
+        pipelined=args.pipeline,
+        asynchronous=args.asynchronous,
+        marking_mode=args.marking,
+        id_list_path=args.id_list_path,
+        processes=args.processes,
+        work_queue=args.work_queue,
+        incremental=args.incremental,
+        cdc=args.cdc,
+        cdc_duration=args.cdc_duration,
+        verify=args.verify,
+        metrics_exporter=args.metrics,
     )
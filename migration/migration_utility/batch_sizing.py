@@ -0,0 +1,73 @@
+import threading
+
+
+class AdaptiveBatchSizer:
+    """Adjusts a batch size with additive increase / multiplicative decrease (AIMD).
+
+    The size grows step by step while requests finish faster than the target latency,
+    shrinks by the decrease factor when they are slower than the tolerated latency and
+    is halved when the database throttles. Page and bulk sizes therefore follow the
+    item sizes and the capacity of the table instead of a static number.
+    """
+
+    def __init__(
+        self,
+        initial_size: int,
+        min_size: int = 1,
+        max_size: int = 1000,
+        target_latency: float = 1.0,
+        increase_step: int = 10,
+        decrease_factor: float = 0.75,
+        tolerance: float = 1.5,
+    ):
+        """Initializes the sizer.
+
+        Args:
+            initial_size: batch size to start with
+            min_size: lower bound of the batch size
+            max_size: upper bound of the batch size
+            target_latency: desired duration of a single request in seconds
+            increase_step: number of items added after a fast request
+            decrease_factor: multiplier applied after a slow request
+            tolerance: multiple of the target latency that is still not considered slow
+        """
+
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_latency = target_latency
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.tolerance = tolerance
+
+        self._size = min(max(initial_size, min_size), max_size)
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """Returns the current batch size."""
+
+        return self._size
+
+    def record(self, latency: float):
+        """Adjusts the batch size after a successful request.
+
+        Args:
+            latency: duration of the request in seconds
+
+        Returns: None
+        """
+
+        with self._lock:
+            if latency > self.target_latency * self.tolerance:
+                self._size = max(self.min_size, int(self._size * self.decrease_factor))
+            elif latency < self.target_latency:
+                self._size = min(self.max_size, self._size + self.increase_step)
+
+    def record_throttling(self):
+        """Halves the batch size after the database throttled a request.
+
+        Returns: None
+        """
+
+        with self._lock:
+            self._size = max(self.min_size, self._size // 2)
@@ -0,0 +1,294 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, time as time_of_day
+from typing import List, Optional, Union
+
+from pydantic import BaseModel, Field, validator
+
+# Seconds between two checks of the capacity schedule
+SCHEDULE_CHECK_INTERVAL = 30
+
+
+class CapacityWindow(BaseModel):
+    """Model that holds capacity budgets of a time-of-day window, e.g. off-peak hours.
+    Windows that end before they start continue past midnight.
+    """
+
+    start: time_of_day = Field(..., description="local start time of the window", example="22:00")
+    end: time_of_day = Field(..., description="local end time of the window", example="06:00")
+    read_capacity_units: float = Field(
+        None, description="read capacity units per second allowed inside the window"
+    )
+    write_capacity_units: float = Field(
+        None, description="write capacity units per second allowed inside the window"
+    )
+
+    @validator("start", "end", pre=True)
+    def parse_time_of_day(cls, v, field):
+        """parses times of day like 6:00, 22:00 or 22:00:30."""
+
+        if not isinstance(v, str):
+            return v
+
+        for time_format in ("%H:%M", "%H:%M:%S"):
+            try:
+                return datetime.strptime(v.strip(), time_format).time()
+            except ValueError:
+                continue
+
+        raise ValueError(f"{field.name} should be a time of day like 22:00, got {v!r}")
+
+    def contains(self, moment: datetime) -> bool:
+        """Checks whether the time of the given moment falls into the window."""
+
+        current = moment.time()
+
+        if self.start <= self.end:
+            return self.start <= current < self.end
+
+        return current >= self.start or current < self.end
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled with a constant rate. Requests take tokens
+    before they are sent and are charged their real cost afterwards, so the balance
+    may go negative and delay the following requests.
+    """
+
+    def __init__(self, rate: float, burst: float = None):
+        """Initializes the bucket.
+
+        Args:
+            rate: number of tokens added per second
+            burst: max number of tokens the bucket holds. defaults to one second of rate
+        """
+
+        self._lock = threading.Lock()
+        self._rate = rate
+        self._burst = burst or rate
+        self._tokens = self._burst
+        self._updated_at = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        """Returns the number of tokens added per second."""
+
+        return self._rate
+
+    def set_rate(self, rate: float):
+        """Changes the refill rate, e.g. when a scheduled window starts.
+
+        Args:
+            rate: number of tokens added per second
+
+        Returns: None
+        """
+
+        with self._lock:
+            self._refill()
+            self._rate = rate
+            self._burst = rate
+            self._tokens = min(self._tokens, self._burst)
+
+    def take(self, tokens: float = 1) -> float:
+        """Takes tokens if the balance allows it.
+
+        Args:
+            tokens: number of tokens to take
+
+        Returns: 0 if the tokens were taken, otherwise seconds to wait before retrying
+        """
+
+        with self._lock:
+            self._refill()
+
+            if self._tokens >= min(tokens, self._burst):
+                self._tokens -= tokens
+                return 0
+
+            return (min(tokens, self._burst) - self._tokens) / self._rate
+
+    def charge(self, tokens: float):
+        """Takes tokens without waiting. Used to settle the real cost of a request.
+
+        Args:
+            tokens: number of tokens to take, negative values give tokens back
+
+        Returns: None
+        """
+
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._burst, self._tokens - tokens)
+
+    def acquire(self, tokens: float = 1):
+        """Blocks the calling thread until the tokens are taken."""
+
+        wait = self.take(tokens)
+
+        while wait:
+            time.sleep(wait)
+            wait = self.take(tokens)
+
+    async def aacquire(self, tokens: float = 1):
+        """Suspends the calling coroutine until the tokens are taken."""
+
+        wait = self.take(tokens)
+
+        while wait:
+            await asyncio.sleep(wait)
+            wait = self.take(tokens)
+
+    def _refill(self):
+        """Adds tokens accumulated since the last update."""
+
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+
+
+class CapacityGovernor:
+    """Limits read and write capacity units consumed per second by a DynamoDB client.
+
+    Requests acquire one unit before they are sent and are charged the
+    ConsumedCapacity returned by DynamoDB afterwards. Budgets of the matching schedule
+    window replace the default budgets while the window lasts.
+    """
+
+    def __init__(
+        self,
+        read_capacity_units: float = None,
+        write_capacity_units: float = None,
+        schedule: List[CapacityWindow] = None,
+    ):
+        """Initializes the governor.
+
+        Args:
+            read_capacity_units: default read capacity units per second, None is unlimited
+            write_capacity_units: default write capacity units per second, None is unlimited
+            schedule: list of time-of-day windows with their own budgets
+        """
+
+        self._default_rates = (read_capacity_units, write_capacity_units)
+        self._schedule = schedule or []
+        self._read_bucket: Optional[TokenBucket] = None
+        self._write_bucket: Optional[TokenBucket] = None
+        self._schedule_checked_at = None
+        self._lock = threading.Lock()
+
+        self._apply_schedule()
+
+    def acquire_read(self):
+        """Waits until a read request can be sent."""
+
+        self._acquire(self._current_bucket(read=True))
+
+    def acquire_write(self):
+        """Waits until a write request can be sent."""
+
+        self._acquire(self._current_bucket(read=False))
+
+    async def aacquire_read(self):
+        """Asynchronous version of acquire_read()."""
+
+        bucket = self._current_bucket(read=True)
+
+        if bucket:
+            await bucket.aacquire()
+
+    async def aacquire_write(self):
+        """Asynchronous version of acquire_write()."""
+
+        bucket = self._current_bucket(read=False)
+
+        if bucket:
+            await bucket.aacquire()
+
+    def charge_read(self, consumed_capacity: Union[dict, List[dict], None]):
+        """Charges the read budget with the capacity consumed by a request.
+
+        Args:
+            consumed_capacity: ConsumedCapacity returned by DynamoDB
+
+        Returns: None
+        """
+
+        self._charge(self._read_bucket, consumed_capacity)
+
+    def charge_write(self, consumed_capacity: Union[dict, List[dict], None]):
+        """Charges the write budget with the capacity consumed by a request.
+
+        Args:
+            consumed_capacity: ConsumedCapacity returned by DynamoDB
+
+        Returns: None
+        """
+
+        self._charge(self._write_bucket, consumed_capacity)
+
+    @staticmethod
+    def consumed_units(consumed_capacity: Union[dict, List[dict], None]) -> float:
+        """Sums capacity units of a single or a list of ConsumedCapacity entries."""
+
+        if not consumed_capacity:
+            return 0
+
+        if isinstance(consumed_capacity, dict):
+            consumed_capacity = [consumed_capacity]
+
+        return sum(entry.get("CapacityUnits", 0) for entry in consumed_capacity)
+
+    def _acquire(self, bucket: Optional[TokenBucket]):
+        """Takes a single unit from the bucket, unless the budget is unlimited."""
+
+        if bucket:
+            bucket.acquire()
+
+    def _charge(self, bucket: Optional[TokenBucket], consumed_capacity):
+        """Charges the real cost of a request minus the unit acquired beforehand."""
+
+        if bucket and consumed_capacity:
+            bucket.charge(self.consumed_units(consumed_capacity) - 1)
+
+    def _current_bucket(self, read: bool) -> Optional[TokenBucket]:
+        """Returns the bucket of the current budget, re-checking the schedule
+        periodically.
+        """
+
+        if self._schedule and (
+            time.monotonic() - self._schedule_checked_at > SCHEDULE_CHECK_INTERVAL
+        ):
+            self._apply_schedule()
+
+        return self._read_bucket if read else self._write_bucket
+
+    def _apply_schedule(self):
+        """Sets the budgets of the current schedule window or the default ones."""
+
+        read_rate, write_rate = self._default_rates
+        now = datetime.now()
+
+        for window in self._schedule:
+            if window.contains(now):
+                read_rate = window.read_capacity_units or read_rate
+                write_rate = window.write_capacity_units or write_rate
+                break
+
+        with self._lock:
+            self._read_bucket = self._updated_bucket(self._read_bucket, read_rate)
+            self._write_bucket = self._updated_bucket(self._write_bucket, write_rate)
+            self._schedule_checked_at = time.monotonic()
+
+    @staticmethod
+    def _updated_bucket(bucket: Optional[TokenBucket], rate: Optional[float]) -> Optional[TokenBucket]:
+        """Creates, updates or drops the bucket for the given rate."""
+
+        if not rate:
+            return None
+        if not bucket:
+            return TokenBucket(rate=rate)
+        if bucket.rate != rate:
+            bucket.set_rate(rate)
+
+        return bucket
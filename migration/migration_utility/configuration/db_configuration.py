@@ -1,10 +1,16 @@
+from typing import List, Optional
+
 from pydantic import BaseModel, Field, validator
 
+from migration.migration_utility.batch_sizing import AdaptiveBatchSizer
+from migration.migration_utility.capacity import CapacityGovernor, CapacityWindow
+
 from migration.migration_utility.db_clients.dynamodb.dynamodb_client import (
     DynamoDbClient,
 )
-from migration.migration_utility.db_clients.generic import GenericClient
-from migration.migration_utility.enums import Databases
+from migration.migration_utility.db_clients.generic import AsyncGenericClient, GenericClient
+from migration.migration_utility.converters import DocumentNormalizer
+from migration.migration_utility.enums import Databases, ReadMode, UpdateMode
 from migration.migration_utility.exceptions import (
     UnknownDatabaseError,
     MissingRequiredConfigurationParamError,
@@ -29,24 +35,217 @@ class DbConfigurator(BaseModel):
     batch_size: int = Field(
         100, description="the size of the batch that is read/written"
     )
+    scan_segments: int = Field(
+        1,
+        description="number of segments a full-table scan is split into. "
+        "values above 1 enable parallel scans in DynamoDB",
+    )
+    scan_workers: int = Field(
+        None,
+        description="number of threads reading scan segments concurrently. "
+        "defaults to scan_segments",
+    )
+    read_mode: ReadMode = Field(
+        ReadMode.RESOURCE,
+        description="resource reads through boto3 Table objects, raw translates low-level "
+        "DynamoDB responses straight into destination documents",
+    )
+    update_mode: UpdateMode = Field(
+        UpdateMode.TRANSACTIONAL,
+        description="transactional sends batch updates as transact_write_items() "
+        "partitions, concurrent sends one UpdateItem per document from a thread pool",
+    )
+    update_workers: int = Field(
+        16, description="number of threads sending updates in concurrent update mode"
+    )
+    write_workers: int = Field(
+        8, description="number of threads sending batch write chunks into DynamoDB"
+    )
+    adaptive_batch_size: bool = Field(
+        False,
+        description="adjusts read page sizes and write bulk sizes to the observed request "
+        "latency and throttling, starting from batch_size",
+    )
+    min_batch_size: int = Field(
+        10, description="lower bound of the adaptive batch size"
+    )
+    max_batch_size: int = Field(
+        1000, description="upper bound of the adaptive batch size"
+    )
+    target_latency: float = Field(
+        1.0, description="desired duration of a single request in seconds for adaptive batch sizes"
+    )
+    read_capacity_units: float = Field(
+        None,
+        description="max read capacity units consumed per second. None means unlimited",
+    )
+    write_capacity_units: float = Field(
+        None,
+        description="max write capacity units consumed per second. None means unlimited",
+    )
+    capacity_schedule: List[CapacityWindow] = Field(
+        [],
+        description="time-of-day windows with their own capacity budgets, e.g. off-peak bursts",
+    )
+    capacity_nodes: int = Field(
+        1,
+        description="number of nodes migrating the same tables at once, e.g. work queue "
+        "workers on several machines. Capacity budgets are totals of the whole run, "
+        "every process of every node consumes an equal share of them",
+    )
+    ordered_writes: bool = Field(
+        True,
+        description="ordered MongoDB bulk writes stop at the first failing document, "
+        "unordered ones are applied in parallel and report every failing document",
+    )
+    max_concurrency: int = Field(
+        100, description="max number of requests in flight for asynchronous clients"
+    )
+    endpoint_url: str = Field(
+        None,
+        description="endpoint of the DynamoDB API, e.g. http://localhost:8000 for DynamoDB Local",
+    )
 
-    def create_client(self) -> GenericClient:
+    def create_client(self, normalizer: DocumentNormalizer = None) -> GenericClient:
         """Creates a database client instance from the given configurations.
 
+        Args:
+            normalizer: DocumentNormalizer instance used by clients that translate documents
+
         Returns: instance of the database client
         """
 
         if self.database == Databases.DYNAMODB:
-            return DynamoDbClient(batch_size=self.batch_size)
+            return DynamoDbClient(
+                batch_size=self.batch_size,
+                scan_segments=self.scan_segments,
+                scan_workers=self.scan_workers,
+                read_mode=self.read_mode,
+                update_mode=self.update_mode,
+                update_workers=self.update_workers,
+                write_workers=self.write_workers,
+                normalizer=normalizer,
+                batch_sizer=self.create_batch_sizer(),
+                capacity_governor=self.create_capacity_governor(),
+                endpoint_url=self.endpoint_url,
+            )
         elif self.database == Databases.MONGODB:
             return MongoDbClient(
                 batch_size=self.batch_size,
                 connection_string=self.connection_string,
                 database_name=self.database_name,
+                batch_sizer=self.create_batch_sizer(),
+                ordered=self.ordered_writes,
             )
         else:
             raise UnknownDatabaseError(f"{self.database} is not a known database")
 
+    def create_async_client(self, normalizer: DocumentNormalizer = None) -> AsyncGenericClient:
+        """Creates an asyncio-native database client instance from the given
+        configurations. Asynchronous drivers are imported only when requested.
+
+        Args:
+            normalizer: DocumentNormalizer instance used by clients that translate documents
+
+        Returns: instance of the asynchronous database client
+        """
+
+        if self.database == Databases.DYNAMODB:
+            from migration.migration_utility.db_clients.dynamodb.async_dynamodb_client import (
+                AsyncDynamoDbClient,
+            )
+
+            return AsyncDynamoDbClient(
+                batch_size=self.batch_size,
+                max_concurrency=self.max_concurrency,
+                read_mode=self.read_mode,
+                update_mode=self.update_mode,
+                normalizer=normalizer,
+                batch_sizer=self.create_batch_sizer(),
+                capacity_governor=self.create_capacity_governor(),
+                endpoint_url=self.endpoint_url,
+            )
+        elif self.database == Databases.MONGODB:
+            from migration.migration_utility.db_clients.mongodb.async_mongodb_client import (
+                AsyncMongoDbClient,
+            )
+
+            return AsyncMongoDbClient(
+                batch_size=self.batch_size,
+                connection_string=self.connection_string,
+                database_name=self.database_name,
+                ordered=self.ordered_writes,
+            )
+        else:
+            raise UnknownDatabaseError(f"{self.database} is not a known database")
+
+    def create_batch_sizer(self) -> Optional[AdaptiveBatchSizer]:
+        """Creates the adaptive batch sizer of a client when adaptive sizes are enabled.
+
+        Returns: AdaptiveBatchSizer instance or None
+        """
+
+        if not self.adaptive_batch_size:
+            return None
+
+        return AdaptiveBatchSizer(
+            initial_size=self.batch_size,
+            min_size=self.min_batch_size,
+            max_size=self.max_batch_size,
+            target_latency=self.target_latency,
+        )
+
+    def share_capacity(self, processes: int) -> "DbConfigurator":
+        """Returns configurations whose capacity budgets, including the budgets of the
+        schedule windows, are the share of a single process. Every process creates its
+        own governor, so budgets are divided by the processes of all nodes.
+
+        Args:
+            processes: number of worker processes on this node
+
+        Returns: DbConfigurator instance, the same one if the budgets are not shared
+        """
+
+        shares = processes * self.capacity_nodes
+
+        if shares == 1:
+            return self
+
+        def share(capacity_units: Optional[float]) -> Optional[float]:
+            return capacity_units / shares if capacity_units else capacity_units
+
+        return self.copy(
+            update={
+                "read_capacity_units": share(self.read_capacity_units),
+                "write_capacity_units": share(self.write_capacity_units),
+                "capacity_schedule": [
+                    window.copy(
+                        update={
+                            "read_capacity_units": share(window.read_capacity_units),
+                            "write_capacity_units": share(window.write_capacity_units),
+                        }
+                    )
+                    for window in self.capacity_schedule
+                ],
+                "capacity_nodes": 1,
+            }
+        )
+
+    def create_capacity_governor(self) -> Optional[CapacityGovernor]:
+        """Creates the capacity governor of a client when capacity budgets are set.
+
+        Returns: CapacityGovernor instance or None
+        """
+
+        if not (self.read_capacity_units or self.write_capacity_units or self.capacity_schedule):
+            return None
+
+        return CapacityGovernor(
+            read_capacity_units=self.read_capacity_units,
+            write_capacity_units=self.write_capacity_units,
+            schedule=self.capacity_schedule,
+        )
+
     @validator("connection_string")
     def require_for_mongo(cls, v, values):
         """makes sure that for certain databases connection_string is present."""
@@ -57,3 +256,12 @@ class DbConfigurator(BaseModel):
             )
 
         return v
+
+    @validator("scan_segments", "update_workers", "write_workers", "min_batch_size", "capacity_nodes")
+    def validate_scan_segments(cls, v, field):
+        """makes sure that scan segments, workers, batch sizes and capacity nodes are positive."""
+
+        if v < 1:
+            raise ValueError(f"{field.name} should be greater than or equal to 1")
+
+        return v
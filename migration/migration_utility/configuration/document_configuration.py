@@ -1,9 +1,9 @@
-from typing import List
+from typing import Any, List
 
 from pydantic import BaseModel, Field, validator
 
 from migration.migration_utility.data_types import FieldQuery
-from migration_utility.enums import MigrationStatus
+from migration_utility.enums import FieldQueryOperation, LoadMode, MigrationStatus
 
 
 class RelatedDocument(BaseModel):
@@ -56,6 +56,21 @@ class DocumentConfiguration(BaseModel):
     num_migrated: int = Field(
         0, description="number of migrated documents"
     )
+    load_mode: LoadMode = Field(
+        LoadMode.UPSERT,
+        description="upsert updates existing documents, insert is a fast path for fresh "
+        "destination collections that falls back to upserts for existing IDs",
+    )
+    watermark_field: str = Field(
+        None,
+        description="sort key of the query index, e.g. created_at or updated_at, that "
+        "incremental runs read after its high-water mark",
+    )
+    watermark: Any = Field(
+        None,
+        description="high-water mark of the previous runs. documents with a lower "
+        "watermark field are not read",
+    )
 
     @property
     def find_one(self) -> bool:
@@ -63,6 +78,46 @@ class DocumentConfiguration(BaseModel):
 
         return len(self.queries) == 1 and self.queries[0].field_name == "id"
 
+    @property
+    def scan(self) -> bool:
+        """Returns true if documents are read with a full-table scan"""
+
+        return not self.query_index_name and not self.find_one
+
+    @property
+    def key(self) -> str:
+        """Returns a key that identifies the configuration across runs"""
+
+        queries = ",".join(
+            f"{q.field_name}:{q.operation.value}:{q.value}" for q in self.queries or []
+        )
+
+        return f"{self.type}|{self.source_collection_name}|{queries}"
+
+    @property
+    def checkpoint_key(self) -> str:
+        """Returns the key of the resume state, which differs for every high-water mark"""
+
+        if self.watermark is None:
+            return self.key
+
+        return f"{self.key}|{self.watermark_field}:gte:{self.watermark}"
+
+    @property
+    def read_queries(self) -> List[FieldQuery]:
+        """Returns queries limited to documents at or after the high-water mark"""
+
+        if self.watermark is None:
+            return self.queries
+
+        return [q for q in self.queries if q.field_name != self.watermark_field] + [
+            FieldQuery(
+                field_name=self.watermark_field,
+                operation=FieldQueryOperation.GTE,
+                value=self.watermark,
+            )
+        ]
+
     @property
     def source_collection_name(self) -> str:
         """Returns collection name"""
@@ -0,0 +1,231 @@
+import os
+from typing import Optional
+
+from pydantic import BaseModel, Field, validator
+
+from migration.migration_utility.metrics import (
+    JsonSnapshotExporter,
+    MetricsExporter,
+    MetricsRegistry,
+    PrometheusExporter,
+)
+from migration_utility.enums import MarkingMode, MetricsExporterKind, NumberMode
+
+
+class MigrationConfigurator(BaseModel):
+    """Model that holds settings of the migration process itself."""
+
+    pipelined: bool = Field(
+        False,
+        description="runs fetch, conversion, destination write and source marking as "
+        "concurrent pipeline stages instead of one after another",
+    )
+    queue_size: int = Field(
+        4, description="max number of batches waiting between two pipeline stages"
+    )
+    convert_workers: int = Field(
+        1, description="number of threads converting fetched documents"
+    )
+    write_workers: int = Field(
+        2, description="number of threads writing batches into the destination database"
+    )
+    mark_workers: int = Field(
+        2, description="number of threads marking migrated documents in the source database"
+    )
+    number_mode: NumberMode = Field(
+        NumberMode.INT,
+        description="destination type of DynamoDB numbers: int, float or decimal128",
+    )
+    marking_mode: MarkingMode = Field(
+        MarkingMode.SOURCE,
+        description="source marks migrated documents in the source database, ledger "
+        "records their IDs in the internal database and never writes the source",
+    )
+    retry_max_attempts: int = Field(
+        5, description="max number of attempts of a failed fetch, insertion or marking"
+    )
+    retry_base_delay: float = Field(
+        1.0, description="delay before the first retry in seconds, doubled on every retry"
+    )
+    retry_max_delay: float = Field(
+        60.0, description="upper bound of a single retry delay in seconds"
+    )
+    retry_workers: int = Field(
+        2, description="number of threads retrying parked insertions and markings"
+    )
+    batched_hierarchy: bool = Field(
+        False,
+        description="migrates parents of the hierarchical flow with BatchGetItem groups, "
+        "queries their children concurrently and writes one bulk per collection",
+    )
+    parent_group_size: int = Field(
+        100, description="number of parent documents migrated together in the hierarchical flow"
+    )
+    child_query_workers: int = Field(
+        16, description="number of threads querying child documents in the hierarchical flow"
+    )
+    shard_count: int = Field(
+        1,
+        description="number of shards the migration is split into: scan segments, "
+        "hashes of parent IDs or whole collections",
+    )
+    shard_index: int = Field(
+        0, description="index of the shard migrated by this process, starting from 0"
+    )
+    progress_interval: float = Field(
+        10.0, description="seconds between two progress reports of a shard"
+    )
+    progress_log_interval: float = Field(
+        30.0,
+        description="seconds between two progress summaries in the log, batches are not "
+        "logged one by one",
+    )
+    progress_window: float = Field(
+        60.0, description="seconds of the moving window migration rates are computed over"
+    )
+    incremental: bool = Field(
+        False,
+        description="reads index queries with a watermark field only after the high-water "
+        "mark reached by the previous successful run",
+    )
+    checkpoint_interval: float = Field(
+        5.0, description="seconds between two flushes of the resume state into the internal database"
+    )
+    work_queue: bool = Field(
+        False,
+        description="leases work units from the internal database, so any number of "
+        "workers on any number of nodes migrate together",
+    )
+    id_range_chunks: int = Field(
+        64, description="number of work units configurations read by id are split into"
+    )
+    lease_duration: float = Field(
+        300.0, description="seconds a work unit lease is valid for without a heartbeat"
+    )
+    heartbeat_interval: float = Field(
+        60.0, description="seconds between two heartbeats of a leased work unit"
+    )
+    work_unit_max_attempts: int = Field(
+        3, description="max number of leases of a work unit before it is marked failed"
+    )
+    stream_workers: int = Field(
+        8, description="number of threads replicating stream shards in change data capture mode"
+    )
+    stream_poll_interval: float = Field(
+        1.0, description="seconds to wait after a stream read returned no records"
+    )
+    stream_refresh_interval: float = Field(
+        30.0, description="seconds between two lookups of new stream shards"
+    )
+    metrics_exporter: MetricsExporterKind = Field(
+        None,
+        description="publishes per-stage metrics while the migration runs: prometheus "
+        "serves them on an HTTP endpoint, json writes snapshots into a file",
+    )
+    metrics_port: int = Field(
+        9108, description="port of the Prometheus endpoint, shards add their index to it"
+    )
+    metrics_path: str = Field(
+        "migration_metrics.json",
+        description="path of the JSON snapshot file, shards add their index to it",
+    )
+    metrics_interval: float = Field(
+        10.0, description="seconds between two JSON snapshots of the metrics"
+    )
+    verify_leaf_size: int = Field(
+        1000,
+        description="max number of documents in a bucket that is compared document by "
+        "document instead of being split into smaller buckets",
+    )
+    verify_batch_size: int = Field(
+        1000, description="number of source documents read by a single verification scan"
+    )
+    verify_workers: int = Field(
+        8, description="number of threads sending verification requests to the destination"
+    )
+    verify_store_path: str = Field(
+        "migration_verification.sqlite",
+        description="path of the SQLite file with the digests of the source documents",
+    )
+    verify_report_limit: int = Field(
+        100000,
+        description="max number of mismatching document IDs saved per destination collection",
+    )
+    asynchronous: bool = Field(
+        False,
+        description="migrates collections with asyncio-native database clients",
+    )
+    async_concurrency: int = Field(
+        32, description="number of collections migrated concurrently in asynchronous mode"
+    )
+    use_uvloop: bool = Field(
+        True, description="runs asynchronous migration on uvloop when it is installed"
+    )
+
+    @validator(
+        "queue_size",
+        "convert_workers",
+        "write_workers",
+        "mark_workers",
+        "async_concurrency",
+        "retry_max_attempts",
+        "retry_workers",
+        "parent_group_size",
+        "child_query_workers",
+        "shard_count",
+        "id_range_chunks",
+        "work_unit_max_attempts",
+        "stream_workers",
+        "verify_leaf_size",
+        "verify_batch_size",
+        "verify_workers",
+    )
+    def require_positive(cls, v, field):
+        """makes sure that the queue and worker sizes are positive."""
+
+        if v < 1:
+            raise ValueError(f"{field.name} should be greater than or equal to 1")
+
+        return v
+
+    @validator("shard_index")
+    def validate_shard_index(cls, v, values):
+        """makes sure that the shard index is within the shard count."""
+
+        if not 0 <= v < values.get("shard_count", 1):
+            raise ValueError("shard_index should be between 0 and shard_count - 1")
+
+        return v
+
+    @validator("heartbeat_interval")
+    def validate_heartbeat_interval(cls, v, values):
+        """makes sure that a lease is renewed before it expires."""
+
+        if not 0 < v < values.get("lease_duration", 300.0):
+            raise ValueError("heartbeat_interval should be between 0 and lease_duration")
+
+        return v
+
+    def create_metrics_exporter(self, registry: MetricsRegistry) -> Optional[MetricsExporter]:
+        """Creates the configured metrics exporter.
+
+        Args:
+            registry: MetricsRegistry whose metrics are exported
+
+        Returns: MetricsExporter instance or None if metrics are not exported
+        """
+
+        if self.metrics_exporter == MetricsExporterKind.PROMETHEUS:
+            return PrometheusExporter(registry=registry, port=self.metrics_port + self.shard_index)
+        if self.metrics_exporter == MetricsExporterKind.JSON:
+            path = self.metrics_path
+
+            if self.shard_count > 1:
+                root, extension = os.path.splitext(path)
+                path = f"{root}.{self.shard_index}{extension}"
+
+            return JsonSnapshotExporter(
+                registry=registry, path=path, interval=self.metrics_interval
+            )
+
+        return None
@@ -0,0 +1,429 @@
+import asyncio
+import itertools
+import time
+from typing import TYPE_CHECKING, Iterator, List, Optional, Set, Tuple
+
+from migration.migration_utility import logging
+from migration.migration_utility.configuration.document_configuration import (
+    DocumentConfiguration,
+)
+from migration.migration_utility.configuration.migration_configuration import (
+    MigrationConfigurator,
+)
+from migration.migration_utility.controller.checkpoint import (
+    CHECKPOINTS_COLLECTION_NAME,
+    ResumePoint,
+)
+from migration.migration_utility.controller.ledger import MigrationLedger
+from migration.migration_utility.db_clients.generic import AsyncGenericClient
+from migration.migration_utility.retry import aretry_call, classify_error
+from migration_utility.data_types import ReadQueryResult
+from migration_utility.enums import MarkingMode
+from migration_utility.exceptions import (
+    FetchingTerminatedError,
+    InsertionWasCancelledError,
+    RetryableFetchingError,
+    RetryableWriteError,
+)
+
+if TYPE_CHECKING:
+    from migration.migration_utility.controller.migration_controller import (
+        MigrationController,
+    )
+
+
+class AsyncMigrationRunner:
+    """Migrates document configurations concurrently on the asyncio event loop. Every
+    worker coroutine takes the next configuration and migrates it page by page, so the
+    number of requests in flight is bounded by the concurrency, not by threads.
+    """
+
+    def __init__(
+        self, controller: "MigrationController", migration_config: MigrationConfigurator
+    ):
+        """Initializes the runner.
+
+        Args:
+            controller: MigrationController that owns database and document configurations
+            migration_config: MigrationConfigurator instance with the concurrency settings
+        """
+
+        self.controller = controller
+        self.migration_config = migration_config
+
+        self.source_db_client: Optional[AsyncGenericClient] = None
+        self.destination_db_client: Optional[AsyncGenericClient] = None
+        self.internal_db_client: Optional[AsyncGenericClient] = None
+        self.ledger: Optional[MigrationLedger] = None
+
+        self.migrated_count = 0
+        self._retries: Set[asyncio.Future] = set()
+        self._document_cfgs: Optional[Iterator[DocumentConfiguration]] = None
+
+    async def run(self, find_all: bool = False):
+        """Migrates all configured collections.
+
+        Args:
+            find_all: if True documents are read regardless of their migration status
+
+        Returns: None
+        """
+
+        self.source_db_client = self.controller.source_db_config.create_async_client(
+            normalizer=self.controller.container_manager.normalizer
+        )
+        self.destination_db_client = self.controller.destination_db_config.create_async_client()
+        self.internal_db_client = self.controller.internal_db_config.create_async_client()
+        self.ledger = MigrationLedger(db_client=self.internal_db_client)
+
+        first_cfg = self.controller.current_doc_cfg
+        self._document_cfgs = itertools.chain(
+            [first_cfg] if first_cfg is not None else [],
+            self.controller.document_configuration,
+        )
+
+        try:
+            for db_client in (
+                self.source_db_client, self.destination_db_client, self.internal_db_client
+            ):
+                await db_client.aconnect()
+
+            await asyncio.gather(
+                *[
+                    self._run_worker(find_all=find_all)
+                    for _ in range(self.migration_config.async_concurrency)
+                ]
+            )
+        finally:
+            if self._retries:
+                await asyncio.gather(*self._retries, return_exceptions=True)
+
+            for db_client in (
+                self.source_db_client, self.destination_db_client, self.internal_db_client
+            ):
+                await db_client.aclose()
+
+        self.controller.current_doc_cfg = None
+
+        logging.info(f"Total migrated: {self.migrated_count}")
+
+    async def _run_worker(self, find_all: bool):
+        """Migrates document configurations one after another until none is left."""
+
+        for document_cfg in self._document_cfgs:
+            await self._migrate_collection(document_cfg=document_cfg, find_all=find_all)
+
+    async def _migrate_collection(self, document_cfg: DocumentConfiguration, find_all: bool):
+        """Reads all pages of a single document configuration and migrates them."""
+
+        if document_cfg.find_one:
+            with self.controller.metrics.track("fetch", document_cfg.collection_name) as operation:
+                query_result = await self.source_db_client.afind_document(
+                    collection_name=document_cfg.source_collection_name,
+                    doc_id=document_cfg.queries[0].value,
+                )
+                operation.add(query_result.documents)
+            await self._migrate_page(
+                document_cfg=document_cfg, query_result=query_result, find_all=find_all
+            )
+            document_cfg.all_fetched = True
+            return
+
+        last_evaluated_key = None
+        checkpointed = self.controller.checkpointed(document_cfg)
+
+        if (
+            self.migration_config.incremental
+            and self.controller.watermarked(document_cfg)
+            and not find_all
+        ):
+            self.controller.apply_watermark(
+                document_cfg=document_cfg,
+                state=await self._load_checkpoint(
+                    self.controller.watermark_checkpoint_id(document_cfg)
+                ),
+            )
+
+        if checkpointed and not find_all:
+            state = await self._load_checkpoint(document_cfg.checkpoint_key) or {}
+            last_evaluated_key = state.get("last_evaluated_key")
+            document_cfg.num_migrated = state.get("num_migrated", 0)
+
+            if state.get("all_fetched"):
+                logging.info(f"{document_cfg.checkpoint_key} was migrated by a previous run")
+                document_cfg.all_fetched = True
+                return
+
+        attempt = 0
+
+        while True:
+            try:
+                # Pages are read ahead by the client, a fetch lasts from the end of the
+                # previous page until the next page is handed over
+                fetch_started = time.monotonic()
+
+                async for query_result in self.source_db_client.aiter_pages(
+                    collection_name=document_cfg.source_collection_name,
+                    queries=document_cfg.read_queries,
+                    query_index_name=document_cfg.query_index_name,
+                    find_all=find_all,
+                    last_evaluated_key=last_evaluated_key,
+                ):
+                    self.controller.metrics.record(
+                        "fetch",
+                        document_cfg.collection_name,
+                        seconds=time.monotonic() - fetch_started,
+                        documents=len(query_result.documents),
+                    )
+                    self.controller.track_watermark(
+                        document_cfg=document_cfg, documents=query_result.documents
+                    )
+
+                    if checkpointed:
+                        # Saved once the page and the retries parked for it are finished
+                        query_result.resume_point = self.controller.resume_log.read(
+                            states={
+                                document_cfg.checkpoint_key: {
+                                    "destination_collection_name": document_cfg.destination_collection_name,
+                                    "last_evaluated_key": query_result.last_evaluated_key,
+                                    "all_fetched": not query_result.has_more,
+                                }
+                            }
+                        )
+
+                    await self._migrate_page(
+                        document_cfg=document_cfg, query_result=query_result, find_all=find_all
+                    )
+                    self.controller.resume_log.release([query_result.resume_point])
+
+                    if query_result.last_evaluated_key:
+                        last_evaluated_key = query_result.last_evaluated_key
+
+                    attempt = 0
+                    fetch_started = time.monotonic()
+                break
+            except RetryableFetchingError as exc:
+                attempt += 1
+                error_class = classify_error(exc)
+                retry_policy = self.controller.retry_policy
+
+                if not retry_policy.should_retry(attempt, error_class):
+                    self.controller.retry_counters.increment(error_class, "exhausted")
+                    raise FetchingTerminatedError(
+                        f"Terminating fetching documents from {document_cfg.source_collection_name}"
+                    ) from exc
+
+                self.controller.retry_counters.increment(error_class, "retried")
+                delay = retry_policy.delay(attempt, error_class)
+                logging.info(f"Retrying fetch operation in {delay:.1f}s. Iteration #{attempt}")
+                await asyncio.sleep(delay)
+
+        document_cfg.all_fetched = True
+
+    async def _migrate_page(
+        self, document_cfg: DocumentConfiguration, query_result: ReadQueryResult, find_all: bool
+    ):
+        """Writes a page of documents into the destination and marks them as migrated."""
+
+        documents = query_result.documents
+
+        if self.migration_config.marking_mode == MarkingMode.LEDGER and not find_all:
+            documents = await self.ledger.afilter_unmigrated(
+                document_cfg=document_cfg, documents=documents
+            )
+
+        if not documents:
+            return
+
+        documents = (
+            documents
+            if query_result.normalized
+            else self.controller.convert_documents(document_cfg=document_cfg, documents=documents)
+        )
+
+        processed_document_ids, unprocessed_documents = await self._awrite(
+            document_cfg=document_cfg, documents=documents
+        )
+
+        if unprocessed_documents:
+            # Unprocessed documents are retried in the background while the next pages flow
+            logging.info(f"{len(unprocessed_documents)} items are parked for a retry")
+
+            self.controller.resume_log.hold([query_result.resume_point])
+            self._retries.add(
+                asyncio.ensure_future(
+                    self._aretry_insert(
+                        document_cfg=document_cfg,
+                        documents=unprocessed_documents,
+                        resume_point=query_result.resume_point,
+                    )
+                )
+            )
+
+        if processed_document_ids:
+            await self._amark(
+                document_cfg=document_cfg,
+                id_list=processed_document_ids,
+                resume_point=query_result.resume_point,
+            )
+
+    async def _awrite(
+        self, document_cfg: DocumentConfiguration, documents: List[dict]
+    ) -> Tuple[List[str], List[dict]]:
+        """Writes converted documents into the destination and counts the processed ones.
+
+        Args:
+            document_cfg: configuration of the documents
+            documents: converted documents
+
+        Returns: IDs of the processed documents and the documents that were not processed
+        """
+
+        try:
+            with self.controller.metrics.track("write", document_cfg.collection_name) as operation:
+                operation.add(documents)
+                query_res = await self.destination_db_client.abatch_write(
+                    collection_name=document_cfg.destination_collection_name,
+                    documents=documents,
+                    load_mode=document_cfg.load_mode,
+                )
+            processed_document_ids = query_res.processed_document_ids
+            processed_ids = set(processed_document_ids)
+            unprocessed_documents = [doc for doc in documents if doc.get("id") not in processed_ids]
+        except InsertionWasCancelledError as exc:
+            await self.internal_db_client.abatch_write(
+                collection_name=document_cfg.destination_collection_name,
+                documents=document_cfg.export_cancelled_doc_info(
+                    exc.cancelled_documents, exc_info=exc.exception_details
+                ),
+            )
+            processed_document_ids = [doc["_id"] for doc in exc.inserted_documents]
+            unprocessed_documents = []
+
+        self.controller.count_migrated(document_cfg=document_cfg, count=len(processed_document_ids))
+        self.migrated_count += len(processed_document_ids)
+
+        return processed_document_ids, unprocessed_documents
+
+    async def _amark(
+        self, document_cfg: DocumentConfiguration, id_list: List[str], resume_point: ResumePoint
+    ):
+        """Marks written documents as migrated. Failed marks are retried in the
+        background, holding the resume point of their page."""
+
+        with self.controller.metrics.track("mark", document_cfg.collection_name) as operation:
+            operation.add(id_list)
+
+            if self.migration_config.marking_mode == MarkingMode.LEDGER:
+                await self.ledger.arecord(document_cfg=document_cfg, id_list=id_list)
+                return
+
+            update_res = await self.source_db_client.abatch_update(
+                collection_name=document_cfg.source_collection_name,
+                updates=self.controller._generate_migration_marks(id_list),
+            )
+
+        retryable_ids = self.controller.retryable_failures(update_res)
+
+        if retryable_ids:
+            # Failed marks are retried in the background while the next pages flow
+            self.controller.resume_log.hold([resume_point])
+            self._retries.add(
+                asyncio.ensure_future(
+                    self._aretry_marks(
+                        document_cfg=document_cfg, id_list=retryable_ids, resume_point=resume_point
+                    )
+                )
+            )
+
+    async def _aretry_insert(
+        self,
+        document_cfg: DocumentConfiguration,
+        documents: List[dict],
+        resume_point: ResumePoint = None,
+    ):
+        """Inserts and marks documents the destination did not process, retrying with
+        exponential delays. The resume point of their page is released when all of
+        them are inserted."""
+
+        async def insert():
+            processed_document_ids, documents[:] = await self._awrite(
+                document_cfg=document_cfg, documents=documents
+            )
+            logging.info(
+                f"{len(processed_document_ids)} items have been inserted after retry attempt"
+            )
+
+            if processed_document_ids:
+                await self._amark(
+                    document_cfg=document_cfg,
+                    id_list=processed_document_ids,
+                    resume_point=resume_point,
+                )
+
+            if documents:
+                raise RetryableWriteError(f"{len(documents)} documents were not inserted")
+
+        try:
+            await asyncio.sleep(self.controller.retry_policy.delay(1))
+            await aretry_call(
+                insert,
+                policy=self.controller.retry_policy,
+                counters=self.controller.retry_counters,
+                description=f"Insertion into {document_cfg.destination_collection_name}",
+            )
+        except RetryableWriteError:
+            logging.exception(
+                f"{len(documents)} documents of {document_cfg.source_collection_name} "
+                f"were not migrated"
+            )
+            return
+
+        self.controller.resume_log.release([resume_point])
+
+    async def _aretry_marks(
+        self,
+        document_cfg: DocumentConfiguration,
+        id_list: List[str],
+        resume_point: ResumePoint = None,
+    ):
+        """Marks documents that failed to be marked, retrying with exponential delays.
+        The resume point of their page is released when all of them are marked."""
+
+        async def mark():
+            update_res = await self.source_db_client.abatch_update(
+                collection_name=document_cfg.source_collection_name,
+                updates=self.controller._generate_migration_marks(id_list),
+            )
+
+            id_list[:] = self.controller.retryable_failures(update_res)
+
+            if id_list:
+                raise RetryableWriteError(f"{len(id_list)} documents were not marked")
+
+        try:
+            await asyncio.sleep(self.controller.retry_policy.delay(1))
+            await aretry_call(
+                mark,
+                policy=self.controller.retry_policy,
+                counters=self.controller.retry_counters,
+                description=f"Marking in {document_cfg.source_collection_name}",
+            )
+        except RetryableWriteError:
+            logging.exception(
+                f"{len(id_list)} documents of {document_cfg.source_collection_name} "
+                f"were migrated but not marked"
+            )
+            return
+
+        self.controller.resume_log.release([resume_point])
+
+    async def _load_checkpoint(self, checkpoint_id: str) -> Optional[dict]:
+        """Reads a checkpoint, including fields not flushed yet."""
+
+        return self.controller.checkpoints.merge_pending(
+            checkpoint_id=checkpoint_id,
+            stored_state=await self.internal_db_client.afind_document(
+                collection_name=CHECKPOINTS_COLLECTION_NAME, doc_id=checkpoint_id
+            ),
+        )
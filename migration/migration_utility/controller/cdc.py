@@ -0,0 +1,449 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from functools import partial
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
+
+from migration.migration_utility import logging
+from migration.migration_utility.configuration.document_configuration import (
+    DocumentConfiguration,
+)
+from migration.migration_utility.configuration.migration_configuration import (
+    MigrationConfigurator,
+)
+from migration.migration_utility.retry import retry_call
+from migration_utility.data_types import StreamReadResult
+from migration_utility.enums import Databases, FieldQueryOperation
+from migration_utility.exceptions import (
+    ShardIteratorExpiredError,
+    StreamNotEnabledError,
+    StreamRecordsTrimmedError,
+)
+
+if TYPE_CHECKING:
+    from migration.migration_utility.controller.migration_controller import (
+        MigrationController,
+    )
+
+# Comparisons of the field query operations against a document value
+_QUERY_OPERATIONS = {
+    FieldQueryOperation.EQ: lambda value, query_value: value == query_value,
+    FieldQueryOperation.GT: lambda value, query_value: value > query_value,
+    FieldQueryOperation.GTE: lambda value, query_value: value >= query_value,
+    FieldQueryOperation.LT: lambda value, query_value: value < query_value,
+    FieldQueryOperation.LTE: lambda value, query_value: value <= query_value,
+}
+
+
+class TableRoutes:
+    """Decides which destination collections a document of a source table belongs to.
+
+    Configurations with a single equality query, e.g. documents read by id or children
+    read by their parent id, are looked up by the queried value, so millions of them
+    cost a dict lookup per change. Other configurations are matched one by one.
+    """
+
+    def __init__(self, table_name: str):
+        """Initializes empty routes.
+
+        Args:
+            table_name: name of the source table
+        """
+
+        self.table_name = table_name
+        self.destinations: Set[str] = set()
+        self._eq_routes: Dict[Tuple[str, object], Set[str]] = {}
+        self._eq_fields: Set[str] = set()
+        self._query_routes: List[Tuple[list, str]] = []
+
+    def add(self, document_cfg: DocumentConfiguration):
+        """Routes documents matched by the configuration into its destination.
+
+        Args:
+            document_cfg: DocumentConfiguration instance
+
+        Returns: None
+        """
+
+        destination = document_cfg.destination_collection_name
+        queries = document_cfg.queries or []
+        self.destinations.add(destination)
+
+        if len(queries) == 1 and queries[0].operation == FieldQueryOperation.EQ:
+            self._eq_fields.add(queries[0].field_name)
+            self._eq_routes.setdefault(
+                (queries[0].field_name, queries[0].value), set()
+            ).add(destination)
+        else:
+            self._query_routes.append((queries, destination))
+
+    def match(self, document: dict) -> Set[str]:
+        """Returns destination collections of the configurations matching the document.
+
+        Args:
+            document: document read from the stream
+
+        Returns: set of destination collection names
+        """
+
+        destinations = set()
+
+        for field_name in self._eq_fields:
+            if field_name in document:
+                destinations |= self._eq_routes.get((field_name, document[field_name]), set())
+
+        for queries, destination in self._query_routes:
+            if destination not in destinations and self._matches(queries, document):
+                destinations.add(destination)
+
+        return destinations
+
+    @staticmethod
+    def _matches(queries: list, document: dict) -> bool:
+        """Checks whether the document satisfies all queries."""
+
+        try:
+            return all(
+                q.field_name in document
+                and _QUERY_OPERATIONS[q.operation](document[q.field_name], q.value)
+                for q in queries
+            )
+        except TypeError:
+            # Values of different types never match, like in DynamoDB
+            return False
+
+
+class ShardCursor:
+    """Position of the replication in a single stream shard."""
+
+    def __init__(
+        self, stream_arn: str, shard_id: str, routes: TableRoutes, sequence_number: str = None
+    ):
+        """Initializes the cursor.
+
+        Args:
+            stream_arn: ARN of the stream
+            shard_id: id of the shard
+            routes: TableRoutes of the table the stream belongs to
+            sequence_number: sequence number of the last applied record
+        """
+
+        self.stream_arn = stream_arn
+        self.shard_id = shard_id
+        self.routes = routes
+        self.sequence_number = sequence_number
+        self.iterator: Optional[str] = None
+        self.idle_until = 0.0
+
+    @property
+    def checkpoint_id(self) -> str:
+        """Returns id of the checkpoint of the shard."""
+
+        return f"cdc#{self.stream_arn}#{self.shard_id}"
+
+
+class StreamReplicator:
+    """Replicates changes of the source tables into the destination after the backfill.
+
+    Every table is read from its DynamoDB stream. Shards are polled concurrently, one
+    read per shard at a time, so each shard is applied in order while many shards share
+    the threads. Child shards start once their parent is read completely. Changes of a
+    read are coalesced per document and applied with one bulk of whole-document
+    replacements and one delete per destination collection, then the sequence number of
+    the shard is checkpointed in the internal database.
+    """
+
+    def __init__(
+        self, controller: "MigrationController", migration_config: MigrationConfigurator
+    ):
+        """Initializes the replicator.
+
+        Args:
+            controller: MigrationController that owns database clients and checkpoints
+            migration_config: MigrationConfigurator instance with the stream settings
+        """
+
+        self.controller = controller
+        self.migration_config = migration_config
+
+        self.applied_count = 0
+        self._counter_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._cursors: Dict[str, ShardCursor] = {}
+        self._finished_shards: Set[str] = set()
+
+    def stop(self):
+        """Stops the replication after the reads in flight are applied."""
+
+        self._stop_event.set()
+
+    def run(self, document_configs: Iterable[DocumentConfiguration], duration: float = None):
+        """Replicates changes until stopped or until the duration elapses.
+
+        Args:
+            document_configs: DocumentConfiguration instances whose documents are replicated
+            duration: seconds to replicate for. None replicates until stop() is called
+
+        Returns: None
+        """
+
+        if self.controller.source_db_config.database != Databases.DYNAMODB:
+            raise StreamNotEnabledError("Change data capture requires a DynamoDB source")
+
+        routes = self.build_routes(document_configs)
+        streams = {
+            self.controller.source_db_client.stream_arn(collection_name): table_routes
+            for collection_name, table_routes in routes.items()
+        }
+        deadline = time.monotonic() + duration if duration is not None else None
+        next_refresh = 0.0
+        in_flight: Dict[Future, ShardCursor] = {}
+
+        try:
+            with ThreadPoolExecutor(
+                max_workers=self.migration_config.stream_workers,
+                thread_name_prefix="stream-shard",
+            ) as executor:
+                while not self._stop_event.is_set():
+                    now = time.monotonic()
+
+                    if deadline is not None and now >= deadline:
+                        break
+
+                    if now >= next_refresh:
+                        for stream_arn, table_routes in streams.items():
+                            self._refresh_shards(stream_arn=stream_arn, routes=table_routes)
+                        next_refresh = now + self.migration_config.stream_refresh_interval
+
+                    busy = set(in_flight.values())
+
+                    for cursor in self._cursors.values():
+                        if cursor not in busy and cursor.idle_until <= now:
+                            in_flight[executor.submit(self._poll_shard, cursor)] = cursor
+
+                    if not in_flight:
+                        self._stop_event.wait(self.migration_config.stream_poll_interval)
+                        continue
+
+                    done, _ = wait(
+                        in_flight,
+                        timeout=self.migration_config.stream_poll_interval,
+                        return_when=FIRST_COMPLETED,
+                    )
+
+                    for future in done:
+                        cursor = in_flight.pop(future)
+
+                        if future.result():
+                            # Children of the shard are started without waiting for the timer
+                            self._finish_shard(cursor)
+                            next_refresh = 0.0
+
+                if in_flight:
+                    wait(in_flight)
+        finally:
+            logging.info(f"Total replicated changes: {self.applied_count}")
+            self.controller.checkpoints.close()
+
+    def build_routes(self, document_configs: Iterable[DocumentConfiguration]) -> Dict[str, TableRoutes]:
+        """Groups the configurations by their source table.
+
+        Args:
+            document_configs: DocumentConfiguration instances
+
+        Returns: dict of TableRoutes keyed by the source collection name
+        """
+
+        routes: Dict[str, TableRoutes] = {}
+
+        for document_cfg in document_configs:
+            table_name = document_cfg.source_collection_name
+            routes.setdefault(table_name, TableRoutes(table_name=table_name)).add(document_cfg)
+
+        for collection_name, table_routes in routes.items():
+            logging.info(
+                f"Replicating {collection_name} into {', '.join(sorted(table_routes.destinations))}"
+            )
+
+        return routes
+
+    def _refresh_shards(self, stream_arn: str, routes: TableRoutes):
+        """Starts replicating shards that are new and whose parent was read completely."""
+
+        shards = retry_call(
+            partial(self.controller.source_db_client.list_stream_shards, stream_arn),
+            policy=self.controller.retry_policy,
+            counters=self.controller.retry_counters,
+            description=f"Listing shards of {stream_arn}",
+        )
+        shard_ids = {shard["ShardId"] for shard in shards}
+
+        for shard in shards:
+            cursor = ShardCursor(stream_arn=stream_arn, shard_id=shard["ShardId"], routes=routes)
+
+            if cursor.checkpoint_id in self._cursors or cursor.checkpoint_id in self._finished_shards:
+                continue
+
+            parent_id = shard.get("ParentShardId")
+
+            # Parents trimmed from the stream are read completely by definition
+            if parent_id in shard_ids and not self._shard_finished(
+                f"cdc#{stream_arn}#{parent_id}"
+            ):
+                continue
+
+            state = self.controller.checkpoints.load(cursor.checkpoint_id) or {}
+
+            if state.get("finished"):
+                self._finished_shards.add(cursor.checkpoint_id)
+                continue
+
+            cursor.sequence_number = state.get("sequence_number")
+            cursor.iterator = self._shard_iterator(cursor)
+            self._cursors[cursor.checkpoint_id] = cursor
+
+            logging.info(f"Replicating shard {cursor.shard_id} of {stream_arn}")
+
+    def _shard_finished(self, checkpoint_id: str) -> bool:
+        """Checks whether a shard was read completely by this or a previous run."""
+
+        if checkpoint_id in self._finished_shards:
+            return True
+        if checkpoint_id in self._cursors:
+            return False
+
+        if (self.controller.checkpoints.load(checkpoint_id) or {}).get("finished"):
+            self._finished_shards.add(checkpoint_id)
+            return True
+
+        return False
+
+    def _shard_iterator(self, cursor: ShardCursor) -> str:
+        """Returns an iterator after the last applied record of the shard."""
+
+        get_iterator = self.controller.source_db_client.get_shard_iterator
+
+        try:
+            return retry_call(
+                partial(get_iterator, cursor.stream_arn, cursor.shard_id, cursor.sequence_number),
+                policy=self.controller.retry_policy,
+                counters=self.controller.retry_counters,
+                description=f"Getting iterator of shard {cursor.shard_id}",
+            )
+        except StreamRecordsTrimmedError:
+            logging.info(
+                f"Records of shard {cursor.shard_id} after {cursor.sequence_number} were "
+                f"trimmed from the stream, changes in between are lost. "
+                f"Continuing from the oldest record"
+            )
+
+        return retry_call(
+            partial(get_iterator, cursor.stream_arn, cursor.shard_id),
+            policy=self.controller.retry_policy,
+            counters=self.controller.retry_counters,
+            description=f"Getting iterator of shard {cursor.shard_id}",
+        )
+
+    def _poll_shard(self, cursor: ShardCursor) -> bool:
+        """Reads and applies the next records of the shard. Runs on a stream thread.
+
+        Args:
+            cursor: ShardCursor of the shard
+
+        Returns: True if the shard is closed and was read completely
+        """
+
+        try:
+            with self.controller.metrics.track("fetch", cursor.routes.table_name) as operation:
+                read_result = retry_call(
+                    partial(self.controller.source_db_client.get_stream_records, cursor.iterator),
+                    policy=self.controller.retry_policy,
+                    counters=self.controller.retry_counters,
+                    description=f"Reading shard {cursor.shard_id}",
+                )
+                operation.add([record.document or record.keys for record in read_result.records])
+        except (ShardIteratorExpiredError, StreamRecordsTrimmedError):
+            cursor.iterator = self._shard_iterator(cursor)
+            return False
+
+        if read_result.records:
+            self._apply(routes=cursor.routes, read_result=read_result)
+            cursor.sequence_number = read_result.records[-1].sequence_number
+        else:
+            cursor.idle_until = time.monotonic() + self.migration_config.stream_poll_interval
+
+        cursor.iterator = read_result.next_iterator
+        self.controller.checkpoints.save(
+            checkpoint_id=cursor.checkpoint_id,
+            state={
+                "sequence_number": cursor.sequence_number,
+                "finished": cursor.iterator is None,
+            },
+        )
+
+        return cursor.iterator is None
+
+    def _apply(self, routes: TableRoutes, read_result: StreamReadResult):
+        """Applies the latest change of every document to its destination collections."""
+
+        # None marks a deleted document
+        changes: Dict[str, Dict[str, Optional[dict]]] = {}
+
+        for record in read_result.records:
+            doc_id = record.keys["id"]
+            destinations = routes.match(record.document) if record.document is not None else set()
+
+            if record.old_document is not None:
+                previous_destinations = routes.match(record.old_document)
+            elif record.event_name == "REMOVE":
+                # Streams without old images do not tell where the document was
+                previous_destinations = routes.destinations
+            else:
+                previous_destinations = set()
+
+            for destination in destinations:
+                changes.setdefault(destination, {})[doc_id] = record.document
+
+            for destination in previous_destinations - destinations:
+                changes.setdefault(destination, {})[doc_id] = None
+
+        for destination, documents in changes.items():
+            upserts = [doc for doc in documents.values() if doc is not None]
+            deleted_ids = [doc_id for doc_id, doc in documents.items() if doc is None]
+
+            if upserts and not read_result.normalized:
+                with self.controller.metrics.track("convert", destination) as operation:
+                    upserts = self.controller.container_manager.convert_documents(upserts)
+                    operation.add(upserts)
+
+            with self.controller.metrics.track("write", destination) as operation:
+                operation.add(upserts)
+                operation.add(deleted_ids)
+                retry_call(
+                    partial(self._write_changes, destination, upserts, deleted_ids),
+                    policy=self.controller.retry_policy,
+                    counters=self.controller.retry_counters,
+                    description=f"Applying changes to {destination}",
+                )
+
+            with self._counter_lock:
+                self.applied_count += len(documents)
+
+            logging.debug(
+                f"Applied {len(upserts)} upserts and {len(deleted_ids)} deletes to {destination}"
+            )
+
+    def _write_changes(self, destination: str, upserts: List[dict], deleted_ids: List[str]):
+        """Writes replaced and deleted documents into the destination collection."""
+
+        destination_db_client = self.controller.destination_db_client
+        destination_db_client.replace_documents(collection_name=destination, documents=upserts)
+        destination_db_client.delete_ids(collection_name=destination, id_list=deleted_ids)
+
+    def _finish_shard(self, cursor: ShardCursor):
+        """Stops replicating a shard that was read completely."""
+
+        self._cursors.pop(cursor.checkpoint_id, None)
+        self._finished_shards.add(cursor.checkpoint_id)
+
+        logging.info(f"Shard {cursor.shard_id} of {cursor.stream_arn} was replicated completely")
@@ -0,0 +1,263 @@
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, Iterable, Optional
+
+from migration.migration_utility import logging
+from migration.migration_utility.db_clients.generic import GenericClient
+from migration.migration_utility.metrics import MetricsRegistry
+
+# Internal database collection with the resume state of document configurations
+CHECKPOINTS_COLLECTION_NAME = "migration_checkpoints"
+
+
+class CheckpointWriter:
+    """Keeps resume state of the migration in the internal database without blocking
+    the migration on it.
+
+    Saved states are coalesced in memory, only the latest fields of every checkpoint
+    are written, and flushed with a single bulk from a background thread on a timer and
+    when the writer is closed. Loads see states that are not flushed yet.
+    """
+
+    def __init__(
+        self,
+        db_client: GenericClient,
+        flush_interval: float = 5.0,
+        metrics: MetricsRegistry = None,
+    ):
+        """Initializes the writer.
+
+        Args:
+            db_client: client of the internal database
+            flush_interval: seconds between two flushes
+            metrics: MetricsRegistry the flushes are reported to
+        """
+
+        self.db_client = db_client
+        self.flush_interval = flush_interval
+        self.metrics = metrics or MetricsRegistry()
+
+        self._pending: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def save(self, checkpoint_id: str, state: dict):
+        """Merges fields into the pending state of the checkpoint.
+
+        Args:
+            checkpoint_id: id of the checkpoint document
+            state: fields of the checkpoint to update
+
+        Returns: None
+        """
+
+        with self._lock:
+            self._pending.setdefault(checkpoint_id, {}).update(state)
+            self._start()
+
+    def load(self, checkpoint_id: str) -> Optional[dict]:
+        """Returns the state of the checkpoint, including fields not flushed yet.
+
+        Args:
+            checkpoint_id: id of the checkpoint document
+
+        Returns: state of the checkpoint or None if it was never saved
+        """
+
+        return self.merge_pending(
+            checkpoint_id=checkpoint_id,
+            stored_state=self.db_client.find_document(
+                collection_name=CHECKPOINTS_COLLECTION_NAME, doc_id=checkpoint_id
+            ),
+        )
+
+    def merge_pending(self, checkpoint_id: str, stored_state: Optional[dict]) -> Optional[dict]:
+        """Updates a state read from the internal database with the pending fields.
+
+        Args:
+            checkpoint_id: id of the checkpoint document
+            stored_state: checkpoint document read from the internal database
+
+        Returns: state of the checkpoint or None if it was never saved
+        """
+
+        with self._lock:
+            pending_state = self._pending.get(checkpoint_id)
+
+        if stored_state is None and pending_state is None:
+            return None
+
+        return {**(stored_state or {}), **(pending_state or {})}
+
+    def flush(self):
+        """Writes all pending states with a single bulk. States that failed to be written
+        are kept pending, fields saved in the meantime take precedence."""
+
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+
+            if not pending:
+                return
+
+            updated_at = datetime.now(timezone.utc).isoformat(timespec="microseconds")
+            documents = [
+                {"id": checkpoint_id, **state, "updated_at": updated_at}
+                for checkpoint_id, state in pending.items()
+            ]
+
+            try:
+                with self.metrics.track("checkpoint", CHECKPOINTS_COLLECTION_NAME) as operation:
+                    operation.add(documents)
+                    self.db_client.batch_write(
+                        collection_name=CHECKPOINTS_COLLECTION_NAME, documents=documents
+                    )
+            except Exception:
+                with self._lock:
+                    for checkpoint_id, state in pending.items():
+                        self._pending[checkpoint_id] = {
+                            **state, **self._pending.get(checkpoint_id, {})
+                        }
+
+                raise
+
+    def close(self):
+        """Stops the background thread and flushes all pending states. The writer
+        starts again on the next save."""
+
+        with self._lock:
+            thread, self._thread = self._thread, None
+
+        if thread is not None:
+            self._stop_event.set()
+            thread.join()
+            self._stop_event.clear()
+
+        self.flush()
+
+    def _start(self):
+        """Starts the background thread unless it is running. Called under the lock."""
+
+        if self._thread is not None:
+            return
+
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        """Flushes pending states until the writer is closed."""
+
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as exc:
+                # Pending states are kept and written by the next flush
+                logging.info(f"Flushing checkpoints failed --> {exc!r}")
+
+
+class ResumePoint:
+    """Resume state of a read page, e.g. its last evaluated key. It is held while the
+    page is written and marked and while retries parked for the page are pending."""
+
+    def __init__(self, states: Dict[str, dict]):
+        """Initializes a point held by the reader of the page.
+
+        Args:
+            states: fields of the checkpoints to save once the page is migrated, keyed
+                by the checkpoint id
+        """
+
+        self.states = states
+        self.holds = 1
+
+
+class ResumeLog:
+    """Saves resume states of read pages once the pages are migrated, in the order the
+    pages were read.
+
+    Pages are read ahead of writes and written by concurrent workers, so saving the
+    state of a page when it is read, or when it alone is written, lets a restart skip
+    pages that were never written. A checkpoint only moves to the state of a page when
+    that page and all pages read before it with the same checkpoint are released.
+    Pages whose parked retries are exhausted stay held, so a restart reads them again.
+    """
+
+    def __init__(self, checkpoints: CheckpointWriter):
+        """Initializes an empty log.
+
+        Args:
+            checkpoints: CheckpointWriter the released states are saved with
+        """
+
+        self.checkpoints = checkpoints
+
+        self._points: Dict[str, Deque[ResumePoint]] = {}
+        self._lock = threading.Lock()
+
+    def read(self, states: Dict[str, dict]) -> Optional[ResumePoint]:
+        """Registers the resume state of a page that was just read.
+
+        Args:
+            states: fields of the checkpoints keyed by the checkpoint id
+
+        Returns: ResumePoint held by the caller or None if there is nothing to save
+        """
+
+        if not states:
+            return None
+
+        point = ResumePoint(states=states)
+
+        with self._lock:
+            for checkpoint_id in states:
+                self._points.setdefault(checkpoint_id, deque()).append(point)
+
+        return point
+
+    def hold(self, points: Iterable[Optional[ResumePoint]]):
+        """Holds the points for work parked for their pages, e.g. retries. Every hold
+        is released separately."""
+
+        with self._lock:
+            for point in points:
+                if point is not None:
+                    point.holds += 1
+
+    def release(self, points: Iterable[Optional[ResumePoint]]):
+        """Releases the points and saves the states of all leading released points.
+
+        Args:
+            points: ResumePoint instances of the migrated pages, None items are skipped
+
+        Returns: None
+        """
+
+        with self._lock:
+            states: Dict[str, dict] = {}
+
+            for point in points:
+                if point is None:
+                    continue
+
+                point.holds -= 1
+
+                if point.holds:
+                    continue
+
+                for checkpoint_id in point.states:
+                    queued = self._points.get(checkpoint_id, deque())
+
+                    while queued and not queued[0].holds:
+                        states.setdefault(checkpoint_id, {}).update(
+                            queued.popleft().states[checkpoint_id]
+                        )
+
+                    if not queued:
+                        self._points.pop(checkpoint_id, None)
+
+            # Saved under the lock, so a concurrent release cannot save an older state last
+            for checkpoint_id, state in states.items():
+                self.checkpoints.save(checkpoint_id=checkpoint_id, state=state)
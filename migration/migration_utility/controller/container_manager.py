@@ -1,14 +1,19 @@
 from typing import List
 
-import simplejson
+from migration.migration_utility.converters import DocumentNormalizer
 
 
 class ContainerManager:
     """Container manager."""
 
-    def __init__(self):
-        """Initializes the manager."""
+    def __init__(self, normalizer: DocumentNormalizer = None):
+        """Initializes the manager.
 
+        Args:
+            normalizer: DocumentNormalizer instance that converts fetched documents
+        """
+
+        self.normalizer = normalizer or DocumentNormalizer()
         self._primary_bucket = []
         self.transit_bucket = []
         self.retry_bucket = []
@@ -43,15 +48,16 @@ class ContainerManager:
 
         self.new_arrival = True if document else False
 
-        document = simplejson.loads(simplejson.dumps(document, use_decimal=True))
+        document = self.normalizer.normalize(document)
 
         self._primary_bucket.append(document)
 
-    def add_documents(self, documents: List[dict]):
+    def add_documents(self, documents: List[dict], normalized: bool = False):
         """Adds the passed in document into the container.
 
         Args:
             documents: the documents to add into the container
+            normalized: indicates whether the documents are already in the destination format
 
         Returns: None
         """
@@ -61,12 +67,20 @@ class ContainerManager:
         if not self.new_arrival:
             return
 
-        documents = [
-            simplejson.loads(simplejson.dumps(doc, use_decimal=True))
-            for doc in documents
-        ]
+        self._primary_bucket.extend(
+            documents if normalized else self.convert_documents(documents)
+        )
+
+    def convert_documents(self, documents: List[dict]) -> List[dict]:
+        """Converts source documents into plain data types accepted by the destination.
+
+        Args:
+            documents: the documents to convert
+
+        Returns: list of converted documents
+        """
 
-        self._primary_bucket.extend(documents)
+        return self.normalizer.normalize_documents(documents)
 
     def empty_container(self):
         """Resets the container to an empty state.
@@ -0,0 +1,346 @@
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from migration.migration_utility import logging
+from migration.migration_utility.configuration.document_configuration import (
+    DocumentConfiguration,
+)
+from migration.migration_utility.configuration.migration_configuration import (
+    MigrationConfigurator,
+)
+from migration.migration_utility.retry import retry_call
+from migration_utility.enums import FieldQueryOperation, MarkingMode
+from migration_utility.exceptions import (
+    FetchingTerminatedError,
+    InsertionWasCancelledError,
+    RetryableFetchingError,
+)
+
+if TYPE_CHECKING:
+    from migration.migration_utility.controller.migration_controller import (
+        MigrationController,
+    )
+
+
+class DocumentFamily:
+    """Configuration of a parent document together with the configurations of its
+    child documents."""
+
+    def __init__(self, parent_cfg: DocumentConfiguration):
+        """Initializes the family.
+
+        Args:
+            parent_cfg: configuration that reads the parent document by its id
+        """
+
+        self.parent_cfg = parent_cfg
+        self.child_cfgs: List[DocumentConfiguration] = []
+
+    @property
+    def parent_id(self) -> str:
+        """Returns id of the parent document."""
+
+        return self.parent_cfg.queries[0].value
+
+    @property
+    def document_cfgs(self) -> List[DocumentConfiguration]:
+        """Returns configurations of the parent and all children."""
+
+        return [self.parent_cfg, *self.child_cfgs]
+
+
+class HierarchicalMigrationRunner:
+    """Migrates document families of the hierarchical flow group by group. Parents of a
+    group are read with BatchGetItem, index queries of their children run concurrently
+    and the documents are written with a single bulk per destination collection, so a
+    group costs a few round trips instead of three sequential reads per parent.
+    """
+
+    def __init__(
+        self, controller: "MigrationController", migration_config: MigrationConfigurator
+    ):
+        """Initializes the runner.
+
+        Args:
+            controller: MigrationController that owns database clients and configurations
+            migration_config: MigrationConfigurator instance with group and worker sizes
+        """
+
+        self.controller = controller
+        self.migration_config = migration_config
+
+        self.migrated_count = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def run(
+        self, document_configs: Iterable[DocumentConfiguration], find_all: bool = False
+    ) -> List[DocumentConfiguration]:
+        """Migrates all document families found in the configurations. Configurations
+        are consumed lazily, so only the families of the current group are kept in
+        memory.
+
+        Args:
+            document_configs: DocumentConfiguration instances, e.g. a lazy iterator
+            find_all: if True documents are read regardless of their migration status
+
+        Returns: list of configurations that do not belong to any family
+        """
+
+        remaining_cfgs = []
+
+        with ThreadPoolExecutor(
+            max_workers=self.migration_config.child_query_workers,
+            thread_name_prefix="hierarchy-query",
+        ) as executor:
+            self._executor = executor
+
+            for group in self.group_families(
+                document_configs=document_configs, remaining_cfgs=remaining_cfgs
+            ):
+                logging.debug(
+                    f"Migrating a group of {len(group)} document families "
+                    f"of {group[0].parent_cfg.source_collection_name}"
+                )
+                self._migrate_group(group=group, find_all=find_all)
+
+        self._executor = None
+
+        logging.info(f"Total migrated: {self.migrated_count}")
+
+        return remaining_cfgs
+
+    def group_families(
+        self,
+        document_configs: Iterable[DocumentConfiguration],
+        remaining_cfgs: List[DocumentConfiguration],
+    ) -> Iterator[List[DocumentFamily]]:
+        """Groups configurations of parents read by id with the configurations of their
+        children that query an index by the parent id. Children are expected to follow
+        their parent, a group is yielded when it is full and the next parent arrives.
+
+        Args:
+            document_configs: DocumentConfiguration instances
+            remaining_cfgs: list that collects the configurations outside of any family
+
+        Returns: iterator of groups of families whose parents come from the same collection
+        """
+
+        group_size = self.migration_config.parent_group_size
+        # Families of the group being filled, per parent collection
+        groups: Dict[str, Dict[Tuple[str, str], DocumentFamily]] = OrderedDict()
+
+        for document_cfg in document_configs:
+            if document_cfg.related_document is None and document_cfg.find_one:
+                family = DocumentFamily(parent_cfg=document_cfg)
+                group = groups.setdefault(document_cfg.source_collection_name, OrderedDict())
+
+                if len(group) >= group_size:
+                    yield list(group.values())
+                    group.clear()
+
+                group.setdefault((document_cfg.type, family.parent_id), family)
+                continue
+
+            family = self._find_family(groups=groups, document_cfg=document_cfg)
+
+            if family is None:
+                remaining_cfgs.append(document_cfg)
+            else:
+                family.child_cfgs.append(document_cfg)
+
+        for group in groups.values():
+            if group:
+                yield list(group.values())
+
+    def _find_family(
+        self,
+        groups: Dict[str, Dict[Tuple[str, str], DocumentFamily]],
+        document_cfg: DocumentConfiguration,
+    ) -> Optional[DocumentFamily]:
+        """Returns the family of the groups being filled the child configuration belongs to."""
+
+        parent_id = self._parent_id(document_cfg)
+
+        if parent_id is None:
+            return None
+
+        for group in groups.values():
+            family = group.get((document_cfg.related_document.type, parent_id))
+
+            if family is not None:
+                return family
+
+        return None
+
+    @staticmethod
+    def _parent_id(document_cfg: DocumentConfiguration) -> Optional[str]:
+        """Returns the parent id a child configuration queries its index with."""
+
+        if not document_cfg.related_document or not document_cfg.query_index_name:
+            return None
+
+        for query in document_cfg.queries or []:
+            if (
+                query.field_name == document_cfg.related_document.relation_field
+                and query.operation == FieldQueryOperation.EQ
+            ):
+                return query.value
+
+        return None
+
+    def _migrate_group(self, group: List[DocumentFamily], find_all: bool):
+        """Reads, writes and marks all documents of a group of families.
+
+        Args:
+            group: families whose parents come from the same collection
+            find_all: if True documents are read regardless of their migration status
+
+        Returns: None
+        """
+
+        source_db_client = self.controller.source_db_client
+        parent_cfg = group[0].parent_cfg
+
+        child_futures: List[Tuple[DocumentConfiguration, Future]] = [
+            (
+                child_cfg,
+                self._executor.submit(
+                    self._read,
+                    child_cfg,
+                    partial(
+                        source_db_client.query_all,
+                        collection_name=child_cfg.source_collection_name,
+                        queries=child_cfg.queries,
+                        query_index_name=child_cfg.query_index_name,
+                        find_all=find_all,
+                    ),
+                    description=f"Fetching from {child_cfg.source_collection_name}",
+                ),
+            )
+            for family in group
+            for child_cfg in family.child_cfgs
+        ]
+        parents = self._read(
+            parent_cfg,
+            partial(
+                source_db_client.batch_get,
+                collection_name=parent_cfg.source_collection_name,
+                id_list=[family.parent_id for family in group],
+            ),
+            description=f"Fetching from {parent_cfg.source_collection_name}",
+        )
+
+        # Documents of every destination collection are written with a single bulk
+        bulks: Dict[str, List[Tuple[DocumentConfiguration, List[dict]]]] = OrderedDict()
+        bulks[parent_cfg.destination_collection_name] = [(parent_cfg, parents)]
+
+        for child_cfg, future in child_futures:
+            bulks.setdefault(child_cfg.destination_collection_name, []).append(
+                (child_cfg, future.result())
+            )
+
+        for family in group:
+            for document_cfg in family.document_cfgs:
+                document_cfg.all_fetched = True
+
+        for parts in bulks.values():
+            self._write(parts=parts, find_all=find_all)
+
+    def _read(
+        self, document_cfg: DocumentConfiguration, request: Callable, description: str
+    ) -> List[dict]:
+        """Sends a read request with retries and converts the read documents.
+
+        Args:
+            document_cfg: configuration of the read documents
+            request: function without arguments that returns a ReadQueryResult
+            description: description of the request used in logs
+
+        Returns: list of converted documents
+        """
+
+        try:
+            with self.controller.metrics.track("fetch", document_cfg.collection_name) as operation:
+                query_result = retry_call(
+                    request,
+                    policy=self.controller.retry_policy,
+                    counters=self.controller.retry_counters,
+                    description=description,
+                )
+                operation.add(query_result.documents)
+        except RetryableFetchingError as exc:
+            raise FetchingTerminatedError(f"Terminating {description}") from exc
+
+        if query_result.normalized or not query_result.documents:
+            return query_result.documents
+
+        return self.controller.convert_documents(
+            document_cfg=document_cfg, documents=query_result.documents
+        )
+
+    def _write(self, parts: List[Tuple[DocumentConfiguration, List[dict]]], find_all: bool):
+        """Writes documents of a destination collection with a single bulk, then counts
+        and marks them under the configurations they were read with. Documents the
+        destination did not process are parked for a retry.
+
+        Args:
+            parts: configurations that share the destination collection, each with
+                its converted documents
+            find_all: if True documents are written regardless of their migration status
+
+        Returns: None
+        """
+
+        if self.migration_config.marking_mode == MarkingMode.LEDGER and not find_all:
+            parts = [
+                (
+                    document_cfg,
+                    self.controller.ledger.filter_unmigrated(
+                        document_cfg=document_cfg, documents=documents
+                    ),
+                )
+                for document_cfg, documents in parts
+            ]
+
+        parts = [(document_cfg, documents) for document_cfg, documents in parts if documents]
+
+        if not parts:
+            return
+
+        # The bulk is written under the first configuration of the destination
+        bulk_cfg = parts[0][0]
+        documents = [doc for _, part_documents in parts for doc in part_documents]
+
+        try:
+            query_res = self.controller.write_documents(document_cfg=bulk_cfg, documents=documents)
+        except InsertionWasCancelledError as exc:
+            query_res = self.controller.save_cancelled_documents(document_cfg=bulk_cfg, exc=exc)
+            cancelled = True
+        else:
+            cancelled = False
+
+        processed_ids = set(query_res.processed_document_ids)
+
+        for document_cfg, part_documents in parts:
+            id_list = [doc.get("id") for doc in part_documents if doc.get("id") in processed_ids]
+            unprocessed_documents = [
+                doc for doc in part_documents if doc.get("id") not in processed_ids
+            ]
+
+            if unprocessed_documents and not cancelled:
+                self.controller.park_documents(
+                    document_cfg=document_cfg, documents=unprocessed_documents
+                )
+
+            self.controller.count_migrated(document_cfg=document_cfg, count=len(id_list))
+            self.migrated_count += len(id_list)
+
+            if id_list:
+                self.controller.mark_migrated(document_cfg=document_cfg, id_list=id_list)
+
+        logging.debug(
+            f"Inserted {query_res.processed_count} documents "
+            f"into {bulk_cfg.destination_collection_name}"
+        )
@@ -0,0 +1,110 @@
+from datetime import datetime, timezone
+from typing import List
+
+from migration.migration_utility.configuration.document_configuration import (
+    DocumentConfiguration,
+)
+from migration.migration_utility.db_clients.mongodb.mongodb_client import MongoDbClient
+
+
+class MigrationLedger:
+    """Keeps IDs of migrated documents in the internal database, so the source database
+    is never written during migration. Every collection has its own ledger collection
+    with compact {_id: <document id>, t: <migration time>} entries.
+    """
+
+    def __init__(self, db_client: MongoDbClient):
+        """Initializes the ledger.
+
+        Args:
+            db_client: client of the internal database. Asynchronous methods of the
+                ledger require an asynchronous client
+        """
+
+        self.db_client = db_client
+
+    @staticmethod
+    def ledger_collection_name(document_cfg: DocumentConfiguration) -> str:
+        """Returns name of the ledger collection of the document configuration."""
+
+        return f"{document_cfg.destination_collection_name}_migrated_ids"
+
+    def filter_unmigrated(
+        self, document_cfg: DocumentConfiguration, documents: List[dict]
+    ) -> List[dict]:
+        """Drops documents that are already recorded in the ledger.
+
+        Args:
+            document_cfg: configuration of the documents
+            documents: fetched documents
+
+        Returns: list of documents that were not migrated yet
+        """
+
+        if not documents:
+            return documents
+
+        migrated_ids = set(
+            self.db_client.find_ids(
+                collection_name=self.ledger_collection_name(document_cfg),
+                id_list=[doc.get("id") for doc in documents],
+            )
+        )
+
+        return [doc for doc in documents if doc.get("id") not in migrated_ids]
+
+    def record(self, document_cfg: DocumentConfiguration, id_list: List[str]):
+        """Records the given IDs as migrated.
+
+        Args:
+            document_cfg: configuration of the migrated documents
+            id_list: IDs of the migrated documents
+
+        Returns: None
+        """
+
+        self.db_client.upsert_ids(
+            collection_name=self.ledger_collection_name(document_cfg),
+            id_list=id_list,
+            fields={"t": datetime.now(timezone.utc)},
+        )
+
+    def forget(self, document_cfg: DocumentConfiguration, id_list: List[str]):
+        """Removes the given IDs from the ledger, so they are migrated again.
+
+        Args:
+            document_cfg: configuration of the documents
+            id_list: IDs of the documents
+
+        Returns: None
+        """
+
+        self.db_client.delete_ids(
+            collection_name=self.ledger_collection_name(document_cfg), id_list=id_list
+        )
+
+    async def afilter_unmigrated(
+        self, document_cfg: DocumentConfiguration, documents: List[dict]
+    ) -> List[dict]:
+        """Asynchronous version of filter_unmigrated()."""
+
+        if not documents:
+            return documents
+
+        migrated_ids = set(
+            await self.db_client.afind_ids(
+                collection_name=self.ledger_collection_name(document_cfg),
+                id_list=[doc.get("id") for doc in documents],
+            )
+        )
+
+        return [doc for doc in documents if doc.get("id") not in migrated_ids]
+
+    async def arecord(self, document_cfg: DocumentConfiguration, id_list: List[str]):
+        """Asynchronous version of record()."""
+
+        await self.db_client.aupsert_ids(
+            collection_name=self.ledger_collection_name(document_cfg),
+            id_list=id_list,
+            fields={"t": datetime.now(timezone.utc)},
+        )
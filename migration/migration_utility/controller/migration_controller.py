@@ -1,20 +1,39 @@
-import asyncio
+import itertools
+import threading
 import time
+from contextlib import nullcontext
 from datetime import datetime, timezone
-from migration.migration_utility import logging
-from typing import List
+from functools import partial
+from migration.migration_utility import event_loop, logging
+from typing import ContextManager, Dict, Iterable, List, Optional
 
 from migration.migration_utility.configuration.db_configuration import DbConfigurator
 from migration.migration_utility.configuration.document_configuration import (
     DocumentConfiguration,
 )
+from migration.migration_utility.configuration.migration_configuration import (
+    MigrationConfigurator,
+)
+from migration.migration_utility.controller.async_migration import AsyncMigrationRunner
+from migration.migration_utility.controller.cdc import StreamReplicator
+from migration.migration_utility.controller.checkpoint import CheckpointWriter, ResumeLog, ResumePoint
 from migration.migration_utility.controller.container_manager import ContainerManager
+from migration.migration_utility.controller.hierarchical import HierarchicalMigrationRunner
+from migration.migration_utility.controller.ledger import MigrationLedger
+from migration.migration_utility.controller.pipeline import MigrationPipeline
+from migration.migration_utility.controller.progress import ProgressReporter, ProgressTracker
+from migration.migration_utility.controller.sharding import ShardAssignment
+from migration.migration_utility.controller.verification import MigrationVerifier
+from migration.migration_utility.converters import DocumentNormalizer
+from migration.migration_utility.metrics import MetricsExporter, MetricsRegistry
 from migration.migration_utility.db_clients.generic import GenericClient
-from migration_utility.data_types import ReadQueryResult, WriteQueryResult
-from migration_utility.enums import FlowNames
+from migration.migration_utility.retry import RetryCounters, RetryPolicy, RetryQueue, retry_call
+from migration_utility.data_types import ReadQueryResult, VerificationReport, WriteQueryResult
+from migration_utility.enums import FlowNames, MarkingMode
 from migration_utility.exceptions import (
     InsertionWasCancelledError,
     RetryableFetchingError,
+    RetryableWriteError,
     FetchingTerminatedError,
 )
 
@@ -27,9 +46,12 @@ class MigrationController:
         source_db_config: DbConfigurator,
         destination_db_config: DbConfigurator,
         internal_db_config: DbConfigurator,
-        document_configs: List[DocumentConfiguration],
+        document_configs: Iterable[DocumentConfiguration],
         collections_to_migrate: List[str] = None,
-        flow: str = "flat"
+        flow: str = "flat",
+        migration_config: MigrationConfigurator = None,
+        metrics: MetricsRegistry = None,
+        progress: ProgressTracker = None,
     ):
         """Initializes migration controller object with the given arguments.
 
@@ -37,9 +59,14 @@ class MigrationController:
             source_db_config: DbConfigurator instance for the source database
             destination_db_config: DbConfigurator instance for the destination database
             internal_db_config: DbConfigurator instance for the internal database
-            document_configs: list of DocumentConfiguration instances, which describe documents/collections
+            document_configs: DocumentConfiguration instances, which describe documents/collections. may be a lazy iterator
             collections_to_migrate: a list of collections that need to be migrated. all will be migrated if set to None
             flow: migration flow that will be used
+            migration_config: MigrationConfigurator instance with settings of the migration process
+            metrics: MetricsRegistry shared with other controllers, its owner publishes it.
+                The controller publishes its own registry by default
+            progress: ProgressTracker shared with other controllers, its owner reports it.
+                The controller reports its own progress by default
         """
 
         self.source_db_config = source_db_config
@@ -47,18 +74,33 @@ class MigrationController:
         self.internal_db_config = internal_db_config
         self.collections_to_migrate = collections_to_migrate
         self.flow = flow
+        self.migration_config = migration_config or MigrationConfigurator()
 
         self._source_db_client = None
         self._destination_db_client = None
         self._internal_db_client = None
+        self._ledger = None
+        self._checkpoints = None
+        self._resume_log = None
+        self._resume_points: List[ResumePoint] = []
+        self._watermarks = {}
 
         self.migration_counter = 0
+        self.migrated_total = 0
+        self._migrated_lock = threading.Lock()
+        self._owns_metrics = metrics is None
+        self.metrics = metrics or MetricsRegistry(
+            track_bytes=self.migration_config.metrics_exporter is not None
+        )
 
         self._document_configuration = None
+        self._segments_restored = False
+        self._checkpoint_restored = False
 
         if not collections_to_migrate:
             self._document_configs = document_configs
         else:
+            document_configs = list(document_configs)
             self._document_configs = [
                 cfg
                 for col_name in self.collections_to_migrate
@@ -66,11 +108,51 @@ class MigrationController:
                 if cfg.source_collection_name == col_name
             ]
 
+        self.shard = None
+
+        if self.migration_config.shard_count > 1:
+            # Asynchronous reads do not use scan segments, so scans are assigned whole
+            self.shard = ShardAssignment(
+                shard_index=self.migration_config.shard_index,
+                shard_count=self.migration_config.shard_count,
+                split_segments=not self.migration_config.asynchronous,
+            )
+            shard_configs = self.shard.filter_document_configs(
+                self._document_configs, scan_segments=self.source_db_config.scan_segments
+            )
+            self._document_configs = (
+                list(shard_configs) if isinstance(self._document_configs, list) else shard_configs
+            )
+
+        self.retry_policy = RetryPolicy(
+            max_attempts=self.migration_config.retry_max_attempts,
+            base_delay=self.migration_config.retry_base_delay,
+            max_delay=self.migration_config.retry_max_delay,
+        )
+        self.retry_counters = RetryCounters()
+        self.retry_queue = RetryQueue(
+            policy=self.retry_policy,
+            counters=self.retry_counters,
+            workers=self.migration_config.retry_workers,
+        )
+
         self.current_doc_cfg = self.next_document_configuration
-        self.container_manager = ContainerManager()
+        self.container_manager = ContainerManager(
+            normalizer=DocumentNormalizer(number_mode=self.migration_config.number_mode)
+        )
 
         self.connect()
 
+        self._owns_progress = progress is None
+        self.progress = progress or ProgressTracker(window=self.migration_config.progress_window)
+
+        if self.progress.size_source is None:
+            self.progress.size_source = self.source_db_client.describe_size
+
+        if isinstance(self._document_configs, list):
+            # Collections known up front count into the overall time left from the start
+            self.progress.register(self._document_configs)
+
     @property
     def document_configuration(self):
         """
@@ -110,7 +192,9 @@ class MigrationController:
         """Client object of the source database."""
 
         if not self._source_db_client:
-            self._source_db_client = self.source_db_config.create_client()
+            self._source_db_client = self.source_db_config.create_client(
+                normalizer=self.container_manager.normalizer
+            )
 
         return self._source_db_client
 
@@ -133,126 +217,501 @@ class MigrationController:
         return self._internal_db_client
 
     @property
-    def last_fetched_key(self) -> dict:
-        """Returns the latest evaluated document."""
+    def ledger(self) -> MigrationLedger:
+        """Ledger of migrated document IDs kept in the internal database."""
 
-        if not self.source_db_client.last_fetched_key \
-                and not self.current_doc_cfg.all_fetched \
-                and self.flow not in [FlowNames.HIERARCHICAL]:
-            self.source_db_client.set_last_document(
-                self.internal_db_client.find_document(
-                    collection_name=self.current_doc_cfg.destination_collection_name,
-                    doc_id="LastEvaluatedKey",
-                )
-                or {}
+        if not self._ledger:
+            self._ledger = MigrationLedger(db_client=self.internal_db_client)
+
+        return self._ledger
+
+    @property
+    def checkpoints(self) -> CheckpointWriter:
+        """Writer of the resume state kept in the internal database."""
+
+        if not self._checkpoints:
+            self._checkpoints = CheckpointWriter(
+                db_client=self.internal_db_client,
+                flush_interval=self.migration_config.checkpoint_interval,
+                metrics=self.metrics,
             )
 
+        return self._checkpoints
+
+    @property
+    def resume_log(self) -> ResumeLog:
+        """Log that saves resume states of read pages once they are migrated."""
+
+        if not self._resume_log:
+            self._resume_log = ResumeLog(checkpoints=self.checkpoints)
+
+        return self._resume_log
+
+    @property
+    def last_fetched_key(self) -> dict:
+        """Returns the latest evaluated document."""
+
         return self.source_db_client.last_fetched_key
 
+    def checkpointed(self, document_cfg: DocumentConfiguration) -> bool:
+        """Checks whether the configuration keeps its resume state in a checkpoint of its
+        own. Reads by id and the configurations of the hierarchical flow are too many to
+        be checkpointed one by one, parallel scans are checkpointed per segment.
+
+        Args:
+            document_cfg: DocumentConfiguration instance
+
+        Returns: True if the configuration has a checkpoint
+        """
+
+        if document_cfg.find_one or self.flow in [FlowNames.HIERARCHICAL]:
+            return False
+
+        return not (
+            document_cfg.scan
+            and self.source_db_config.scan_segments > 1
+            and not self.migration_config.asynchronous
+        )
+
     def connect(self) -> tuple:
         """Connects to all databases by calling client creation."""
 
         return self.source_db_client, self.destination_db_client, self.internal_db_client
 
     def fetch(self, find_all: bool = False) -> ReadQueryResult:
-        """Fetches documents from the source database."""
+        """Fetches documents from the source database into the container."""
+
+        query_result = self.read_next_batch(find_all=find_all)
+        documents = query_result.documents
+
+        if documents and not query_result.normalized:
+            documents = self.convert_documents(
+                document_cfg=self.current_doc_cfg, documents=documents
+            )
+
+        self.container_manager.add_documents(documents=documents, normalized=True)
 
-        self.source_db_client.set_last_document(last_document=self.last_fetched_key)
+        if query_result.resume_point is not None:
+            self._resume_points.append(query_result.resume_point)
 
-        if self.current_doc_cfg.all_fetched is True:
+        return query_result
+
+    def convert_documents(
+        self, document_cfg: DocumentConfiguration, documents: List[dict]
+    ) -> List[dict]:
+        """Converts source documents into the destination format.
+
+        Args:
+            document_cfg: configuration the documents were read with
+            documents: documents read from the source
+
+        Returns: list of converted documents
+        """
+
+        with self.metrics.track("convert", document_cfg.collection_name) as operation:
+            documents = self.container_manager.convert_documents(documents)
+            operation.add(documents)
+
+        return documents
+
+    def read_next_batch(self, find_all: bool = False) -> ReadQueryResult:
+        """Reads the next batch of documents from the source database, switching to the
+        next document configuration when the current one is fully fetched.
+
+        The resume state of the batch is not saved until the returned resume point is
+        released, after its documents are written and marked.
+
+        Args:
+            find_all: if True documents are read regardless of their migration status
+
+        Returns: ReadQueryResult instance
+        """
+
+        if not self._checkpoint_restored:
+            self._restore_checkpoint(find_all=find_all)
+
+        # Configurations completed by a previous run are skipped as well
+        while self.current_doc_cfg.all_fetched is True:
             self.migration_counter += self.current_doc_cfg.num_migrated
 
             logging.info(f"Total migrated: {self.migration_counter}")
 
             self.current_doc_cfg = self.next_document_configuration
+            self._segments_restored = False
 
             if self.current_doc_cfg is None:
                 return ReadQueryResult(documents=[], has_more=False)
 
+            self._restore_checkpoint(find_all=find_all)
+
+        if self.source_db_config.scan_segments > 1 and not self._segments_restored:
+            self._restore_segment_keys(find_all=find_all)
+
         try:
-            if self.current_doc_cfg.find_one:
-                query_result = self.source_db_client.find_document(
-                    collection_name=self.current_doc_cfg.source_collection_name,
-                    doc_id=self.current_doc_cfg.queries[0].value
-                )
-            else:
-                query_result = self.source_db_client.find(
-                    collection_name=self.current_doc_cfg.source_collection_name,
-                    queries=self.current_doc_cfg.queries,
-                    query_index_name=self.current_doc_cfg.query_index_name,
-                    find_all=find_all,
-                )
+            query_result = self.query_source(find_all=find_all)
         except RetryableFetchingError:
             query_result = self.retry_fetch(find_all=find_all)
 
-        self.container_manager.add_documents(documents=query_result.documents)
+        self.track_watermark(document_cfg=self.current_doc_cfg, documents=query_result.documents)
 
-        self.current_doc_cfg.all_fetched = query_result.has_more is False
+        if self.migration_config.marking_mode == MarkingMode.LEDGER and not find_all:
+            query_result.documents = self.ledger.filter_unmigrated(
+                document_cfg=self.current_doc_cfg, documents=query_result.documents
+            )
 
-        if query_result.last_evaluated_key:
-            self.internal_db_client.update(
-                collection_name=self.current_doc_cfg.destination_collection_name,
-                update_data={
-                    "_id": "LastEvaluatedKey",
-                    **query_result.last_evaluated_key,
-                },
+        self.current_doc_cfg.all_fetched = query_result.has_more is False
+        query_result.resume_point = self.resume_log.read(
+            states=self._resume_states(
+                document_cfg=self.current_doc_cfg, query_result=query_result
             )
+        )
+
+        if not query_result.documents:
+            # Nothing to migrate, the state is saved after the pages read before it
+            self.resume_log.release([query_result.resume_point])
+            query_result.resume_point = None
 
         return query_result
 
-    def insert(self) -> WriteQueryResult:
-        """Inserts the documents from the container into destination DB."""
+    def _resume_states(
+        self, document_cfg: DocumentConfiguration, query_result: ReadQueryResult
+    ) -> Dict[str, dict]:
+        """Returns the checkpoint states that resume reading after the batch: last
+        evaluated keys of the parallel scan segments, one checkpoint per segment, or the
+        last evaluated key of the configuration.
+
+        Args:
+            document_cfg: configuration the batch was read with
+            query_result: ReadQueryResult of the batch
+
+        Returns: dict of checkpoint states keyed by the checkpoint id
+        """
+
+        if query_result.segment_keys:
+            return {
+                f"{document_cfg.checkpoint_key}#{segment}": {
+                    "destination_collection_name": document_cfg.destination_collection_name,
+                    "segment": segment,
+                    "total_segments": self.source_db_config.scan_segments,
+                    "last_evaluated_key": last_evaluated_key,
+                    "exhausted": last_evaluated_key is None,
+                }
+                for segment, last_evaluated_key in query_result.segment_keys.items()
+            }
+
+        if self.checkpointed(document_cfg):
+            return {
+                document_cfg.checkpoint_key: {
+                    "destination_collection_name": document_cfg.destination_collection_name,
+                    "last_evaluated_key": query_result.last_evaluated_key,
+                    "all_fetched": query_result.has_more is False,
+                }
+            }
+
+        return {}
+
+    def watermarked(self, document_cfg: DocumentConfiguration) -> bool:
+        """Checks whether the configuration tracks a high-water mark. Marks are tracked
+        by every run, so the bulk load sets the mark the first incremental run starts from.
+
+        Args:
+            document_cfg: DocumentConfiguration instance
+
+        Returns: True for index queries with a watermark field
+        """
+
+        return bool(
+            document_cfg.watermark_field
+            and document_cfg.query_index_name
+            and not document_cfg.find_one
+        )
+
+    @staticmethod
+    def watermark_checkpoint_id(document_cfg: DocumentConfiguration) -> str:
+        """Returns id of the checkpoint with the high-water mark of the configuration."""
+
+        return f"{document_cfg.key}#watermark"
+
+    def apply_watermark(self, document_cfg: DocumentConfiguration, state: Optional[dict]):
+        """Limits reads of the configuration to documents at or after the high-water mark
+        of the previous runs.
+
+        Args:
+            document_cfg: DocumentConfiguration instance
+            state: checkpoint with the high-water mark or None before the first run
+
+        Returns: None
+        """
+
+        document_cfg.watermark = (state or {}).get("watermark")
+
+        with self._migrated_lock:
+            self._watermarks[self.watermark_checkpoint_id(document_cfg)] = {
+                "watermark": document_cfg.watermark,
+                "checkpoint_key": document_cfg.checkpoint_key,
+            }
+
+        if document_cfg.watermark is not None:
+            logging.info(
+                f"Reading {document_cfg.source_collection_name} from "
+                f"{document_cfg.watermark_field} {document_cfg.watermark}"
+            )
+
+    def track_watermark(self, document_cfg: DocumentConfiguration, documents: List[dict]):
+        """Raises the high-water mark of the configuration to the latest read document.
+        Marks are saved only when the whole migration succeeds.
+
+        Args:
+            document_cfg: configuration of the read documents
+            documents: read documents
+
+        Returns: None
+        """
+
+        if not self.watermarked(document_cfg):
+            return
+
+        values = [
+            doc[document_cfg.watermark_field]
+            for doc in documents
+            if doc.get(document_cfg.watermark_field) is not None
+        ]
+
+        if not values:
+            return
+
+        checkpoint_id = self.watermark_checkpoint_id(document_cfg)
+
+        with self._migrated_lock:
+            state = self._watermarks.setdefault(checkpoint_id, {"watermark": None})
+            state["watermark"] = (
+                max(values) if state["watermark"] is None else max(state["watermark"], *values)
+            )
+
+    def _save_watermarks(self):
+        """Saves high-water marks reached by the migration. Resume state of the finished
+        incremental reads is cleared, so the next run reads its delta even when the
+        high-water mark did not move."""
+
+        with self._migrated_lock:
+            watermarks, self._watermarks = self._watermarks, {}
+
+        for checkpoint_id, state in watermarks.items():
+            if state["watermark"] is not None:
+                self.checkpoints.save(
+                    checkpoint_id=checkpoint_id, state={"watermark": state["watermark"]}
+                )
+
+            if state.get("checkpoint_key"):
+                self.checkpoints.save(
+                    checkpoint_id=state["checkpoint_key"],
+                    state={"last_evaluated_key": None, "num_migrated": 0, "all_fetched": False},
+                )
+
+    def _restore_checkpoint(self, find_all: bool = False):
+        """Restores the resume state of the current configuration: its high-water mark,
+        last evaluated key, number of migrated documents and whether it was fetched
+        completely.
+        Checkpoints are ignored when all documents are requested.
+
+        Args:
+            find_all: indicates whether all documents are going to be read
+
+        Returns: None
+        """
+
+        last_evaluated_key = None
+
+        if (
+            self.migration_config.incremental
+            and self.watermarked(self.current_doc_cfg)
+            and not find_all
+        ):
+            self.apply_watermark(
+                document_cfg=self.current_doc_cfg,
+                state=self.checkpoints.load(
+                    checkpoint_id=self.watermark_checkpoint_id(self.current_doc_cfg)
+                ),
+            )
+
+        if self.checkpointed(self.current_doc_cfg) and not find_all:
+            state = self.checkpoints.load(checkpoint_id=self.current_doc_cfg.checkpoint_key) or {}
+            last_evaluated_key = state.get("last_evaluated_key")
+            self.current_doc_cfg.num_migrated = state.get("num_migrated", 0)
+
+            if state.get("all_fetched"):
+                logging.info(f"{self.current_doc_cfg.checkpoint_key} was migrated by a previous run")
+                self.current_doc_cfg.all_fetched = True
+
+        self.source_db_client.set_last_document(last_document=last_evaluated_key)
+        self._checkpoint_restored = True
+
+    def _restore_segment_keys(self, find_all: bool = False):
+        """Restores last evaluated keys of the parallel scan segments from the internal
+        database. Checkpoints are ignored when all documents are requested.
+
+        Args:
+            find_all: indicates whether all documents are going to be read
+
+        Returns: None
+        """
+
+        total_segments = self.source_db_config.scan_segments
+        segment_keys = {}
+        exhausted_segments = []
+
+        if self.current_doc_cfg.scan and not find_all:
+            for segment in range(total_segments):
+                checkpoint = self.checkpoints.load(
+                    checkpoint_id=f"{self.current_doc_cfg.checkpoint_key}#{segment}"
+                )
+
+                if not checkpoint or checkpoint.get("total_segments") != total_segments:
+                    continue
+
+                if checkpoint.get("exhausted"):
+                    exhausted_segments.append(segment)
+                else:
+                    segment_keys[segment] = checkpoint.get("last_evaluated_key")
+
+        if self.shard and self.shard.split_segments:
+            # Segments of other shards are read by their own processes
+            exhausted_segments.extend(
+                segment
+                for segment in range(total_segments)
+                if not self.shard.owns_segment(segment) and segment not in exhausted_segments
+            )
+
+        self.source_db_client.set_segment_keys(
+            segment_keys=segment_keys, exhausted_segments=exhausted_segments
+        )
+        self._segments_restored = True
+
+    def insert(self, resume_points: List[ResumePoint] = None) -> WriteQueryResult:
+        """Inserts the documents from the container into destination DB.
+
+        Args:
+            resume_points: resume points of the inserted pages, held by parked retries
+
+        Returns: WriteQueryResult instance
+        """
 
         self.container_manager.primary_to_transit_bucket()
 
         try:
-            query_res = self.destination_db_client.batch_write(
-                collection_name=self.current_doc_cfg.destination_collection_name,
+            query_res = self.write_documents(
+                document_cfg=self.current_doc_cfg,
                 documents=self.container_manager.transit_bucket,
             )
-            self.current_doc_cfg.num_migrated += query_res.processed_count
-            logging.info(f"Total number of inserted documents "
-                         f"for {self.current_doc_cfg.collection_name} is {self.current_doc_cfg.num_migrated}")
+            self.count_migrated(
+                document_cfg=self.current_doc_cfg, count=query_res.processed_count
+            )
+            logging.debug(f"Total number of inserted documents "
+                          f"for {self.current_doc_cfg.collection_name} is {self.current_doc_cfg.num_migrated}")
 
             self.container_manager.check_move_to_retry_bucket(
-                id_list=[doc["id"] for doc in self.container_manager.transit_bucket[:query_res.processed_count]]
+                id_list=query_res.processed_document_ids
             )
 
             # Will be retried only if there are items in the retry_bucket
-            self.retry_insert()
+            self.retry_insert(resume_points=resume_points)
 
         except InsertionWasCancelledError as exc:
-            try:
-                self.internal_db_client.batch_write(
-                    collection_name=self.current_doc_cfg.destination_collection_name,
-                    documents=self.current_doc_cfg.export_cancelled_doc_info(
-                        exc.cancelled_documents, exc_info=exc.exception_details
-                    ),
-                )
-                self.container_manager.empty_transit_bucket()
-            except InsertionWasCancelledError as e:
-                logging.exception(
-                    f"The following issue occurred when writing into internal DB --> {e}"
+            query_res = self.save_cancelled_documents(
+                document_cfg=self.current_doc_cfg, exc=exc
+            )
+            self.container_manager.empty_transit_bucket()
+
+        return query_res
+
+    def write_documents(
+        self, document_cfg: DocumentConfiguration, documents: List[dict]
+    ) -> WriteQueryResult:
+        """Writes converted documents into the destination collection of the
+        configuration.
+
+        Args:
+            document_cfg: configuration the documents were read with
+            documents: converted documents
+
+        Returns: WriteQueryResult instance
+        """
+
+        with self.metrics.track("write", document_cfg.collection_name) as operation:
+            operation.add(documents)
+
+            return self.destination_db_client.batch_write(
+                collection_name=document_cfg.destination_collection_name,
+                documents=documents,
+                load_mode=document_cfg.load_mode,
+            )
+
+    def count_migrated(self, document_cfg: DocumentConfiguration, count: int):
+        """Adds migrated documents to the counters of the configuration and the run.
+        Called from all flows, including their worker threads.
+
+        Args:
+            document_cfg: configuration of the migrated documents
+            count: number of migrated documents
+
+        Returns: None
+        """
+
+        self.progress.advance(document_cfg=document_cfg, count=count)
+
+        with self._migrated_lock:
+            document_cfg.num_migrated += count
+            self.migrated_total += count
+
+            if self.checkpointed(document_cfg):
+                self.checkpoints.save(
+                    checkpoint_id=document_cfg.checkpoint_key,
+                    state={"num_migrated": document_cfg.num_migrated},
                 )
 
-            query_res = WriteQueryResult(
-                inserted_document_ids=[doc.get("id") for doc in exc.inserted_documents],
-                processed_count=len(exc.inserted_documents),
-                processed_document_ids=[doc["_id"] for doc in exc.inserted_documents]
+    def save_cancelled_documents(
+        self, document_cfg: DocumentConfiguration, exc: InsertionWasCancelledError
+    ) -> WriteQueryResult:
+        """Saves information about cancelled documents into the internal database.
+
+        Args:
+            document_cfg: configuration of the documents that were being inserted
+            exc: the cancellation exception raised by the destination client
+
+        Returns: WriteQueryResult instance describing the documents that were inserted
+        """
+
+        try:
+            self.internal_db_client.batch_write(
+                collection_name=document_cfg.destination_collection_name,
+                documents=document_cfg.export_cancelled_doc_info(
+                    exc.cancelled_documents, exc_info=exc.exception_details
+                ),
+            )
+        except InsertionWasCancelledError as e:
+            logging.exception(
+                f"The following issue occurred when writing into internal DB --> {e}"
             )
 
-        return query_res
+        return WriteQueryResult(
+            inserted_document_ids=[doc.get("id") for doc in exc.inserted_documents],
+            processed_count=len(exc.inserted_documents),
+            processed_document_ids=[doc["_id"] for doc in exc.inserted_documents]
+        )
 
     def insert_update(self) -> WriteQueryResult:
         """Inserts into destination database and updates the source."""
 
         if self.container_manager.data_exists:
+            resume_points, self._resume_points = self._resume_points, []
 
-            query_res = self.insert()
-            self.source_db_client.batch_update(
-                collection_name=self.current_doc_cfg.source_collection_name,
-                updates=self._generate_migration_marks(query_res.inserted_document_ids),
+            query_res = self.insert(resume_points=resume_points)
+            self.mark_migrated(
+                document_cfg=self.current_doc_cfg,
+                id_list=query_res.inserted_document_ids,
+                resume_points=resume_points,
             )
+            self.resume_log.release(resume_points)
 
             return query_res
 
@@ -264,85 +723,122 @@ class MigrationController:
 
         id_list = [doc.get("id") for doc in self.container_manager.transit_bucket]
 
-        self.source_db_client.batch_update(
-            collection_name=curr_collection_name,
-            updates=self._reset_migration_marks(id_list=id_list),
-        )
+        if self.migration_config.marking_mode == MarkingMode.LEDGER:
+            self.ledger.forget(document_cfg=self.current_doc_cfg, id_list=id_list)
+        else:
+            self.source_db_client.batch_update(
+                collection_name=curr_collection_name,
+                updates=self._reset_migration_marks(id_list=id_list),
+            )
 
         self.container_manager.empty_transit_bucket()
 
-    def retry_insert(self):
-        """Retries insertion of documents that failed during previous iteration."""
-
-        i = 0
-        while self.container_manager.retry_needed and i < 3:
-            logging.info(
-                f"{len(self.container_manager.retry_bucket)} items found in retry_bucket"
-            )
+        resume_points, self._resume_points = self._resume_points, []
+        self.resume_log.release(resume_points)
 
-            time.sleep(120 * (i + 1))
+    def query_source(self, find_all: bool = False) -> ReadQueryResult:
+        """Sends a single read of the current document configuration to the source.
 
-            logging.info(f"Starting retry attempt #{i + 1}")
+        Args:
+            find_all: if True documents are read regardless of their migration status
 
-            query_res = self.destination_db_client.batch_write(
-                collection_name=self.current_doc_cfg.destination_collection_name,
-                documents=self.container_manager.retry_bucket,
-            )
+        Returns: ReadQueryResult instance
+        """
 
-            self.container_manager.check_remove_from_retry_bucket(
-                id_list=query_res.inserted_document_ids
-            )
+        with self.metrics.track("fetch", self.current_doc_cfg.collection_name) as operation:
+            if self.current_doc_cfg.find_one:
+                query_result = self.source_db_client.find_document(
+                    collection_name=self.current_doc_cfg.source_collection_name,
+                    doc_id=self.current_doc_cfg.queries[0].value
+                )
+            else:
+                query_result = self.source_db_client.find(
+                    collection_name=self.current_doc_cfg.source_collection_name,
+                    queries=self.current_doc_cfg.read_queries,
+                    query_index_name=self.current_doc_cfg.query_index_name,
+                    find_all=find_all,
+                )
 
-            logging.info(
-                f"{len(query_res.inserted_document_ids)} items have been inserted after retry attempt"
-            )
+            operation.add(query_result.documents)
 
-            i += 1
+        return query_result
 
-    def retry_fetch(self, find_all: bool = False):
-        """Retries fetch operation."""
+    def retry_insert(self, resume_points: List[ResumePoint] = None):
+        """Parks documents that failed during the previous insertion in the retry queue,
+        so they are retried in the background while the next batches keep flowing.
 
-        i = 0
+        Args:
+            resume_points: resume points of the pages the documents were read with,
+                held until the retry succeeds
 
-        while i < 3:
-            logging.info(f"Retrying fetch operation with delays. Iteration #{i+1}")
-            time.sleep((i + 1) * 120)  # Delaying for minimum 2 minutes
-            i += 1
-            try:
-                query_res = self.source_db_client.find(
-                    collection_name=self.current_doc_cfg.source_collection_name,
-                    queries=self.current_doc_cfg.queries,
-                    query_index_name=self.current_doc_cfg.query_index_name,
-                    find_all=find_all,
-                    find_one=self.current_doc_cfg.find_one
-                )
+        Returns: None
+        """
 
-                return query_res
+        if not self.container_manager.retry_needed:
+            return
 
-            except RetryableFetchingError:
-                continue
+        documents = self.container_manager.retry_bucket
+        self.container_manager.retry_bucket = []
 
-        raise FetchingTerminatedError(
-            f"Terminating fetching documents from {self.current_doc_cfg.source_collection_name}"
+        self.park_documents(
+            document_cfg=self.current_doc_cfg, documents=documents, resume_points=resume_points
         )
 
-    async def insert_fetch_cycle(self):
-        """The insert/fetch sequence ran asynchronously.
+    def park_documents(
+        self,
+        document_cfg: DocumentConfiguration,
+        documents: List[dict],
+        resume_points: List[ResumePoint] = None,
+    ):
+        """Parks documents the destination did not process in the retry queue. They are
+        inserted and marked in the background. Called from all flows, including their
+        worker threads.
 
-        used for repetitions
+        Args:
+            document_cfg: configuration of the documents
+            documents: converted documents that were not inserted
+            resume_points: resume points of the pages the documents were read with,
+                held until the retry succeeds
+
+        Returns: None
         """
 
-        loop = asyncio.get_running_loop()
+        logging.info(f"{len(documents)} items are parked for a retry")
+
+        self.resume_log.hold(resume_points or [])
+        self.retry_queue.submit(
+            task=partial(
+                self._retry_insert_documents,
+                document_cfg=document_cfg,
+                documents=documents,
+                resume_points=resume_points or [],
+            ),
+            error=RetryableWriteError(f"{len(documents)} documents were not inserted"),
+            description=f"Insertion into {document_cfg.destination_collection_name}",
+        )
+
+    def retry_fetch(self, find_all: bool = False) -> ReadQueryResult:
+        """Retries fetch operation with exponential delays."""
 
-        await loop.run_in_executor(None, self.insert_update)
-        await loop.run_in_executor(None, self.fetch)
+        try:
+            return retry_call(
+                partial(self.query_source, find_all=find_all),
+                policy=self.retry_policy,
+                counters=self.retry_counters,
+                description=f"Fetching from {self.current_doc_cfg.source_collection_name}",
+            )
+        except RetryableFetchingError as exc:
+            raise FetchingTerminatedError(
+                f"Terminating fetching documents from {self.current_doc_cfg.source_collection_name}"
+            ) from exc
 
     def insert_fetch_update_cycle(self, find_all: bool = False):
         """Sync function for alternative lifecycle"""
 
         if self.container_manager.data_exists:
-            query_res = self.insert()
-            curr_collection_name = self.current_doc_cfg.source_collection_name
+            resume_points, self._resume_points = self._resume_points, []
+            query_res = self.insert(resume_points=resume_points)
+            curr_doc_cfg = self.current_doc_cfg
 
             # Suspicion is that on EC2, batch_update happens faster than fetch does
             # Which is causing the LastEvaluatedKey to be invalidated, since its out of the query results due to
@@ -352,15 +848,193 @@ class MigrationController:
 
             time.sleep(0.5)
 
-            self.source_db_client.batch_update(
-                collection_name=curr_collection_name,
-                updates=self._generate_migration_marks(query_res.processed_document_ids),
+            self.mark_migrated(
+                document_cfg=curr_doc_cfg,
+                id_list=query_res.processed_document_ids,
+                resume_points=resume_points,
             )
+            self.resume_log.release(resume_points)
 
             return query_res
         elif self.current_doc_cfg is not None:
             self.fetch(find_all=find_all)
 
+    def mark_migrated(
+        self,
+        document_cfg: DocumentConfiguration,
+        id_list: List[str],
+        resume_points: List[ResumePoint] = None,
+    ):
+        """Marks the given documents as migrated, either in the source database or in
+        the ledger of the internal database.
+
+        Args:
+            document_cfg: configuration of the migrated documents
+            id_list: IDs of the migrated documents
+            resume_points: resume points of the pages the documents were read with,
+                held until parked marks succeed
+
+        Returns: None
+        """
+
+        with self.metrics.track("mark", document_cfg.collection_name) as operation:
+            operation.add(id_list)
+
+            if self.migration_config.marking_mode == MarkingMode.LEDGER:
+                self.ledger.record(document_cfg=document_cfg, id_list=id_list)
+                return
+
+            update_res = self.source_db_client.batch_update(
+                collection_name=document_cfg.source_collection_name,
+                updates=self._generate_migration_marks(id_list),
+            )
+
+        if update_res and update_res.failed_document_ids:
+            logging.info(
+                f"{len(update_res.failed_document_ids)} documents of "
+                f"{document_cfg.source_collection_name} were migrated but not marked"
+            )
+
+        retryable_ids = self.retryable_failures(update_res)
+
+        if retryable_ids:
+            self.resume_log.hold(resume_points or [])
+            self.retry_queue.submit(
+                task=partial(
+                    self._retry_marks,
+                    document_cfg=document_cfg,
+                    id_list=retryable_ids,
+                    resume_points=resume_points or [],
+                ),
+                error=RetryableWriteError(f"{len(retryable_ids)} documents were not marked"),
+                description=f"Marking in {document_cfg.source_collection_name}",
+            )
+
+    @staticmethod
+    def retryable_failures(update_res: Optional[WriteQueryResult]) -> List[str]:
+        """Returns IDs of the failed documents of a write that are worth retrying, i.e.
+        the failed ones that were not rejected with a non-retryable error.
+
+        Args:
+            update_res: WriteQueryResult instance or None
+
+        Returns: list of document IDs
+        """
+
+        if not update_res or not update_res.failed_document_ids:
+            return []
+
+        rejected_ids = set(update_res.rejected_document_ids)
+
+        return [doc_id for doc_id in update_res.failed_document_ids if doc_id not in rejected_ids]
+
+    def _retry_insert_documents(
+        self,
+        document_cfg: DocumentConfiguration,
+        documents: List[dict],
+        resume_points: List[ResumePoint] = None,
+    ):
+        """Inserts and marks parked documents. Runs on a retry queue thread. Documents
+        that are still not inserted are kept for the next attempt.
+
+        Args:
+            document_cfg: configuration of the documents
+            documents: list of documents to insert, shrunk after every attempt
+            resume_points: resume points held by the retry, released when it succeeds
+
+        Raises: RetryableWriteError if some documents are still not inserted
+        """
+
+        try:
+            query_res = self.write_documents(document_cfg=document_cfg, documents=documents)
+        except InsertionWasCancelledError as exc:
+            query_res = self.save_cancelled_documents(document_cfg=document_cfg, exc=exc)
+            documents[:] = []
+
+        inserted_ids = set(query_res.processed_document_ids)
+        documents[:] = [doc for doc in documents if doc.get("id") not in inserted_ids]
+
+        self.count_migrated(document_cfg=document_cfg, count=query_res.processed_count)
+        logging.info(
+            f"{query_res.processed_count} items have been inserted after retry attempt"
+        )
+
+        if query_res.processed_document_ids:
+            self.mark_migrated(
+                document_cfg=document_cfg,
+                id_list=query_res.processed_document_ids,
+                resume_points=resume_points,
+            )
+
+        if documents:
+            raise RetryableWriteError(f"{len(documents)} documents were not inserted")
+
+        self.resume_log.release(resume_points or [])
+
+    def _retry_marks(
+        self,
+        document_cfg: DocumentConfiguration,
+        id_list: List[str],
+        resume_points: List[ResumePoint] = None,
+    ):
+        """Marks parked documents as migrated. Runs on a retry queue thread. Documents
+        that are still not marked are kept for the next attempt.
+
+        Args:
+            document_cfg: configuration of the documents
+            id_list: IDs of the documents, shrunk after every attempt
+            resume_points: resume points held by the retry, released when it succeeds
+
+        Raises: RetryableWriteError if some documents are still not marked
+        """
+
+        update_res = self.source_db_client.batch_update(
+            collection_name=document_cfg.source_collection_name,
+            updates=self._generate_migration_marks(id_list),
+        )
+
+        id_list[:] = self.retryable_failures(update_res)
+
+        if id_list:
+            raise RetryableWriteError(f"{len(id_list)} documents were not marked")
+
+        self.resume_log.release(resume_points or [])
+
+    def _restart_document_configs(self, document_configs: Iterable[DocumentConfiguration]):
+        """Replaces the configurations left to migrate and starts their sequence over.
+
+        Args:
+            document_configs: DocumentConfiguration instances
+
+        Returns: None
+        """
+
+        self._document_configs = document_configs
+        self._document_configuration = None
+        self._segments_restored = False
+        self._checkpoint_restored = False
+        self.current_doc_cfg = self.next_document_configuration
+
+    def assign(
+        self, document_configs: Iterable[DocumentConfiguration], assignment: ShardAssignment
+    ):
+        """Restarts the controller with the configurations owned by an assignment, e.g.
+        a work unit leased by a worker of a multi-node run.
+
+        Args:
+            document_configs: DocumentConfiguration instances, e.g. a lazy iterator
+            assignment: ShardAssignment that decides which configurations are migrated
+
+        Returns: None
+        """
+
+        self.shard = assignment
+        self._restart_document_configs(
+            document_configs=assignment.filter_document_configs(
+                document_configs, scan_segments=self.source_db_config.scan_segments
+            )
+        )
+
     def container_monitor(self):
         """Check whether or not the containers are full."""
 
@@ -393,6 +1067,154 @@ class MigrationController:
     def migrate(self, reset_migration: bool = False, force_migration: bool = False):
         """Script that starts the migration procedure."""
 
+        succeeded = False
+        metrics_exporter = self._start_metrics_exporter()
+
+        try:
+            with self._progress_reporter():
+                self._migrate(reset_migration=reset_migration, force_migration=force_migration)
+            succeeded = True
+        finally:
+            if self.retry_queue.pending:
+                logging.info(f"Waiting for {self.retry_queue.pending} parked retries...")
+
+            self.retry_queue.close()
+            logging.info(f"Retry counters: {self.retry_counters.snapshot()}")
+
+            # A failed run reads its delta again, documents may have been skipped
+            if succeeded and not reset_migration:
+                self._save_watermarks()
+
+            if self._checkpoints:
+                self._checkpoints.close()
+
+            if metrics_exporter:
+                metrics_exporter.close()
+
+    def _start_metrics_exporter(self) -> Optional[MetricsExporter]:
+        """Starts publishing the metrics of the controller if an exporter is configured."""
+
+        if not self._owns_metrics:
+            return None
+
+        metrics_exporter = self.migration_config.create_metrics_exporter(registry=self.metrics)
+
+        if metrics_exporter:
+            metrics_exporter.start()
+
+        return metrics_exporter
+
+    def _progress_reporter(self) -> ContextManager:
+        """Returns a context that logs progress summaries of the controller while the
+        migration runs, unless another owner reports them."""
+
+        if not self._owns_progress:
+            return nullcontext()
+
+        return ProgressReporter(
+            tracker=self.progress, interval=self.migration_config.progress_log_interval
+        )
+
+    def replicate_changes(self, duration: float = None) -> StreamReplicator:
+        """Replicates changes of the configured documents from the source streams into
+        the destination. Meant to run after the backfill, until stopped or until the
+        duration elapses.
+
+        Args:
+            duration: seconds to replicate for. None replicates until stopped
+
+        Returns: StreamReplicator instance that replicated the changes
+        """
+
+        logging.info(f"Initiating change data capture...")
+        replicator = StreamReplicator(controller=self, migration_config=self.migration_config)
+        metrics_exporter = self._start_metrics_exporter()
+
+        try:
+            replicator.run(
+                document_configs=itertools.chain(
+                    [self.current_doc_cfg] if self.current_doc_cfg is not None else [],
+                    self.document_configuration,
+                ),
+                duration=duration,
+            )
+        finally:
+            if metrics_exporter:
+                metrics_exporter.close()
+
+        self.current_doc_cfg = None
+
+        return replicator
+
+    def verify(self) -> Dict[str, VerificationReport]:
+        """Compares the destination collections of the configured documents with the
+        source by bucket digests and saves the mismatching document IDs into the
+        internal database. Meant to run after the migration.
+
+        Returns: dict of VerificationReport instances keyed by the destination collection name
+        """
+
+        logging.info(f"Initiating verification...")
+        verifier = MigrationVerifier(controller=self, migration_config=self.migration_config)
+        metrics_exporter = self._start_metrics_exporter()
+
+        try:
+            reports = verifier.run(
+                document_configs=itertools.chain(
+                    [self.current_doc_cfg] if self.current_doc_cfg is not None else [],
+                    self.document_configuration,
+                )
+            )
+        finally:
+            if metrics_exporter:
+                metrics_exporter.close()
+
+        self.current_doc_cfg = None
+
+        return reports
+
+    def _migrate(self, reset_migration: bool = False, force_migration: bool = False):
+        """Runs the migration flow selected by the migration configuration."""
+
+        if (
+            self.flow == FlowNames.HIERARCHICAL
+            and self.migration_config.batched_hierarchy
+            and not reset_migration
+        ):
+            logging.info(f"Initiating batched hierarchical migration operation...")
+            remaining_cfgs = HierarchicalMigrationRunner(
+                controller=self, migration_config=self.migration_config
+            ).run(
+                document_configs=itertools.chain(
+                    [self.current_doc_cfg] if self.current_doc_cfg is not None else [],
+                    self.document_configuration,
+                ),
+                find_all=force_migration,
+            )
+
+            # Configurations outside of the families continue with the selected flow
+            self._restart_document_configs(document_configs=remaining_cfgs)
+
+            if self.current_doc_cfg is None:
+                return
+
+        if self.migration_config.asynchronous and not reset_migration:
+            logging.info(f"Initiating asynchronous migration operation...")
+            event_loop.run(
+                AsyncMigrationRunner(
+                    controller=self, migration_config=self.migration_config
+                ).run(find_all=force_migration),
+                use_uvloop=self.migration_config.use_uvloop,
+            )
+            return
+
+        if self.migration_config.pipelined and not reset_migration:
+            logging.info(f"Initiating pipelined migration operation...")
+            MigrationPipeline(
+                controller=self, migration_config=self.migration_config
+            ).run(find_all=force_migration)
+            return
+
         # First run initializes containers
         self.fetch(find_all=reset_migration or force_migration)
 
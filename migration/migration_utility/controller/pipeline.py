@@ -0,0 +1,277 @@
+import queue
+import threading
+from typing import TYPE_CHECKING, Callable, List, Optional
+
+from migration.migration_utility import logging
+from migration.migration_utility.configuration.document_configuration import (
+    DocumentConfiguration,
+)
+from migration.migration_utility.configuration.migration_configuration import (
+    MigrationConfigurator,
+)
+from migration.migration_utility.controller.checkpoint import ResumePoint
+from migration_utility.exceptions import InsertionWasCancelledError
+
+if TYPE_CHECKING:
+    from migration.migration_utility.controller.migration_controller import (
+        MigrationController,
+    )
+
+# Marks the end of the work for a single worker of the next stage
+_END_OF_STREAM = object()
+
+
+class MigrationBatch:
+    """Batch of documents that travels through the pipeline stages."""
+
+    def __init__(
+        self,
+        document_cfg: DocumentConfiguration,
+        documents: List[dict],
+        normalized: bool = False,
+        resume_point: ResumePoint = None,
+    ):
+        """Initializes the batch.
+
+        Args:
+            document_cfg: configuration the documents were fetched with
+            documents: fetched documents
+            normalized: indicates whether the documents are already in the destination format
+            resume_point: ResumePoint of the page, released once the batch is marked
+        """
+
+        self.document_cfg = document_cfg
+        self.documents = documents
+        self.normalized = normalized
+        self.resume_point = resume_point
+        self.processed_document_ids = []
+
+
+class MigrationPipeline:
+    """Runs fetch, conversion, destination write and source marking as concurrent stages
+    connected with bounded queues. A full queue blocks the previous stage, so a slow
+    stage applies backpressure instead of accumulating batches in memory.
+    """
+
+    def __init__(
+        self, controller: "MigrationController", migration_config: MigrationConfigurator
+    ):
+        """Initializes the pipeline.
+
+        Args:
+            controller: MigrationController that owns database clients and configurations
+            migration_config: MigrationConfigurator instance with queue and worker sizes
+        """
+
+        self.controller = controller
+        self.migration_config = migration_config
+
+        self._convert_queue = queue.Queue(maxsize=migration_config.queue_size)
+        self._write_queue = queue.Queue(maxsize=migration_config.queue_size)
+        self._mark_queue = queue.Queue(maxsize=migration_config.queue_size)
+
+        self._stop_event = threading.Event()
+        self._counter_lock = threading.Lock()
+        self._failure: Optional[BaseException] = None
+
+        self.migrated_count = 0
+
+    def run(self, find_all: bool = False):
+        """Runs all pipeline stages until every configured collection is migrated.
+
+        Args:
+            find_all: if True documents are read regardless of their migration status
+
+        Returns: None
+        """
+
+        stages = [
+            (self._convert_queue, self._write_queue, self._convert,
+             self.migration_config.convert_workers, "convert"),
+            (self._write_queue, self._mark_queue, self._write,
+             self.migration_config.write_workers, "write"),
+            (self._mark_queue, None, self._mark,
+             self.migration_config.mark_workers, "mark"),
+        ]
+
+        fetcher = threading.Thread(
+            target=self._run_fetcher, args=(find_all,), name="pipeline-fetch"
+        )
+        stage_threads = [
+            [
+                threading.Thread(
+                    target=self._run_worker,
+                    args=(in_queue, out_queue, handler),
+                    name=f"pipeline-{name}-{i}",
+                )
+                for i in range(workers)
+            ]
+            for in_queue, out_queue, handler, workers, name in stages
+        ]
+
+        fetcher.start()
+        for threads in stage_threads:
+            for thread in threads:
+                thread.start()
+
+        # Stages are shut down in order: once all workers of a stage are done, every
+        # worker of the next stage receives its end of stream
+        fetcher.join()
+        self._close(self._convert_queue, len(stage_threads[0]))
+
+        for i, threads in enumerate(stage_threads):
+            for thread in threads:
+                thread.join()
+
+            if i + 1 < len(stage_threads):
+                self._close(stages[i + 1][0], len(stage_threads[i + 1]))
+
+        if self._failure is not None:
+            raise self._failure
+
+        logging.info(f"Total migrated: {self.migrated_count}")
+
+    def _run_fetcher(self, find_all: bool):
+        """Reads batches from the source and feeds them into the conversion stage."""
+
+        try:
+            while self.controller.current_doc_cfg is not None and not self._stop_event.is_set():
+                query_result = self.controller.read_next_batch(find_all=find_all)
+                document_cfg = self.controller.current_doc_cfg
+
+                if query_result.documents and document_cfg is not None:
+                    self._put(
+                        self._convert_queue,
+                        MigrationBatch(
+                            document_cfg=document_cfg,
+                            documents=query_result.documents,
+                            normalized=query_result.normalized,
+                            resume_point=query_result.resume_point,
+                        ),
+                    )
+        except BaseException as exc:
+            self._fail(exc)
+
+    def _run_worker(
+        self,
+        in_queue: queue.Queue,
+        out_queue: Optional[queue.Queue],
+        handler: Callable[[MigrationBatch], Optional[MigrationBatch]],
+    ):
+        """Processes batches of a single stage until the end of stream is reached.
+
+        After a failure batches are still drained, so no stage blocks on a full queue.
+        """
+
+        while True:
+            batch = in_queue.get()
+
+            if batch is _END_OF_STREAM:
+                return
+
+            if self._stop_event.is_set():
+                continue
+
+            try:
+                batch = handler(batch)
+            except BaseException as exc:
+                self._fail(exc)
+                continue
+
+            if batch is not None and out_queue is not None:
+                self._put(out_queue, batch)
+
+    def _convert(self, batch: MigrationBatch) -> MigrationBatch:
+        """Converts fetched documents into the destination format."""
+
+        if not batch.normalized:
+            batch.documents = self.controller.convert_documents(
+                document_cfg=batch.document_cfg, documents=batch.documents
+            )
+            batch.normalized = True
+
+        return batch
+
+    def _write(self, batch: MigrationBatch) -> Optional[MigrationBatch]:
+        """Writes the batch into the destination database. Documents the destination
+        did not process are parked for a retry."""
+
+        document_cfg = batch.document_cfg
+
+        try:
+            query_res = self.controller.write_documents(
+                document_cfg=document_cfg, documents=batch.documents
+            )
+        except InsertionWasCancelledError as exc:
+            query_res = self.controller.save_cancelled_documents(
+                document_cfg=document_cfg, exc=exc
+            )
+        else:
+            processed_ids = set(query_res.processed_document_ids)
+            unprocessed_documents = [
+                doc for doc in batch.documents if doc.get("id") not in processed_ids
+            ]
+
+            if unprocessed_documents:
+                self.controller.park_documents(
+                    document_cfg=document_cfg,
+                    documents=unprocessed_documents,
+                    resume_points=[batch.resume_point],
+                )
+
+        self.controller.count_migrated(document_cfg=document_cfg, count=query_res.processed_count)
+
+        with self._counter_lock:
+            self.migrated_count += query_res.processed_count
+
+        logging.debug(
+            f"Total number of inserted documents "
+            f"for {document_cfg.collection_name} is {document_cfg.num_migrated}"
+        )
+
+        batch.processed_document_ids = query_res.processed_document_ids
+
+        if not batch.processed_document_ids:
+            self.controller.resume_log.release([batch.resume_point])
+            return None
+
+        return batch
+
+    def _mark(self, batch: MigrationBatch):
+        """Marks the written documents as migrated and releases the resume point of
+        the batch."""
+
+        self.controller.mark_migrated(
+            document_cfg=batch.document_cfg,
+            id_list=batch.processed_document_ids,
+            resume_points=[batch.resume_point],
+        )
+        self.controller.resume_log.release([batch.resume_point])
+
+    def _put(self, target_queue: queue.Queue, batch: MigrationBatch):
+        """Puts the batch into the queue, waiting while the queue is full unless the
+        pipeline is stopping.
+        """
+
+        while not self._stop_event.is_set():
+            try:
+                target_queue.put(batch, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _close(self, target_queue: queue.Queue, workers: int):
+        """Signals the end of stream to every worker reading from the queue."""
+
+        for _ in range(workers):
+            target_queue.put(_END_OF_STREAM)
+
+    def _fail(self, exc: BaseException):
+        """Records the first failure and stops the pipeline."""
+
+        logging.exception(f"Migration pipeline failed --> {exc}")
+
+        if self._failure is None:
+            self._failure = exc
+
+        self._stop_event.set()
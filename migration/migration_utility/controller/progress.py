@@ -0,0 +1,339 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from migration.migration_utility import logging
+from migration.migration_utility.configuration.document_configuration import (
+    DocumentConfiguration,
+)
+from migration_utility.data_types import CollectionSize
+
+
+class RateWindow:
+    """Counts of the last seconds, rates are computed over a moving window. Counts are
+    summed per second, so the window holds at most one entry per second."""
+
+    def __init__(self, window: float, started_at: float):
+        """Initializes an empty window.
+
+        Args:
+            window: seconds the rate is computed over
+            started_at: monotonic time counting started at
+        """
+
+        self.window = window
+        self.started_at = started_at
+        self._counts: Deque[Tuple[int, int]] = deque()
+
+    def add(self, count: int, now: float):
+        """Counts processed documents at the given monotonic time."""
+
+        second = int(now)
+
+        if self._counts and self._counts[-1][0] == second:
+            self._counts[-1] = (second, self._counts[-1][1] + count)
+        else:
+            self._counts.append((second, count))
+
+    def rate(self, now: float) -> float:
+        """Returns documents per second over the window ending at the given time."""
+
+        while self._counts and self._counts[0][0] <= now - self.window:
+            self._counts.popleft()
+
+        # A window that started recently is not diluted by the time before the start
+        elapsed = min(self.window, now - self.started_at)
+
+        return sum(count for _, count in self._counts) / elapsed if elapsed > 0 else 0.0
+
+
+class CollectionProgress:
+    """Progress of the configurations migrating into one collection."""
+
+    def __init__(self, document_cfg: DocumentConfiguration, window: float, started_at: float):
+        """Initializes the progress from the first configuration of the collection.
+
+        Args:
+            document_cfg: DocumentConfiguration instance
+            window: seconds rates are computed over
+            started_at: monotonic time the tracker started at
+        """
+
+        self.source_collection_name = document_cfg.source_collection_name
+        self.index_name = document_cfg.query_index_name
+        self.described = False
+        self.total: Optional[int] = None
+        self.average_size: Optional[float] = None
+        self.migrated = 0
+        self.rate_window = RateWindow(window=window, started_at=started_at)
+
+
+class ProgressTracker:
+    """Tracks how many documents of every collection are migrated, the rate of the
+    migration over a moving window and the time left.
+
+    Totals are seeded from the sizes the source database keeps in its metadata, e.g.
+    ItemCount of the DynamoDB table or of the index the configuration reads. They are
+    upper bounds for configurations that read a part of the table and are refreshed by
+    DynamoDB only every few hours, so they are raised to the migrated count when it
+    gets ahead of them.
+    """
+
+    def __init__(
+        self,
+        window: float = 60.0,
+        size_source: Callable[[str, Optional[str]], Optional[CollectionSize]] = None,
+    ):
+        """Initializes the tracker.
+
+        Args:
+            window: seconds of the moving window rates are computed over
+            size_source: function that returns the size of a source collection or of
+                its index, called with the collection and index names. Controllers set
+                their source client when it is omitted
+        """
+
+        self.window = window
+        self.size_source = size_source
+        self.started_at = time.monotonic()
+
+        self._collections: Dict[str, CollectionProgress] = {}
+        self._rate_window = RateWindow(window=window, started_at=self.started_at)
+        self._lock = threading.Lock()
+
+    def register(self, document_configs: Iterable[DocumentConfiguration]):
+        """Adds collections before they are migrated, so the overall time left includes
+        them. Configurations that are generated lazily are added when they are migrated.
+
+        Args:
+            document_configs: DocumentConfiguration instances
+
+        Returns: None
+        """
+
+        with self._lock:
+            for document_cfg in document_configs:
+                self._collection(document_cfg)
+
+    def advance(self, document_cfg: DocumentConfiguration, count: int):
+        """Counts migrated documents of the configuration. Called from all flows,
+        including their worker threads.
+
+        Args:
+            document_cfg: configuration of the migrated documents
+            count: number of migrated documents
+
+        Returns: None
+        """
+
+        now = time.monotonic()
+
+        with self._lock:
+            progress = self._collection(document_cfg)
+            progress.migrated += count
+            progress.rate_window.add(count, now)
+            self._rate_window.add(count, now)
+
+    def describe_sizes(self):
+        """Seeds totals of the collections that were not described yet from the source
+        database. Sends requests, so it is called outside of the migration threads."""
+
+        if self.size_source is None:
+            return
+
+        with self._lock:
+            pending = [
+                (name, progress)
+                for name, progress in self._collections.items()
+                if not progress.described
+            ]
+
+        sizes: Dict[Tuple[str, Optional[str]], Optional[CollectionSize]] = {}
+
+        for name, progress in pending:
+            try:
+                for key in {
+                    (progress.source_collection_name, None),
+                    (progress.source_collection_name, progress.index_name),
+                }:
+                    if key not in sizes:
+                        sizes[key] = self.size_source(*key)
+            except Exception as exc:
+                # Totals stay unknown until the next report
+                logging.info(f"Failed to describe {progress.source_collection_name} --> {exc!r}")
+                continue
+
+            table_size = sizes[(progress.source_collection_name, None)]
+            read_size = sizes[(progress.source_collection_name, progress.index_name)]
+
+            with self._lock:
+                progress.described = True
+
+                if read_size is not None:
+                    progress.total = max(read_size.item_count, progress.migrated)
+                if table_size is not None and table_size.item_count:
+                    progress.average_size = table_size.size_bytes / table_size.item_count
+
+    def snapshot(self) -> dict:
+        """Returns the progress of every collection and of the whole migration.
+
+        Returns: dict with migrated documents, totals, documents and bytes per second
+            and seconds left, None where they are unknown
+        """
+
+        now = time.monotonic()
+        collections = {}
+
+        with self._lock:
+            for name, progress in self._collections.items():
+                if progress.total is not None and progress.migrated > progress.total:
+                    progress.total = progress.migrated
+
+                collections[name] = self._rates(
+                    migrated=progress.migrated,
+                    total=progress.total,
+                    rate=progress.rate_window.rate(now),
+                    average_size=progress.average_size,
+                )
+
+            overall_rate = self._rate_window.rate(now)
+
+        known = [item for item in collections.values() if item["total"] is not None]
+        bytes_rates = [item["bytes_per_second"] for item in collections.values()]
+        overall = {
+            "migrated": sum(item["migrated"] for item in collections.values()),
+            "total": sum(item["total"] for item in known) if known else None,
+            "documents_per_second": round(overall_rate, 1),
+            "bytes_per_second": (
+                round(sum(bytes_rates)) if None not in bytes_rates and bytes_rates else None
+            ),
+            # Collections are migrated one after another or side by side, either way
+            # the remaining documents are worked off at the overall rate
+            "eta_seconds": (
+                round(sum(item["total"] - item["migrated"] for item in known) / overall_rate)
+                if known and overall_rate > 0
+                else None
+            ),
+        }
+
+        return {
+            "elapsed_seconds": round(now - self.started_at),
+            "collections": collections,
+            "overall": overall,
+        }
+
+    def summary(self) -> List[str]:
+        """Returns log lines with the overall progress and the progress of the
+        collections that are being migrated."""
+
+        snapshot = self.snapshot()
+        lines = [f"Progress after {_format_duration(snapshot['elapsed_seconds'])}: "
+                 f"{_format_progress(snapshot['overall'])}"]
+
+        for name, progress in sorted(snapshot["collections"].items()):
+            if progress["documents_per_second"] or progress["migrated"] != progress["total"]:
+                lines.append(f"  {name}: {_format_progress(progress)}")
+
+        return lines
+
+    def _collection(self, document_cfg: DocumentConfiguration) -> CollectionProgress:
+        """Returns the progress of the configuration's collection. Called under the lock."""
+
+        progress = self._collections.get(document_cfg.collection_name)
+
+        if progress is None:
+            progress = self._collections[document_cfg.collection_name] = CollectionProgress(
+                document_cfg=document_cfg, window=self.window, started_at=self.started_at
+            )
+
+        return progress
+
+    @staticmethod
+    def _rates(migrated: int, total: Optional[int], rate: float, average_size: Optional[float]) -> dict:
+        """Returns the progress of a collection with its rates and time left."""
+
+        return {
+            "migrated": migrated,
+            "total": total,
+            "documents_per_second": round(rate, 1),
+            "bytes_per_second": round(rate * average_size) if average_size is not None else None,
+            "eta_seconds": round((total - migrated) / rate) if total is not None and rate > 0 else None,
+        }
+
+
+class ProgressReporter:
+    """Logs rate-limited summaries of a ProgressTracker from a background thread
+    instead of a line per migrated batch."""
+
+    def __init__(self, tracker: ProgressTracker, interval: float):
+        """Initializes the reporter.
+
+        Args:
+            tracker: ProgressTracker instance
+            interval: seconds between two summaries
+        """
+
+        self.tracker = tracker
+        self.interval = interval
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name="progress-reporter", daemon=True)
+        self._thread.start()
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop_event.set()
+        self._thread.join()
+        self._report()
+
+    def _run(self):
+        """Logs summaries until the reporter is stopped."""
+
+        self.tracker.describe_sizes()
+
+        while not self._stop_event.wait(self.interval):
+            self._report()
+
+    def _report(self):
+        """Seeds totals of new collections and logs a summary."""
+
+        try:
+            self.tracker.describe_sizes()
+
+            for line in self.tracker.summary():
+                logging.info(line)
+        except Exception as exc:
+            logging.info(f"Reporting progress failed --> {exc!r}")
+
+
+def _format_progress(progress: dict) -> str:
+    """Formats the progress of a collection or of the whole migration."""
+
+    total = progress["total"]
+    text = f"{progress['migrated']}/{total if total is not None else '?'} documents"
+
+    if total:
+        text += f" ({min(progress['migrated'] / total, 1.0):.1%})"
+
+    text += f", {progress['documents_per_second']:g} docs/s"
+
+    if progress["bytes_per_second"] is not None:
+        text += f", {progress['bytes_per_second'] / 2 ** 20:.2f} MiB/s"
+    if progress["eta_seconds"] is not None:
+        text += f", ETA {_format_duration(progress['eta_seconds'])}"
+
+    return text
+
+
+def _format_duration(seconds: float) -> str:
+    """Formats seconds as hours, minutes and seconds."""
+
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
@@ -0,0 +1,284 @@
+import multiprocessing
+import queue
+import threading
+import zlib
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List
+
+from migration.migration_utility import logging
+from migration.migration_utility.configuration.document_configuration import (
+    DocumentConfiguration,
+)
+from migration.migration_utility.db_clients.generic import GenericClient
+from migration_utility.exceptions import MigrationShardFailedError
+
+if TYPE_CHECKING:
+    from migration.migration_utility.controller.migration_controller import (
+        MigrationController,
+    )
+
+# Internal database collection with the merged progress of sharded runs
+PROGRESS_COLLECTION_NAME = "migration_progress"
+
+
+class ShardAssignment:
+    """Decides which part of the work belongs to a shard of a multi-process run.
+
+    Parallel scans are split by scan segments, so every shard reads the same collection
+    with its own segments. Other configurations are assigned whole by a stable hash of
+    their parent ID or, without a parent, of the collection and queries they read.
+    """
+
+    def __init__(self, shard_index: int, shard_count: int, split_segments: bool = True):
+        """Initializes the assignment.
+
+        Args:
+            shard_index: index of the shard, starting from 0
+            shard_count: total number of shards
+            split_segments: if True parallel scans are split by segments between shards
+        """
+
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.split_segments = split_segments
+
+    def owns_segment(self, segment: int) -> bool:
+        """Checks whether the scan segment belongs to the shard."""
+
+        return segment % self.shard_count == self.shard_index
+
+    def owns(self, document_cfg: DocumentConfiguration, scan_segments: int) -> bool:
+        """Checks whether the document configuration, or a part of it, belongs to the
+        shard.
+
+        Args:
+            document_cfg: DocumentConfiguration instance
+            scan_segments: number of segments parallel scans are split into
+
+        Returns: True if the shard should migrate the configuration
+        """
+
+        if self.split_segments and document_cfg.scan and scan_segments > 1:
+            return any(self.owns_segment(segment) for segment in range(scan_segments))
+
+        return self.stable_hash(self.shard_key(document_cfg)) % self.shard_count == self.shard_index
+
+    def filter_document_configs(
+        self, document_configs: Iterable[DocumentConfiguration], scan_segments: int
+    ) -> Iterator[DocumentConfiguration]:
+        """Lazily drops configurations owned by other shards."""
+
+        return (
+            document_cfg
+            for document_cfg in document_configs
+            if self.owns(document_cfg=document_cfg, scan_segments=scan_segments)
+        )
+
+    @staticmethod
+    def shard_key(document_cfg: DocumentConfiguration) -> str:
+        """Returns the key the configuration is hashed by. Children share the key of
+        their parent, so a document family stays in a single shard.
+        """
+
+        if document_cfg.find_one:
+            return str(document_cfg.queries[0].value)
+
+        if document_cfg.related_document:
+            for query in document_cfg.queries or []:
+                if query.field_name == document_cfg.related_document.relation_field:
+                    return str(query.value)
+
+        return document_cfg.key
+
+    @staticmethod
+    def stable_hash(key: str) -> int:
+        """Hash that is equal in all processes, unlike the salted built-in hash()."""
+
+        return zlib.crc32(key.encode())
+
+
+class ShardProgressReporter:
+    """Sends progress snapshots of a shard to the coordinator from a background thread
+    of the worker process."""
+
+    def __init__(
+        self,
+        controller: "MigrationController",
+        shard_index: int,
+        progress_queue: multiprocessing.Queue,
+        interval: float,
+    ):
+        """Initializes the reporter.
+
+        Args:
+            controller: MigrationController or WorkQueueRunner of the shard
+            shard_index: index of the shard
+            progress_queue: queue read by the coordinator
+            interval: seconds between two snapshots
+        """
+
+        self.controller = controller
+        self.shard_index = shard_index
+        self.progress_queue = progress_queue
+        self.interval = interval
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(
+            target=self._run, name=f"shard-{self.shard_index}-progress", daemon=True
+        )
+        self._thread.start()
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop_event.set()
+        self._thread.join()
+        self._report(finished=True, error=repr(exc_val) if exc_val else None)
+
+    def _run(self):
+        """Reports snapshots until the shard is finished."""
+
+        while not self._stop_event.wait(self.interval):
+            self._report(finished=False)
+
+    def _report(self, finished: bool, error: str = None):
+        """Puts a snapshot of the shard into the progress queue."""
+
+        self.progress_queue.put(
+            {
+                "shard_index": self.shard_index,
+                "migrated": self.controller.migrated_total,
+                "retries": self.controller.retry_counters.snapshot(),
+                "finished": finished,
+                "error": error,
+            }
+        )
+
+
+class ShardedMigrationCoordinator:
+    """Runs a migration in several worker processes, one shard each, and merges their
+    progress into the internal database. Worker processes are spawned, so every worker
+    creates its own database clients and conversion runs on all cores.
+    """
+
+    def __init__(
+        self,
+        shard_count: int,
+        worker: Callable,
+        internal_db_client: GenericClient,
+        progress_interval: float = 10.0,
+    ):
+        """Initializes the coordinator.
+
+        Args:
+            shard_count: number of worker processes
+            worker: picklable function called with shard_index, shard_count and
+                progress_queue keyword arguments in every worker process
+            internal_db_client: client of the internal database
+            progress_interval: seconds between two progress checks
+        """
+
+        self.shard_count = shard_count
+        self.worker = worker
+        self.internal_db_client = internal_db_client
+        self.progress_interval = progress_interval
+
+        self._progress: Dict[int, dict] = {}
+
+    def run(self):
+        """Starts the workers and merges their progress until all of them exit.
+
+        Raises: MigrationShardFailedError if any worker failed
+        """
+
+        context = multiprocessing.get_context("spawn")
+        progress_queue = context.Queue()
+        processes = [
+            context.Process(
+                target=self.worker,
+                kwargs={
+                    "shard_index": shard_index,
+                    "shard_count": self.shard_count,
+                    "progress_queue": progress_queue,
+                },
+                name=f"migration-shard-{shard_index}",
+            )
+            for shard_index in range(self.shard_count)
+        ]
+
+        for process in processes:
+            process.start()
+
+        logging.info(f"Started {self.shard_count} migration shards")
+
+        while any(process.is_alive() for process in processes):
+            try:
+                self._merge(progress_queue.get(timeout=self.progress_interval))
+            except queue.Empty:
+                continue
+
+        for process in processes:
+            process.join()
+
+        self._drain(progress_queue)
+
+        failed_shards = [
+            shard_index
+            for shard_index, process in enumerate(processes)
+            if process.exitcode != 0
+        ]
+
+        logging.info(f"Total migrated: {sum(p['migrated'] for p in self._progress.values())}")
+
+        if failed_shards:
+            raise MigrationShardFailedError(f"Migration shards {failed_shards} failed")
+
+    def _drain(self, progress_queue: multiprocessing.Queue):
+        """Merges snapshots left in the queue after the workers exited."""
+
+        while True:
+            try:
+                self._merge(progress_queue.get_nowait())
+            except queue.Empty:
+                return
+
+    def _merge(self, progress: dict):
+        """Saves a progress snapshot of a shard and the merged progress of all shards.
+
+        Args:
+            progress: snapshot sent by ShardProgressReporter
+
+        Returns: None
+        """
+
+        shard_index = progress["shard_index"]
+        updated_at = datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+        self._progress[shard_index] = progress
+
+        if progress["error"]:
+            logging.info(f"Shard {shard_index} failed --> {progress['error']}")
+
+        self.internal_db_client.update(
+            collection_name=PROGRESS_COLLECTION_NAME,
+            update_data={"_id": f"shard#{shard_index}", **progress, "updated_at": updated_at},
+        )
+        self.internal_db_client.update(
+            collection_name=PROGRESS_COLLECTION_NAME,
+            update_data={
+                "_id": "total",
+                "shard_count": self.shard_count,
+                "migrated": sum(p["migrated"] for p in self._progress.values()),
+                "finished_shards": sum(1 for p in self._progress.values() if p["finished"]),
+                "failed_shards": self._failed_shards(),
+                "updated_at": updated_at,
+            },
+        )
+
+    def _failed_shards(self) -> List[int]:
+        """Returns indexes of shards that reported an error."""
+
+        return sorted(index for index, p in self._progress.items() if p["error"])
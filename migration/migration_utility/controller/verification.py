@@ -0,0 +1,529 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from bson.decimal128 import Decimal128
+
+from migration.migration_utility import logging
+from migration.migration_utility.configuration.document_configuration import (
+    DocumentConfiguration,
+)
+from migration.migration_utility.configuration.migration_configuration import (
+    MigrationConfigurator,
+)
+from migration.migration_utility.controller.cdc import TableRoutes
+from migration.migration_utility.db_clients.mongodb.mongodb_client import (
+    MIGRATION_MARKER_FIELDS,
+)
+from migration.migration_utility.hashing import (
+    content_hash,
+    document_checksum,
+    document_size,
+    field_hash,
+    inexact_checksum,
+)
+from migration.migration_utility.retry import retry_call
+from migration_utility.data_types import BucketDigest, VerificationReport
+from migration_utility.enums import Databases, MismatchKind
+from migration_utility.exceptions import (
+    FetchingTerminatedError,
+    RetryableFetchingError,
+    VerificationNotSupportedError,
+)
+
+if TYPE_CHECKING:
+    from migration.migration_utility.controller.migration_controller import (
+        MigrationController,
+    )
+
+# Internal database collection with the mismatching documents of the last verification
+VERIFICATION_COLLECTION_NAME = "migration_verification"
+
+# Fields hashed on both sides to find out whether the destination computes the same
+# checksums as hashing.document_checksum()
+_CHECKSUM_PROBE = [
+    {"k": "id", "v": "probe"},
+    {"k": "n", "v": -7},
+    {"k": "f", "v": 2.75},
+    {"k": "g", "v": -0.1},
+    {"k": "e", "v": [1e300, 5e-324, 2.0 ** 63, 7.0]},
+    {"k": "d", "v": Decimal128("12.5")},
+    {"k": "l", "v": [Decimal128("-1E+40"), Decimal128("0.000001"), Decimal128("3")]},
+    {"k": "o", "v": {"b": True, "z": None, "a": [1, "x", {"y": b"\x01", "p": 9.99}]}},
+    {"k": "deep", "v": [[[[[1.5]]]]]},
+]
+# Version of the schema of the source digest store, older stores are recreated
+_STORE_SCHEMA_VERSION = 2
+
+
+class SourceDigestStore:
+    """Digests of the source documents kept in a local SQLite file, one row per
+    document and destination collection. Bucket digests of any ID prefix are computed
+    with a single indexed query, so the source is read only once per verification."""
+
+    def __init__(self, path: str):
+        """Opens the store.
+
+        Args:
+            path: path of the SQLite file
+        """
+
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        # The store is rebuilt by every verification, durability is not needed
+        self._connection.execute("PRAGMA journal_mode = OFF")
+        self._connection.execute("PRAGMA synchronous = OFF")
+
+        if self._connection.execute("PRAGMA user_version").fetchone()[0] != _STORE_SCHEMA_VERSION:
+            self._connection.execute("DROP TABLE IF EXISTS documents")
+            self._connection.execute(f"PRAGMA user_version = {_STORE_SCHEMA_VERSION}")
+
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "collection TEXT NOT NULL, id TEXT NOT NULL, size INTEGER NOT NULL, "
+            "checksum INTEGER, inexact INTEGER NOT NULL, content_hash BLOB NOT NULL, "
+            "PRIMARY KEY (collection, id)"
+            ") WITHOUT ROWID"
+        )
+
+    def reset(self, collection_names: Iterable[str]):
+        """Removes the digests of the collections left by a previous verification."""
+
+        with self._connection:
+            self._connection.executemany(
+                "DELETE FROM documents WHERE collection = ?",
+                [(collection_name,) for collection_name in collection_names],
+            )
+
+    def add(self, rows: List[Tuple[str, str, int, Optional[int], bool, bytes]]):
+        """Adds digests of documents. A document read twice replaces its digest.
+
+        Args:
+            rows: tuples of the collection name, document ID, size, checksum, whether
+                the checksum is inexact and content hash
+
+        Returns: None
+        """
+
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def count(self, collection_name: str) -> int:
+        """Returns the number of source documents of the collection."""
+
+        return self._connection.execute(
+            "SELECT COUNT(*) FROM documents WHERE collection = ?", (collection_name,)
+        ).fetchone()[0]
+
+    def bucket_digests(self, collection_name: str, prefix: str) -> Dict[str, BucketDigest]:
+        """Computes digests of the documents whose IDs start with the prefix, grouped by
+        the prefix one character longer, like MongoDbClient.id_bucket_digests().
+
+        Args:
+            collection_name: name of the destination collection
+            prefix: common prefix of the IDs, empty for the whole collection
+
+        Returns: dict of BucketDigest instances keyed by the longer prefixes
+        """
+
+        condition, parameters = self._bucket_condition(collection_name, prefix)
+
+        return {
+            bucket: BucketDigest(
+                count=count,
+                size_bytes=size_bytes,
+                checksum=checksum,
+                inexact_count=inexact_count if checksum is not None else 0,
+            )
+            for bucket, count, size_bytes, checksum, inexact_count in self._connection.execute(
+                f"SELECT substr(id, 1, ?), COUNT(*), SUM(size), SUM(checksum), SUM(inexact) "
+                f"FROM documents WHERE {condition} GROUP BY 1",
+                (len(prefix) + 1, *parameters),
+            )
+        }
+
+    def iter_bucket(
+        self, collection_name: str, bucket: str, exact: bool = False
+    ) -> Iterator[Tuple[str, bytes]]:
+        """Iterates over IDs and content hashes of the documents in the bucket.
+
+        Args:
+            collection_name: name of the destination collection
+            bucket: prefix of the IDs
+            exact: if True only the document whose ID equals the prefix is returned
+
+        Returns: iterator of ID and content hash tuples
+        """
+
+        if exact:
+            condition, parameters = "collection = ? AND id = ?", (collection_name, bucket)
+        else:
+            condition, parameters = self._bucket_condition(collection_name, bucket)
+
+        return self._connection.execute(
+            f"SELECT id, content_hash FROM documents WHERE {condition} ORDER BY id", parameters
+        )
+
+    def close(self):
+        """Closes the SQLite file."""
+
+        self._connection.close()
+
+    @staticmethod
+    def _bucket_condition(collection_name: str, prefix: str) -> Tuple[str, tuple]:
+        """Returns the condition of the IDs starting with the prefix, served by the
+        primary key. Strings compare by code points in SQLite and MongoDB alike."""
+
+        if not prefix:
+            return "collection = ?", (collection_name,)
+
+        return (
+            "collection = ? AND id >= ? AND id < ?",
+            (collection_name, prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)),
+        )
+
+
+class MigrationVerifier:
+    """Verifies that the destination holds exactly the source documents routed into it,
+    without reading both databases document by document.
+
+    The source is read once with parallel scans and the size, an order-independent
+    checksum and an exact content hash of every document are kept in a SQLite file.
+    Documents are grouped into buckets by the prefix of their IDs. Digests of the
+    buckets are compared with digests MongoDB computes in an aggregation, and only
+    mismatching buckets are split by one more character of the prefix, Merkle style.
+    Buckets of at most verify_leaf_size documents are compared document by document.
+    Mismatching document IDs are saved in the internal database.
+    """
+
+    def __init__(
+        self, controller: "MigrationController", migration_config: MigrationConfigurator
+    ):
+        """Initializes the verifier.
+
+        Args:
+            controller: MigrationController that owns database configurations and clients
+            migration_config: MigrationConfigurator instance with the verification settings
+        """
+
+        self.controller = controller
+        self.migration_config = migration_config
+        self.store: Optional[SourceDigestStore] = None
+
+    def run(self, document_configs: Iterable[DocumentConfiguration]) -> Dict[str, VerificationReport]:
+        """Verifies the destination collections of the configurations.
+
+        Args:
+            document_configs: DocumentConfiguration instances whose documents are verified
+
+        Returns: dict of VerificationReport instances keyed by the destination collection name
+        """
+
+        if self.controller.destination_db_config.database != Databases.MONGODB:
+            raise VerificationNotSupportedError("Verification requires a MongoDB destination")
+
+        routes: Dict[str, TableRoutes] = {}
+
+        for document_cfg in document_configs:
+            table_name = document_cfg.source_collection_name
+            routes.setdefault(table_name, TableRoutes(table_name=table_name)).add(document_cfg)
+
+        for table_name, table_routes in routes.items():
+            logging.info(f"Verifying {table_name} in {', '.join(sorted(table_routes.destinations))}")
+
+        destinations = sorted(
+            {destination for table_routes in routes.values() for destination in table_routes.destinations}
+        )
+        checksums = {destination: self._checksums_supported(destination) for destination in destinations}
+
+        self.store = SourceDigestStore(path=self.migration_config.verify_store_path)
+        reports = {}
+
+        try:
+            self.store.reset(destinations)
+
+            for table_routes in routes.values():
+                self._read_source(routes=table_routes, checksums=checksums)
+
+            for destination in destinations:
+                reports[destination] = self._verify_collection(
+                    destination=destination, checksums=checksums[destination]
+                )
+        finally:
+            self.store.close()
+
+        return reports
+
+    def _checksums_supported(self, destination: str) -> bool:
+        """Checks that the destination hashes fields exactly like hashing.field_hash()."""
+
+        server_hashes = self.controller.destination_db_client.field_hashes(
+            collection_name=destination, fields=_CHECKSUM_PROBE
+        )
+
+        if server_hashes == [field_hash(field["k"], field["v"]) for field in _CHECKSUM_PROBE]:
+            return True
+
+        logging.info(
+            f"Checksums of {destination} are not computed by the destination, "
+            f"buckets are compared by counts and sizes"
+        )
+
+        return False
+
+    def _read_source(self, routes: TableRoutes, checksums: Dict[str, bool]):
+        """Scans the source table and stores digests of the documents it routes into
+        destination collections."""
+
+        # The scan keeps its own pagination state, apart from the controller's client
+        source_db_client = self.controller.source_db_config.copy(
+            update={
+                "batch_size": self.migration_config.verify_batch_size,
+                "adaptive_batch_size": False,
+            }
+        ).create_client(normalizer=self.controller.container_manager.normalizer)
+        read_count = 0
+
+        while True:
+            try:
+                with self.controller.metrics.track("fetch", routes.table_name) as operation:
+                    query_result = retry_call(
+                        partial(
+                            source_db_client.find,
+                            collection_name=routes.table_name,
+                            queries=[],
+                            find_all=True,
+                        ),
+                        policy=self.controller.retry_policy,
+                        counters=self.controller.retry_counters,
+                        description=f"Scanning {routes.table_name}",
+                    )
+                    operation.add(query_result.documents)
+            except RetryableFetchingError as exc:
+                raise FetchingTerminatedError(f"Terminating scan of {routes.table_name}") from exc
+
+            documents = query_result.documents
+
+            if documents and not query_result.normalized:
+                documents = self.controller.container_manager.convert_documents(documents)
+
+            rows = []
+
+            for document in documents:
+                for destination in routes.match(document):
+                    rows.append(self._digest_row(destination, document, checksums[destination]))
+
+            self.store.add(rows)
+            read_count += len(documents)
+
+            if not query_result.has_more:
+                break
+
+        logging.info(f"Scanned {read_count} documents of {routes.table_name}")
+
+    @staticmethod
+    def _digest_row(
+        destination: str, document: dict, checksum: bool
+    ) -> Tuple[str, str, int, Optional[int], bool, bytes]:
+        """Returns the digest row of a source document as it is written into MongoDB."""
+
+        document = {
+            name: value for name, value in document.items() if name not in MIGRATION_MARKER_FIELDS
+        }
+        document["_id"] = document["id"]
+
+        return (
+            destination,
+            document["id"],
+            document_size(document),
+            document_checksum(document) if checksum else None,
+            inexact_checksum(document),
+            content_hash(document),
+        )
+
+    def _verify_collection(self, destination: str, checksums: bool) -> VerificationReport:
+        """Compares bucket digests of the collection level by level and the documents of
+        mismatching leaf buckets."""
+
+        report = VerificationReport(
+            destination_collection_name=destination, source_count=self.store.count(destination)
+        )
+        self.controller.internal_db_client.client_connector[VERIFICATION_COLLECTION_NAME].delete_many(
+            {"destination_collection_name": destination}
+        )
+        destination_digests = partial(
+            self.controller.destination_db_client.id_bucket_digests,
+            destination,
+            excluded_fields=list(MIGRATION_MARKER_FIELDS),
+            checksums=checksums,
+        )
+        level = [""]
+
+        with ThreadPoolExecutor(
+            max_workers=self.migration_config.verify_workers, thread_name_prefix="verify"
+        ) as executor:
+            while level:
+                next_level = []
+                leaves = []
+
+                for prefix, destination_buckets in zip(level, executor.map(destination_digests, level)):
+                    source_buckets = self.store.bucket_digests(destination, prefix)
+
+                    for bucket in sorted(source_buckets.keys() | destination_buckets.keys()):
+                        source_digest = source_buckets.get(bucket)
+                        destination_digest = destination_buckets.get(bucket)
+                        report.compared_buckets += 1
+
+                        # Equal checksums of inexact documents may hide changed numbers
+                        if source_digest == destination_digest and not source_digest.inexact_count:
+                            continue
+
+                        # IDs shorter than the bucket level are buckets of their own
+                        exact = len(bucket) <= len(prefix)
+
+                        if source_digest is None:
+                            self._record_extra(destination, bucket, exact, destination_digest, report)
+                        elif destination_digest is None:
+                            self._record(
+                                destination,
+                                MismatchKind.MISSING,
+                                [doc_id for doc_id, _ in self.store.iter_bucket(destination, bucket, exact)],
+                                report,
+                            )
+                        elif exact or max(source_digest.count, destination_digest.count) <= (
+                            self.migration_config.verify_leaf_size
+                        ):
+                            leaves.append((bucket, exact))
+                        else:
+                            next_level.append(bucket)
+
+                for (bucket, exact), destination_hashes in zip(
+                    leaves, executor.map(partial(self._destination_hashes, destination), leaves)
+                ):
+                    self._compare_leaf(destination, bucket, exact, destination_hashes, report)
+
+                level = next_level
+
+        logging.info(
+            f"Verified {destination}: {report.source_count} source documents, "
+            f"{report.missing_count} missing, {report.extra_count} extra, "
+            f"{report.different_count} different, {report.compared_buckets} buckets compared, "
+            f"{report.leaf_buckets} compared document by document"
+        )
+
+        return report
+
+    def _destination_hashes(self, destination: str, leaf: Tuple[str, bool]) -> Dict[str, bytes]:
+        """Returns content hashes of the destination documents in a leaf bucket."""
+
+        bucket, exact = leaf
+
+        return {
+            document["_id"]: content_hash(
+                {
+                    name: value
+                    for name, value in document.items()
+                    if name not in MIGRATION_MARKER_FIELDS
+                }
+            )
+            for document in self.controller.destination_db_client.iter_id_bucket(
+                collection_name=destination, bucket=bucket, exact=exact
+            )
+        }
+
+    def _compare_leaf(
+        self,
+        destination: str,
+        bucket: str,
+        exact: bool,
+        destination_hashes: Dict[str, bytes],
+        report: VerificationReport,
+    ):
+        """Compares the documents of a leaf bucket one by one."""
+
+        report.leaf_buckets += 1
+        missing_ids = []
+        different_ids = []
+
+        for doc_id, source_hash in self.store.iter_bucket(destination, bucket, exact):
+            destination_hash = destination_hashes.pop(doc_id, None)
+
+            if destination_hash is None:
+                missing_ids.append(doc_id)
+            elif destination_hash != source_hash:
+                different_ids.append(doc_id)
+
+        self._record(destination, MismatchKind.MISSING, missing_ids, report)
+        self._record(destination, MismatchKind.DIFFERENT, different_ids, report)
+        # Destination documents left over have no source document
+        self._record(destination, MismatchKind.EXTRA, list(destination_hashes), report)
+
+    def _record_extra(
+        self,
+        destination: str,
+        bucket: str,
+        exact: bool,
+        digest: BucketDigest,
+        report: VerificationReport,
+    ):
+        """Records a destination bucket without any source document. Only IDs that fit
+        into the report limit are read."""
+
+        limit = max(self.migration_config.verify_report_limit - self._reported_count(report), 0)
+        doc_ids = []
+
+        if limit:
+            for document in self.controller.destination_db_client.iter_id_bucket(
+                collection_name=destination, bucket=bucket, exact=exact, projection={"_id": 1}
+            ):
+                doc_ids.append(document["_id"])
+
+                if len(doc_ids) >= limit:
+                    break
+
+        self._record(destination, MismatchKind.EXTRA, doc_ids, report)
+        report.extra_count += digest.count - len(doc_ids)
+
+    def _record(
+        self, destination: str, kind: MismatchKind, doc_ids: List[str], report: VerificationReport
+    ):
+        """Counts mismatching documents and saves their IDs into the internal database,
+        up to the report limit."""
+
+        if not doc_ids:
+            return
+
+        limit = max(self.migration_config.verify_report_limit - self._reported_count(report), 0)
+        verified_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+        if limit:
+            self.controller.internal_db_client.batch_write(
+                collection_name=VERIFICATION_COLLECTION_NAME,
+                documents=[
+                    {
+                        "id": f"{destination}#{doc_id}",
+                        "destination_collection_name": destination,
+                        "document_id": doc_id,
+                        "kind": kind.value,
+                        "verified_at": verified_at,
+                    }
+                    for doc_id in doc_ids[:limit]
+                ],
+            )
+
+        if kind == MismatchKind.MISSING:
+            report.missing_count += len(doc_ids)
+        elif kind == MismatchKind.EXTRA:
+            report.extra_count += len(doc_ids)
+        else:
+            report.different_count += len(doc_ids)
+
+    @staticmethod
+    def _reported_count(report: VerificationReport) -> int:
+        """Returns the number of mismatches counted so far."""
+
+        return report.missing_count + report.extra_count + report.different_count
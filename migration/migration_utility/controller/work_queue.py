@@ -0,0 +1,560 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Callable, Iterable, List, Optional
+
+from pydantic import BaseModel, Field
+from pymongo import ReturnDocument
+
+from migration.migration_utility import logging
+from migration.migration_utility.configuration.document_configuration import (
+    DocumentConfiguration,
+)
+from migration.migration_utility.configuration.migration_configuration import (
+    MigrationConfigurator,
+)
+from migration.migration_utility.controller.progress import ProgressReporter, ProgressTracker
+from migration.migration_utility.controller.sharding import ShardAssignment
+from migration.migration_utility.db_clients.mongodb.mongodb_client import MongoDbClient
+from migration.migration_utility.metrics import MetricsRegistry
+from migration.migration_utility.retry import RetryCounters
+from migration_utility.enums import WorkUnitKind, WorkUnitStatus
+
+if TYPE_CHECKING:
+    from migration.migration_utility.controller.migration_controller import (
+        MigrationController,
+    )
+
+# Internal database collection with the work units of multi-node runs
+WORK_UNITS_COLLECTION_NAME = "migration_work_units"
+# Document of the work units collection written once all units are seeded
+SEEDED_MARKER_ID = "#seeded"
+
+
+class WorkUnit(BaseModel):
+    """Model of a leased part of the migration."""
+
+    unit_id: str = Field(..., alias="_id", description="unique id of the work unit")
+    kind: WorkUnitKind = Field(..., description="segment, id_range or collection")
+    segment: int = Field(None, description="scan segment of segment units")
+    status: WorkUnitStatus = Field(WorkUnitStatus.PENDING, description="state of the unit")
+    owner: str = Field(None, description="id of the worker holding the lease")
+    attempts: int = Field(0, description="number of times the unit was leased")
+
+    class Config:
+        allow_population_by_field_name = True
+
+
+class WorkUnitAssignment(ShardAssignment):
+    """Decides which document configurations belong to a leased work unit.
+
+    Parallel scans are split into one unit per scan segment. Configurations read by id,
+    parents and their children alike, are hashed into ID ranges by their parent ID. All
+    other configurations are grouped by their destination collection, so configurations
+    that share a LastEvaluatedKey document are always migrated by a single worker.
+    """
+
+    def __init__(self, unit: WorkUnit, id_range_chunks: int, split_segments: bool = True):
+        """Initializes the assignment.
+
+        Args:
+            unit: leased WorkUnit
+            id_range_chunks: number of ID ranges configurations read by id are split into
+            split_segments: if True parallel scans are split into segment units
+        """
+
+        super().__init__(shard_index=0, shard_count=1, split_segments=split_segments)
+
+        self.unit = unit
+        self.id_range_chunks = id_range_chunks
+
+    def owns_segment(self, segment: int) -> bool:
+        """Checks whether the scan segment belongs to the unit."""
+
+        return self.unit.kind == WorkUnitKind.SEGMENT and segment == self.unit.segment
+
+    def owns(self, document_cfg: DocumentConfiguration, scan_segments: int) -> bool:
+        """Checks whether the document configuration, or a part of it, belongs to the unit."""
+
+        return any(
+            unit["_id"] == self.unit.unit_id
+            for unit in self.plan_units(
+                document_cfg=document_cfg,
+                scan_segments=scan_segments if self.split_segments else 1,
+                id_range_chunks=self.id_range_chunks,
+            )
+        )
+
+    @classmethod
+    def plan_units(
+        cls, document_cfg: DocumentConfiguration, scan_segments: int, id_range_chunks: int
+    ) -> List[dict]:
+        """Returns the work units the document configuration is split into.
+
+        Args:
+            document_cfg: DocumentConfiguration instance
+            scan_segments: number of segments parallel scans are split into
+            id_range_chunks: number of ID ranges configurations read by id are split into
+
+        Returns: list of work unit documents with _id, kind and segment
+        """
+
+        if document_cfg.scan and scan_segments > 1:
+            shard_key = cls.shard_key(document_cfg)
+
+            return [
+                {
+                    "_id": f"{WorkUnitKind.SEGMENT.value}:{shard_key}:{segment}",
+                    "kind": WorkUnitKind.SEGMENT.value,
+                    "segment": segment,
+                }
+                for segment in range(scan_segments)
+            ]
+
+        if document_cfg.find_one or document_cfg.related_document:
+            chunk = cls.stable_hash(cls.shard_key(document_cfg)) % id_range_chunks
+
+            return [
+                {
+                    "_id": f"{WorkUnitKind.ID_RANGE.value}:{chunk}/{id_range_chunks}",
+                    "kind": WorkUnitKind.ID_RANGE.value,
+                }
+            ]
+
+        return [
+            {
+                "_id": f"{WorkUnitKind.COLLECTION.value}:{document_cfg.destination_collection_name}",
+                "kind": WorkUnitKind.COLLECTION.value,
+            }
+        ]
+
+
+class MongoWorkQueue:
+    """Queue of leasable work units kept in the internal MongoDB.
+
+    A worker leases a unit with an atomic find-and-modify, keeps the lease alive with
+    heartbeats and marks the unit done when it is migrated. Leases that were not renewed
+    in time are taken over by other workers. Lease times come from the clocks of the
+    workers, so their skew should stay well below the lease duration. Units stay done
+    after the run, drop the work units collection to start a new run.
+    """
+
+    def __init__(self, db_client: MongoDbClient, lease_duration: float, max_attempts: int):
+        """Initializes the queue.
+
+        Args:
+            db_client: client of the internal MongoDB
+            lease_duration: seconds a lease is valid for without a heartbeat
+            max_attempts: max number of leases of a unit before it is marked failed
+        """
+
+        self.db_client = db_client
+        self.lease_duration = lease_duration
+        self.max_attempts = max_attempts
+
+    @property
+    def collection(self):
+        """Returns the collection with the work units."""
+
+        return self.db_client.client_connector[WORK_UNITS_COLLECTION_NAME]
+
+    def seed(
+        self,
+        document_configs: Iterable[DocumentConfiguration],
+        scan_segments: int,
+        id_range_chunks: int,
+    ) -> int:
+        """Creates work units of all configurations unless they were created already.
+        Seeding is idempotent, so all workers may seed concurrently.
+
+        Args:
+            document_configs: DocumentConfiguration instances, e.g. a lazy iterator
+            scan_segments: number of segments parallel scans are split into
+            id_range_chunks: number of ID ranges configurations read by id are split into
+
+        Returns: number of created work units
+        """
+
+        if self.collection.find_one({"_id": SEEDED_MARKER_ID}):
+            return 0
+
+        created_count = 0
+        unit_ids = set()
+
+        for document_cfg in document_configs:
+            for unit in WorkUnitAssignment.plan_units(
+                document_cfg=document_cfg,
+                scan_segments=scan_segments,
+                id_range_chunks=id_range_chunks,
+            ):
+                if unit["_id"] in unit_ids:
+                    continue
+
+                unit_ids.add(unit["_id"])
+                unit_id = unit.pop("_id")
+                response = self.collection.update_one(
+                    {"_id": unit_id},
+                    {
+                        "$setOnInsert": {
+                            **unit,
+                            "status": WorkUnitStatus.PENDING.value,
+                            "attempts": 0,
+                            "created_at": self._now(),
+                        }
+                    },
+                    upsert=True,
+                )
+                created_count += 1 if response.upserted_id is not None else 0
+
+        self.collection.update_one(
+            {"_id": SEEDED_MARKER_ID},
+            {"$setOnInsert": {"units": len(unit_ids), "created_at": self._now()}},
+            upsert=True,
+        )
+        logging.info(f"Seeded {created_count} of {len(unit_ids)} work units")
+
+        return created_count
+
+    def lease(self, worker_id: str) -> Optional[WorkUnit]:
+        """Leases a pending unit or, when there is none, a unit whose lease expired.
+        Expired units that ran out of attempts are marked failed instead.
+
+        Args:
+            worker_id: id of the leasing worker
+
+        Returns: leased WorkUnit or None when no unit can be leased now
+        """
+
+        now = self._now()
+        expired = {"status": WorkUnitStatus.LEASED.value, "lease_expires_at": {"$lt": now}}
+        # Workers that died mid-unit never call fail, so their attempts are counted here
+        response = self.collection.update_many(
+            {**expired, "attempts": {"$gte": self.max_attempts}},
+            {
+                "$set": {"status": WorkUnitStatus.FAILED.value, "error": "lease expired"},
+                "$unset": {"owner": "", "lease_expires_at": ""},
+            },
+        )
+
+        if response.modified_count:
+            logging.info(f"Marked {response.modified_count} expired work units as failed")
+
+        update = {
+            "$set": {
+                "status": WorkUnitStatus.LEASED.value,
+                "owner": worker_id,
+                "leased_at": now,
+                "lease_expires_at": now + timedelta(seconds=self.lease_duration),
+            },
+            "$inc": {"attempts": 1},
+        }
+
+        for query in (
+            {"status": WorkUnitStatus.PENDING.value},
+            {**expired, "attempts": {"$lt": self.max_attempts}},
+        ):
+            previous = self.collection.find_one_and_update(
+                query, update, sort=[("_id", 1)], return_document=ReturnDocument.BEFORE
+            )
+
+            if previous is None:
+                continue
+
+            if previous.get("owner"):
+                logging.info(
+                    f"Took over expired lease of {previous['_id']} from {previous['owner']}"
+                )
+
+            return WorkUnit(
+                **{**previous, "owner": worker_id, "attempts": previous["attempts"] + 1}
+            )
+
+        return None
+
+    def heartbeat(self, unit: WorkUnit, worker_id: str) -> bool:
+        """Extends the lease of the unit.
+
+        Args:
+            unit: leased WorkUnit
+            worker_id: id of the worker holding the lease
+
+        Returns: False if the lease was lost to another worker
+        """
+
+        response = self.collection.update_one(
+            {"_id": unit.unit_id, "owner": worker_id, "status": WorkUnitStatus.LEASED.value},
+            {"$set": {"lease_expires_at": self._now() + timedelta(seconds=self.lease_duration)}},
+        )
+
+        return response.matched_count == 1
+
+    def complete(self, unit: WorkUnit, worker_id: str) -> bool:
+        """Marks the unit as done.
+
+        Args:
+            unit: leased WorkUnit
+            worker_id: id of the worker holding the lease
+
+        Returns: False if the lease was lost to another worker
+        """
+
+        response = self.collection.update_one(
+            {"_id": unit.unit_id, "owner": worker_id, "status": WorkUnitStatus.LEASED.value},
+            {
+                "$set": {"status": WorkUnitStatus.DONE.value, "finished_at": self._now()},
+                "$unset": {"lease_expires_at": ""},
+            },
+        )
+
+        return response.matched_count == 1
+
+    def fail(self, unit: WorkUnit, worker_id: str, error: str) -> bool:
+        """Releases the unit after a failure. The unit is leased again unless it ran out
+        of attempts, in which case it is marked failed.
+
+        Args:
+            unit: leased WorkUnit
+            worker_id: id of the worker holding the lease
+            error: description of the failure
+
+        Returns: False if the lease was lost to another worker
+        """
+
+        status = (
+            WorkUnitStatus.FAILED if unit.attempts >= self.max_attempts else WorkUnitStatus.PENDING
+        )
+        response = self.collection.update_one(
+            {"_id": unit.unit_id, "owner": worker_id, "status": WorkUnitStatus.LEASED.value},
+            {
+                "$set": {"status": status.value, "error": error},
+                "$unset": {"owner": "", "lease_expires_at": ""},
+            },
+        )
+
+        return response.matched_count == 1
+
+    def unfinished_count(self) -> int:
+        """Returns the number of units that are pending or leased."""
+
+        return self.collection.count_documents(
+            {"status": {"$in": [WorkUnitStatus.PENDING.value, WorkUnitStatus.LEASED.value]}}
+        )
+
+    def failed_count(self) -> int:
+        """Returns the number of units that ran out of attempts."""
+
+        return self.collection.count_documents({"status": WorkUnitStatus.FAILED.value})
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(timezone.utc)
+
+
+class LeaseHeartbeat:
+    """Extends the lease of a unit from a background thread while the unit is migrated."""
+
+    def __init__(self, work_queue: MongoWorkQueue, unit: WorkUnit, worker_id: str, interval: float):
+        """Initializes the heartbeat.
+
+        Args:
+            work_queue: MongoWorkQueue the unit was leased from
+            unit: leased WorkUnit
+            worker_id: id of the worker holding the lease
+            interval: seconds between two heartbeats
+        """
+
+        self.work_queue = work_queue
+        self.unit = unit
+        self.worker_id = worker_id
+        self.interval = interval
+
+        self.lost = False
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(
+            target=self._run, name=f"lease-{self.unit.unit_id}", daemon=True
+        )
+        self._thread.start()
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop_event.set()
+        self._thread.join()
+
+    def _run(self):
+        """Sends heartbeats until the unit is finished or the lease is lost."""
+
+        while not self._stop_event.wait(self.interval):
+            try:
+                alive = self.work_queue.heartbeat(unit=self.unit, worker_id=self.worker_id)
+            except Exception as exc:
+                # The lease stays valid until it expires, the next heartbeat may succeed
+                logging.info(f"Heartbeat of {self.unit.unit_id} failed --> {exc!r}")
+                continue
+
+            if not alive:
+                # Writes are idempotent upserts, so the unit is safely migrated twice
+                logging.info(f"Lease of {self.unit.unit_id} was taken over by another worker")
+                self.lost = True
+                return
+
+
+class WorkQueueRunner:
+    """Migrates work units leased from the internal database until none is left to any
+    worker. Any number of workers on any number of nodes may run against the same queue.
+    """
+
+    def __init__(
+        self,
+        work_queue: MongoWorkQueue,
+        migration_config: MigrationConfigurator,
+        document_configs_factory: Callable[[], Iterable[DocumentConfiguration]],
+        controller_factory: Callable[..., "MigrationController"],
+        scan_segments: int,
+        worker_id: str = None,
+    ):
+        """Initializes the runner.
+
+        Args:
+            work_queue: MongoWorkQueue instance
+            migration_config: MigrationConfigurator instance with lease settings
+            document_configs_factory: function that returns all document configurations,
+                called once per unit so lazy configurations are generated again
+            controller_factory: function that creates a MigrationController from
+                document_configs
+            scan_segments: number of segments parallel scans are split into
+            worker_id: id of the worker, host name and process id by default
+        """
+
+        self.work_queue = work_queue
+        self.migration_config = migration_config
+        self.document_configs_factory = document_configs_factory
+        self.controller_factory = controller_factory
+        # Asynchronous reads do not use scan segments, so scans are leased whole
+        self.split_segments = not migration_config.asynchronous
+        self.scan_segments = scan_segments if self.split_segments else 1
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self.controller: Optional["MigrationController"] = None
+        self._migrated_before = 0
+        # Controllers of all units report into the same registry and tracker
+        self.metrics = MetricsRegistry(track_bytes=migration_config.metrics_exporter is not None)
+        self.progress = ProgressTracker(window=migration_config.progress_window)
+
+    @property
+    def migrated_total(self) -> int:
+        """Returns the number of documents migrated by the worker."""
+
+        return self._migrated_before + (self.controller.migrated_total if self.controller else 0)
+
+    @property
+    def retry_counters(self) -> RetryCounters:
+        """Returns retry counters of the current controller."""
+
+        return self.controller.retry_counters if self.controller else RetryCounters()
+
+    def run(self, force_migration: bool = False):
+        """Seeds the queue and migrates leased units until all units are finished.
+
+        Args:
+            force_migration: if True documents are migrated regardless of their migration status
+
+        Returns: None
+        """
+
+        metrics_exporter = self.migration_config.create_metrics_exporter(registry=self.metrics)
+
+        if metrics_exporter:
+            metrics_exporter.start()
+
+        try:
+            with ProgressReporter(
+                tracker=self.progress, interval=self.migration_config.progress_log_interval
+            ):
+                self._run(force_migration=force_migration)
+        finally:
+            if metrics_exporter:
+                metrics_exporter.close()
+
+    def _run(self, force_migration: bool):
+        """Seeds the queue and migrates leased units until all units are finished."""
+
+        self.work_queue.seed(
+            document_configs=self.document_configs_factory(),
+            scan_segments=self.scan_segments,
+            id_range_chunks=self.migration_config.id_range_chunks,
+        )
+
+        while True:
+            unit = self.work_queue.lease(worker_id=self.worker_id)
+
+            if unit is None:
+                if not self.work_queue.unfinished_count():
+                    break
+
+                # Remaining units are leased by other workers, their leases may expire
+                time.sleep(self.migration_config.heartbeat_interval)
+                continue
+
+            logging.info(f"Worker {self.worker_id} leased {unit.unit_id}")
+            self._run_unit(unit=unit, force_migration=force_migration)
+
+        logging.info(
+            f"Worker {self.worker_id} finished, {self.work_queue.failed_count()} failed work units"
+        )
+
+    def _run_unit(self, unit: WorkUnit, force_migration: bool):
+        """Migrates the configurations of a leased unit and releases the unit.
+
+        Args:
+            unit: leased WorkUnit
+            force_migration: if True documents are migrated regardless of their migration status
+
+        Returns: None
+        """
+
+        assignment = WorkUnitAssignment(
+            unit=unit,
+            id_range_chunks=self.migration_config.id_range_chunks,
+            split_segments=self.split_segments,
+        )
+
+        with LeaseHeartbeat(
+            work_queue=self.work_queue,
+            unit=unit,
+            worker_id=self.worker_id,
+            interval=self.migration_config.heartbeat_interval,
+        ) as heartbeat:
+            try:
+                if self.controller is None:
+                    self.controller = self.controller_factory(
+                        document_configs=[], metrics=self.metrics, progress=self.progress
+                    )
+
+                self.controller.assign(
+                    document_configs=self.document_configs_factory(), assignment=assignment
+                )
+
+                # Units of configurations that were removed since seeding own nothing
+                if self.controller.current_doc_cfg is not None:
+                    self.controller.migrate(force_migration=force_migration)
+            except Exception as exc:
+                logging.info(f"Work unit {unit.unit_id} failed --> {exc!r}")
+                self.work_queue.fail(unit=unit, worker_id=self.worker_id, error=repr(exc))
+                # Pagination state of the failed unit must not leak into the next one
+                self._migrated_before += self.controller.migrated_total if self.controller else 0
+                self.controller = None
+                return
+
+        if heartbeat.lost:
+            # The new owner migrates the unit again and completes it
+            logging.info(f"Work unit {unit.unit_id} was not completed, its lease was lost")
+            return
+
+        self.work_queue.complete(unit=unit, worker_id=self.worker_id)
@@ -0,0 +1,194 @@
+from decimal import Decimal
+from typing import Any, Callable, List, Union
+
+from boto3.dynamodb.types import Binary
+from bson.decimal128 import Decimal128, create_decimal128_context
+
+from migration_utility.enums import NumberMode
+
+_INT64_MIN = -(2 ** 63)
+_INT64_MAX = 2 ** 63 - 1
+_DECIMAL128_CONTEXT = create_decimal128_context()
+_DECIMAL128_CACHE_SIZE = 65536
+_PASSTHROUGH_TYPES = frozenset([str, bool, int, float, bytes, type(None)])
+
+
+def _set_sort_key(value: Any) -> Any:
+    """Returns a sortable key of a DynamoDB set member."""
+
+    return value.value if type(value) is Binary else value
+
+
+class DocumentNormalizer:
+    """Converts documents read from DynamoDB into BSON-ready values in a single walk.
+
+    DynamoDB numbers are mapped according to the number mode:
+        int: integral numbers become int, fractional numbers become float
+        float: all numbers become float
+        decimal128: all numbers become Decimal128 and keep their exact value
+    Sets become sorted lists and Binary values become bytes. Items in DynamoDB wire
+    format can be translated directly with translate_item().
+    """
+
+    def __init__(self, number_mode: NumberMode = NumberMode.INT):
+        """Initializes the normalizer.
+
+        Args:
+            number_mode: destination type of DynamoDB numbers
+        """
+
+        self.number_mode = number_mode
+        self._decimal128_cache = {}
+        self._convert_number: Callable[[Decimal], Any] = {
+            NumberMode.INT: self._to_int_or_float,
+            NumberMode.FLOAT: float,
+            NumberMode.DECIMAL128: self._to_decimal128,
+        }[NumberMode(number_mode)]
+        self._convert_number_string: Callable[[str], Any] = {
+            NumberMode.INT: self._string_to_int_or_float,
+            NumberMode.FLOAT: float,
+            NumberMode.DECIMAL128: self._to_decimal128,
+        }[NumberMode(number_mode)]
+
+    def normalize_documents(self, documents: List[dict]) -> List[dict]:
+        """Normalizes a list of documents.
+
+        Args:
+            documents: documents to normalize
+
+        Returns: list of normalized documents
+        """
+
+        normalize = self.normalize
+
+        return [normalize(doc) for doc in documents]
+
+    def normalize(self, value: Any) -> Any:
+        """Normalizes a single value, recursing into maps, lists and sets.
+
+        Args:
+            value: value read from DynamoDB
+
+        Returns: BSON-ready value
+        """
+
+        value_type = type(value)
+
+        if value_type in _PASSTHROUGH_TYPES:
+            return value
+        if value_type is dict:
+            normalize = self.normalize
+            # Strings are the most common values, so they skip the recursive call
+            return {
+                k: v if type(v) is str else normalize(v) for k, v in value.items()
+            }
+        if value_type is Decimal:
+            return self._convert_number(value)
+        if value_type is list:
+            normalize = self.normalize
+            return [v if type(v) is str else normalize(v) for v in value]
+        if value_type is set or value_type is frozenset:
+            normalize = self.normalize
+            return [normalize(v) for v in sorted(value, key=_set_sort_key)]
+        if value_type is Binary:
+            return value.value
+        if isinstance(value, dict):
+            return {k: self.normalize(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [self.normalize(v) for v in value]
+
+        return value
+
+    def translate_item(self, item: dict) -> dict:
+        """Translates an item in DynamoDB wire format, e.g. {"id": {"S": "..."}}, straight
+        into a BSON-ready document without building intermediate Decimal objects.
+
+        Args:
+            item: item returned by the low-level DynamoDB client
+
+        Returns: BSON-ready document
+        """
+
+        translate = self.translate_attribute_value
+
+        return {k: translate(v) for k, v in item.items()}
+
+    def translate_attribute_value(self, attribute_value: dict) -> Any:
+        """Translates a single DynamoDB AttributeValue into a BSON-ready value.
+
+        Args:
+            attribute_value: typed value, e.g. {"N": "1.5"}
+
+        Returns: BSON-ready value
+        """
+
+        tag = next(iter(attribute_value))
+        data = attribute_value[tag]
+
+        if tag == "S":
+            return data
+        if tag == "N":
+            return self._convert_number_string(data)
+        if tag == "M":
+            translate = self.translate_attribute_value
+            return {k: translate(v) for k, v in data.items()}
+        if tag == "L":
+            translate = self.translate_attribute_value
+            return [translate(v) for v in data]
+        if tag == "BOOL" or tag == "B":
+            return data
+        if tag == "NULL":
+            return None
+        if tag == "SS" or tag == "BS":
+            return sorted(data)
+        if tag == "NS":
+            convert = self._convert_number_string
+            return [convert(v) for v in sorted(data, key=Decimal)]
+
+        raise ValueError(f"Unknown DynamoDB attribute type {tag}")
+
+    def _string_to_int_or_float(self, value: str) -> Any:
+        """Converts a DynamoDB number in its string form to int or float. DynamoDB
+        returns numbers without trailing zeros, so a decimal point means a fraction.
+        """
+
+        if "." in value:
+            return float(value)
+        if "e" in value or "E" in value:
+            return self._to_int_or_float(Decimal(value))
+
+        integral = int(value)
+
+        if _INT64_MIN <= integral <= _INT64_MAX:
+            return integral
+
+        return float(value)
+
+    @staticmethod
+    def _to_int_or_float(value: Decimal) -> Any:
+        """Converts integral numbers that fit into int64 to int, others to float."""
+
+        if value == value.to_integral_value():
+            integral = int(value)
+
+            if _INT64_MIN <= integral <= _INT64_MAX:
+                return integral
+
+        return float(value)
+
+    def _to_decimal128(self, value: Union[Decimal, str]) -> Decimal128:
+        """Converts the number to Decimal128, rounding it to 34 significant digits.
+        Decimal128 construction is slow, so conversions of repeated values are cached.
+        """
+
+        key = str(value)
+        converted = self._decimal128_cache.get(key)
+
+        if converted is None:
+            if len(self._decimal128_cache) >= _DECIMAL128_CACHE_SIZE:
+                self._decimal128_cache.clear()
+
+            converted = Decimal128(_DECIMAL128_CONTEXT.create_decimal(value))
+            self._decimal128_cache[key] = converted
+
+        return converted
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Any, List
+from typing import Any, Dict, List, Optional
 from .enums import FieldQueryOperation
 
 
@@ -40,6 +40,19 @@ class ReadQueryResult(BaseModel):
     last_evaluated_key: dict = Field(
         None, description="key data of the latest evaluated doc. used for pagination"
     )
+    segment_keys: Dict[int, Optional[dict]] = Field(
+        None,
+        description="last evaluated keys of the scan segments read by this query. "
+        "None value indicates that the segment has been read completely",
+    )
+    normalized: bool = Field(
+        False,
+        description="indicates whether documents were already translated into the destination format",
+    )
+    resume_point: Any = Field(
+        None,
+        description="ResumePoint of the page, released once the documents are written and marked",
+    )
 
 
 class WriteQueryResult(BaseModel):
@@ -54,3 +67,88 @@ class WriteQueryResult(BaseModel):
     processed_document_ids: List[str] = Field(
         ..., description="list of processed documents, upserted and matched"
     )
+    failed_document_ids: List[str] = Field(
+        [], description="list of documents that could not be written after all retries"
+    )
+    rejected_document_ids: List[str] = Field(
+        [],
+        description="failed documents rejected with a non-retryable error. "
+        "they are reported as failed but not worth retrying",
+    )
+
+
+class StreamRecord(BaseModel):
+    """Model that holds a single change read from the stream of a source collection."""
+
+    event_name: str = Field(..., description="INSERT, MODIFY or REMOVE")
+    sequence_number: str = Field(
+        ..., description="position of the change in its stream shard"
+    )
+    keys: dict = Field(..., description="key data of the changed document")
+    document: dict = Field(
+        None, description="document after the change. None for removals"
+    )
+    old_document: dict = Field(
+        None, description="document before the change, if the stream keeps old images"
+    )
+
+
+class StreamReadResult(BaseModel):
+    """Model that holds information returned from a read of a stream shard."""
+
+    records: List[StreamRecord] = Field(
+        ..., description="changes in the order they happened"
+    )
+    next_iterator: str = Field(
+        None,
+        description="iterator of the next read. None indicates that the shard is closed "
+        "and has been read completely",
+    )
+    normalized: bool = Field(
+        False,
+        description="indicates whether documents were already translated into the destination format",
+    )
+
+
+class CollectionSize(BaseModel):
+    """Model that holds the size of a collection kept in the metadata of the database."""
+
+    item_count: int = Field(
+        ..., description="approximate number of documents, refreshed by the database periodically"
+    )
+    size_bytes: int = Field(..., description="approximate size of all documents in bytes")
+
+
+class BucketDigest(BaseModel):
+    """Model that holds the digest of the documents whose IDs start with a prefix."""
+
+    count: int = Field(..., description="number of documents in the bucket")
+    size_bytes: int = Field(..., description="sum of the BSON sizes of the documents")
+    checksum: Optional[int] = Field(
+        None,
+        description="sum of the document checksums. None if the destination cannot "
+        "compute them",
+    )
+    inexact_count: int = Field(
+        0,
+        description="number of documents whose checksums may miss changed numbers. "
+        "buckets with such documents are compared document by document",
+    )
+
+
+class VerificationReport(BaseModel):
+    """Model that holds the result of the verification of a destination collection."""
+
+    destination_collection_name: str = Field(..., description="name of the verified collection")
+    source_count: int = Field(0, description="number of source documents routed into the collection")
+    missing_count: int = Field(0, description="number of source documents absent from the destination")
+    extra_count: int = Field(0, description="number of destination documents absent from the source")
+    different_count: int = Field(0, description="number of documents whose content differs")
+    compared_buckets: int = Field(0, description="number of bucket digests compared")
+    leaf_buckets: int = Field(0, description="number of buckets compared document by document")
+
+    @property
+    def verified(self) -> bool:
+        """Returns True if the destination matches the source."""
+
+        return not (self.missing_count or self.extra_count or self.different_count)
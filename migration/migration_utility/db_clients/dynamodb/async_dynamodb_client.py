@@ -0,0 +1,475 @@
+import asyncio
+import time
+from contextlib import AsyncExitStack
+from functools import partial
+from math import ceil
+from typing import AsyncIterator, Callable, List, Optional, Tuple, Union
+
+from aiobotocore.config import AioConfig
+from aiobotocore.session import get_session
+from botocore.exceptions import BotoCoreError, ClientError
+
+from migration.migration_utility import logging
+from migration.migration_utility.db_clients.dynamodb.data_types import FieldQuery
+from migration.migration_utility.db_clients.dynamodb.dynamodb_client import (
+    DynamoDbClient,
+)
+from migration.migration_utility.db_clients.generic import AsyncGenericClient
+from migration.migration_utility.retry import aretry_call, classify_error
+from migration_utility.data_types import ReadQueryResult, WriteQueryResult
+from migration_utility.enums import ErrorClass, LoadMode, ReadMode, UpdateMode
+from migration_utility.exceptions import RetryableFetchingError
+
+
+class AsyncDynamoDbClient(DynamoDbClient, AsyncGenericClient):
+    """DynamoDB client class that performs operations with DynamoDB on the asyncio event
+    loop. Pagination state is passed in explicitly, so a single instance can serve many
+    concurrent reads.
+    """
+
+    def __init__(self, batch_size: int, max_concurrency: int = 100, **kwargs):
+        super().__init__(batch_size=batch_size, **kwargs)
+
+        self._max_concurrency = max_concurrency
+        self._async_client_connector = None
+        self._exit_stack = None
+        self._semaphore = None
+
+    @property
+    def async_client_connector(self):
+        """Returns the asynchronous DynamoDB client connection opened by aconnect()."""
+
+        if not self._async_client_connector:
+            raise RuntimeError("aconnect() should be awaited before using the client")
+
+        return self._async_client_connector
+
+    async def aconnect(self):
+        """Opens the asynchronous DynamoDB client connection.
+
+        Returns: instance that represents client connection
+        """
+
+        if not self._async_client_connector:
+            self._exit_stack = AsyncExitStack()
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+            self._async_client_connector = await self._exit_stack.enter_async_context(
+                get_session().create_client(
+                    "dynamodb",
+                    config=AioConfig(
+                        retries={"total_max_attempts": 3, "mode": "legacy"},
+                        max_pool_connections=self._max_concurrency,
+                    ),
+                    endpoint_url=self._endpoint_url,
+                )
+            )
+
+        return self._async_client_connector
+
+    async def aclose(self):
+        """Closes the asynchronous DynamoDB client connection."""
+
+        if self._exit_stack:
+            await self._exit_stack.aclose()
+
+        self._async_client_connector = None
+        self._exit_stack = None
+
+    async def abatch_write(
+        self, collection_name: str, documents: List[dict], load_mode: LoadMode = LoadMode.UPSERT
+    ) -> WriteQueryResult:
+        """Performs batch write operation by putting the passed in documents into the
+        database. Chunks of at most 25 items and 16 MB are sent concurrently.
+
+        Args:
+            collection_name: name of the collection where write operation is performed
+            documents: list of documents to be written
+            load_mode: ignored, PutRequest always replaces existing items
+
+        Returns: WriteQueryResult instance with the written and the failed document ids
+        """
+
+        # The latest version of a document wins, like it would in consecutive writes
+        documents = list({doc.get("id"): doc for doc in documents}.values())
+        chunks = self._chunk_write_requests(self._prepare_batch_write_request(documents))
+        chunk_results = await asyncio.gather(
+            *[
+                self._awrite_chunk(collection_name=collection_name, write_requests=chunk)
+                for chunk in chunks
+            ]
+        )
+
+        return self._compose_batch_write_result(
+            collection_name=collection_name,
+            documents=documents,
+            written_ids={doc_id for written, _ in chunk_results for doc_id in written},
+            failed_ids={doc_id for _, failed in chunk_results for doc_id in failed},
+        )
+
+    async def abatch_update(self, collection_name: str, updates: List[dict]) -> WriteQueryResult:
+        """Performs a batch update operation. Partitions of 25 items are sent
+        concurrently, or single items in concurrent update mode.
+
+        Args:
+            collection_name: name of the collection into which the documents will be written
+            updates: list of dicts that contains key data and update field of the documents
+
+        Returns: WriteQueryResult instance with the updated and the failed document ids
+        """
+
+        if self._update_mode == UpdateMode.CONCURRENT:
+            errors = await asyncio.gather(
+                *[
+                    self._aupdate_with_retries(
+                        collection_name=collection_name, update_data=update_data
+                    )
+                    for update_data in updates
+                ]
+            )
+            failed_ids = {
+                update_data.get("id")
+                for update_data, error in zip(updates, errors)
+                if error is not None
+            }
+            rejected_ids = {
+                update_data.get("id")
+                for update_data, error in zip(updates, errors)
+                if error == ErrorClass.FATAL
+            }
+        else:
+            num_partitions = ceil(len(updates) / 25)
+            partition_results = await asyncio.gather(
+                *[
+                    self._apartitioned_batch_update(
+                        collection_name=collection_name,
+                        updates=updates[25 * i: 25 * i + 25],
+                    )
+                    for i in range(num_partitions)
+                ]
+            )
+            failed_ids = {doc_id for failed, _ in partition_results for doc_id in failed}
+            rejected_ids = {
+                doc_id for failed, rejected in partition_results if rejected for doc_id in failed
+            }
+
+        updated_document_ids = [
+            update_data.get("id") for update_data in updates if update_data.get("id") not in failed_ids
+        ]
+
+        return WriteQueryResult(
+            inserted_document_ids=[],
+            processed_count=len(updated_document_ids),
+            processed_document_ids=updated_document_ids,
+            failed_document_ids=[
+                update_data.get("id") for update_data in updates if update_data.get("id") in failed_ids
+            ],
+            rejected_document_ids=[
+                update_data.get("id") for update_data in updates if update_data.get("id") in rejected_ids
+            ],
+        )
+
+    async def aupdate(self, collection_name: str, update_data: dict):
+        """A method that performs a update operation.
+
+        Args:
+            collection_name: name of the collection into which the documents will be written
+            update_data: dict that contains key data and update field of the documents
+
+        Returns: None
+        """
+
+        await self._agoverned_write(
+            self.async_client_connector.update_item,
+            **self._compose_update_item(collection_name=collection_name, update_data=update_data),
+        )
+
+    async def afind(
+        self,
+        collection_name: str,
+        queries: List[FieldQuery],
+        query_index_name: str = None,
+        find_all: bool = False,
+        last_evaluated_key: dict = None,
+    ) -> ReadQueryResult:
+        """Reads pages from the database until the configured number of documents
+        (batch_size) is read or the query is exhausted.
+
+        Args:
+            collection_name: Name of the collection where the query is performed
+            queries: list of FieldQuery objects that describe the fields and values of the queries
+            query_index_name: name of the collection index the query will happen in
+            find_all: if True documents are read regardless of their migration status
+            last_evaluated_key: key data the read is continued from
+
+        Returns: ReadQueryResult instance
+        """
+
+        queries = [
+            q if isinstance(q, FieldQuery) else FieldQuery(**dict(q)) for q in queries
+        ]
+        request_params = self._compile_read_expressions(
+            queries=queries, query_index_name=query_index_name, find_all=find_all
+        )
+
+        batch_size = self.batch_size
+        fetched_documents = []
+
+        while True:
+            documents, last_evaluated_key = await self._afetch_documents(
+                collection_name=collection_name,
+                request_params=request_params,
+                query_index_name=query_index_name,
+                last_evaluated_key=last_evaluated_key,
+                document_count=batch_size - len(fetched_documents),
+            )
+            fetched_documents.extend(documents)
+
+            if len(fetched_documents) >= batch_size or not last_evaluated_key:
+                break
+
+        return ReadQueryResult(
+            has_more=last_evaluated_key is not None,
+            documents=fetched_documents,
+            last_evaluated_key=last_evaluated_key,
+            normalized=self._read_mode == ReadMode.RAW,
+        )
+
+    async def afind_document(self, collection_name: str, doc_id: str) -> ReadQueryResult:
+        """Finds one document that corresponds to the requested id.
+
+        Args:
+            collection_name: name of the collection
+            doc_id: id of the document
+
+        Returns: ReadQueryResult instance
+        """
+
+        try:
+            doc_data = await self._agoverned_read(
+                self.async_client_connector.get_item,
+                TableName=collection_name,
+                Key=self._extract_key_data({"id": doc_id}),
+            )
+        except ClientError as exc:
+            logging.exception(f"Failed to fetch document with id={doc_id}")
+            raise RetryableFetchingError from exc
+
+        documents = self._read_items([doc_data["Item"]]) if doc_data.get("Item") else []
+
+        return ReadQueryResult(
+            has_more=False,
+            documents=documents,
+            last_evaluated_key=None,
+            normalized=self._read_mode == ReadMode.RAW,
+        )
+
+    async def aiter_pages(
+        self,
+        collection_name: str,
+        queries: List[FieldQuery],
+        query_index_name: str = None,
+        find_all: bool = False,
+        last_evaluated_key: dict = None,
+    ) -> AsyncIterator[ReadQueryResult]:
+        """Iterates over batches of documents until the query is exhausted.
+
+        Args:
+            collection_name: Name of the collection where the query is performed
+            queries: list of FieldQuery objects that describe the fields and values of the queries
+            query_index_name: name of the collection index the query will happen in
+            find_all: if True documents are read regardless of their migration status
+            last_evaluated_key: key data the read is continued from
+
+        Returns: async iterator of ReadQueryResult instances
+        """
+
+        while True:
+            query_result = await self.afind(
+                collection_name=collection_name,
+                queries=queries,
+                query_index_name=query_index_name,
+                find_all=find_all,
+                last_evaluated_key=last_evaluated_key,
+            )
+
+            yield query_result
+
+            if not query_result.has_more:
+                return
+
+            last_evaluated_key = query_result.last_evaluated_key
+
+    async def _afetch_documents(
+        self,
+        collection_name: str,
+        request_params: dict,
+        query_index_name: str,
+        last_evaluated_key: Union[dict, None],
+        document_count: int,
+    ) -> tuple:
+        """Runs a single Query or Scan request.
+
+        Args:
+            collection_name: Name of the collection where the query is performed
+            request_params: compiled expressions of the request
+            query_index_name: name of the collection index the query will happen in
+            last_evaluated_key: key data the read is continued from
+            document_count: number of documents to read in this iteration
+
+        Returns: tuple of the read documents and the LastEvaluatedKey
+        """
+
+        request = {"TableName": collection_name, "Limit": document_count, **request_params}
+
+        if last_evaluated_key:
+            request["ExclusiveStartKey"] = self._serialize(last_evaluated_key)
+
+        try:
+            if query_index_name:
+                response = await self._agoverned_read(
+                    self.async_client_connector.query,
+                    IndexName=query_index_name,
+                    ScanIndexForward=True,
+                    **request,
+                )
+            else:
+                response = await self._agoverned_read(self.async_client_connector.scan, **request)
+        except ClientError as exc:
+            logging.exception(
+                f"Failed to fetch new batch. LastEvaluatedKey={last_evaluated_key}"
+            )
+            raise self._fetching_error(exc) from exc
+
+        next_key = response.get("LastEvaluatedKey")
+
+        return (
+            self._read_items(response["Items"]),
+            self._deserialize(next_key) if next_key else None,
+        )
+
+    async def _agoverned_read(self, request: Callable, **kwargs) -> dict:
+        """Asynchronous version of _governed_read(). Capacity is acquired before a
+        concurrency slot, so waiting requests do not hold slots.
+        """
+
+        if self._capacity_governor:
+            await self._capacity_governor.aacquire_read()
+            kwargs["ReturnConsumedCapacity"] = "TOTAL"
+
+        async with self._semaphore:
+            started_at = time.perf_counter()
+            response = await request(**kwargs)
+
+        if self._batch_sizer:
+            self._batch_sizer.record(latency=time.perf_counter() - started_at)
+        if self._capacity_governor:
+            self._capacity_governor.charge_read(response.get("ConsumedCapacity"))
+
+        return response
+
+    async def _agoverned_write(self, request: Callable, **kwargs) -> dict:
+        """Asynchronous version of _governed_write()."""
+
+        if self._capacity_governor:
+            await self._capacity_governor.aacquire_write()
+            kwargs["ReturnConsumedCapacity"] = "TOTAL"
+
+        async with self._semaphore:
+            response = await request(**kwargs)
+
+        if self._capacity_governor:
+            self._capacity_governor.charge_write(response.get("ConsumedCapacity"))
+
+        return response
+
+    async def _awrite_chunk(
+        self, collection_name: str, write_requests: List[dict]
+    ) -> Tuple[List[str], List[str]]:
+        """Asynchronous version of _write_chunk()."""
+
+        written_ids = []
+        attempt = 0
+
+        while write_requests:
+            pending_ids = [self._item_id(req["PutRequest"]["Item"]) for req in write_requests]
+            attempt += 1
+
+            try:
+                response = await self._agoverned_write(
+                    self.async_client_connector.batch_write_item,
+                    RequestItems={collection_name: write_requests},
+                )
+            except (BotoCoreError, ClientError) as exc:
+                error_class = classify_error(exc)
+
+                if not self._retry_policy.should_retry(attempt, error_class):
+                    logging.exception(
+                        f"The following exception occurred "
+                        f"when batch_write_item() was called on {collection_name} --> {exc}"
+                    )
+                    return written_ids, pending_ids
+
+                await asyncio.sleep(self._retry_policy.delay(attempt, error_class))
+                continue
+
+            unprocessed = response.get("UnprocessedItems", {}).get(collection_name, [])
+            unprocessed_ids = {self._item_id(req["PutRequest"]["Item"]) for req in unprocessed}
+            written_ids.extend(doc_id for doc_id in pending_ids if doc_id not in unprocessed_ids)
+            write_requests = unprocessed
+
+            if not unprocessed:
+                break
+            if not self._retry_policy.should_retry(attempt, ErrorClass.THROTTLING):
+                logging.info(
+                    f"{len(unprocessed)} items were left unprocessed in {collection_name}"
+                )
+                return written_ids, list(unprocessed_ids)
+
+            await asyncio.sleep(self._retry_policy.delay(attempt, ErrorClass.THROTTLING))
+
+        return written_ids, []
+
+    async def _aupdate_with_retries(
+        self, collection_name: str, update_data: dict
+    ) -> Optional[ErrorClass]:
+        """Asynchronous version of _update_with_retries()."""
+
+        payload = self._compose_update_item(
+            collection_name=collection_name, update_data=update_data
+        )
+
+        try:
+            await aretry_call(
+                partial(self._agoverned_write, self.async_client_connector.update_item, **payload),
+                policy=self._retry_policy,
+                description=f"Update of id={update_data.get('id')}",
+            )
+        except (BotoCoreError, ClientError) as exc:
+            return classify_error(exc)
+
+        return None
+
+    async def _apartitioned_batch_update(
+        self, collection_name: str, updates: List[dict]
+    ) -> Tuple[List[str], bool]:
+        """Asynchronous version of _partitioned_batch_update()."""
+
+        document_ids = [update_data.get("id") for update_data in updates]
+        transact_items = self._compose_transact_items(
+            collection_name=collection_name, updates=updates
+        )
+
+        try:
+            await self._agoverned_write(
+                self.async_client_connector.transact_write_items,
+                TransactItems=transact_items,
+            )
+        except (BotoCoreError, ClientError) as exc:
+            if classify_error(exc) == ErrorClass.FATAL:
+                logging.info(f"Failed to finish the following transaction --> {transact_items}")
+                return document_ids, True
+
+            logging.info(f"Batch update of {len(document_ids)} documents failed --> {exc}")
+            return document_ids, False
+
+        return [], False
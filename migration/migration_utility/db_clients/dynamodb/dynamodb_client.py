@@ -1,35 +1,157 @@
+import threading
 import time
+from collections import OrderedDict
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
 from math import ceil
 
 from migration.migration_utility import logging
-from functools import reduce
-from typing import List, Union
+from functools import partial, reduce
+from typing import Callable, Dict, List, Optional, Tuple, Union
 from pydantic import validate_arguments
 from migration.migration_utility.db_clients.generic import GenericClient
 from boto3 import client, resource
+from boto3.session import Session
 from boto3.resources.factory import ServiceResource
 from botocore.client import BaseClient
 from botocore.config import Config
-from botocore.exceptions import ClientError
+from botocore.exceptions import BotoCoreError, ClientError
 from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
 from boto3.dynamodb.conditions import Attr
 
 from migration.migration_utility.db_clients.dynamodb.data_types import FieldQuery
-from migration_utility.data_types import ReadQueryResult, WriteQueryResult
-from migration_utility.exceptions import RetryableFetchingError
+from migration.migration_utility.batch_sizing import AdaptiveBatchSizer
+from migration.migration_utility.capacity import CapacityGovernor
+from migration.migration_utility.retry import RetryPolicy, classify_error, retry_call
+from migration.migration_utility.converters import DocumentNormalizer
+from migration.migration_utility.db_clients.dynamodb.expressions import (
+    compile_read_expressions,
+    merge_queries,
+)
+from migration_utility.data_types import (
+    CollectionSize,
+    ReadQueryResult,
+    StreamReadResult,
+    StreamRecord,
+    WriteQueryResult,
+)
+from migration_utility.enums import ErrorClass, LoadMode, ReadMode, UpdateMode
+from migration_utility.exceptions import (
+    RetryableFetchingError,
+    ShardIteratorExpiredError,
+    StreamNotEnabledError,
+    StreamRecordsTrimmedError,
+    ThrottlingError,
+)
+
+# Number of document configurations whose compiled expressions are kept
+COMPILED_EXPRESSIONS_CACHE_SIZE = 1024
+# Limits of a single BatchWriteItem request
+BATCH_WRITE_MAX_ITEMS = 25
+BATCH_WRITE_MAX_BYTES = 16 * 1024 * 1024
+# Max number of keys of a single BatchGetItem request
+BATCH_GET_MAX_KEYS = 100
+
+
+def _floats_to_decimals(value):
+    """DynamoDB numbers are written from Decimals, so floats, e.g. read from MongoDB,
+    are converted through their shortest string representation.
+    """
+
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    if isinstance(value, dict):
+        return {k: _floats_to_decimals(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_floats_to_decimals(v) for v in value]
+
+    return value
+
+
+def _estimate_item_size(attribute_values: dict) -> int:
+    """Estimates the size of an item in DynamoDB wire format the way DynamoDB counts it:
+    attribute names plus their values.
+    """
+
+    return sum(
+        len(name.encode()) + _estimate_value_size(value)
+        for name, value in attribute_values.items()
+    )
+
+
+def _estimate_value_size(attribute_value: dict) -> int:
+    """Estimates the size of a single DynamoDB AttributeValue."""
+
+    tag, data = next(iter(attribute_value.items()))
+
+    if tag == "S":
+        return len(data.encode())
+    if tag == "N":
+        return len(data) // 2 + 2
+    if tag == "B":
+        return len(data)
+    if tag == "M":
+        return 3 + _estimate_item_size(data)
+    if tag == "L":
+        return 3 + sum(_estimate_value_size(v) + 1 for v in data)
+    if tag == "SS":
+        return sum(len(v.encode()) for v in data)
+    if tag == "NS":
+        return sum(len(v) // 2 + 2 for v in data)
+    if tag == "BS":
+        return sum(len(v) for v in data)
+
+    return 1
 
 
 class DynamoDbClient(GenericClient):
     """DynamoDB client class that ensure connectivity and operations with DynamoDB."""
 
-    def __init__(self, batch_size: int):
+    def __init__(
+        self,
+        batch_size: int,
+        scan_segments: int = 1,
+        scan_workers: int = None,
+        read_mode: ReadMode = ReadMode.RESOURCE,
+        update_mode: UpdateMode = UpdateMode.TRANSACTIONAL,
+        update_workers: int = 16,
+        write_workers: int = 8,
+        normalizer: DocumentNormalizer = None,
+        batch_sizer: AdaptiveBatchSizer = None,
+        capacity_governor: CapacityGovernor = None,
+        retry_policy: RetryPolicy = None,
+        endpoint_url: str = None,
+    ):
         self._batch_size = batch_size
+        self._batch_sizer = batch_sizer
+        self._capacity_governor = capacity_governor
+        self._retry_policy = retry_policy or RetryPolicy(
+            max_attempts=3, base_delay=0.2, max_delay=2.0
+        )
+        self._scan_segments = scan_segments
+        self._scan_workers = scan_workers or scan_segments
+        self._read_mode = read_mode
+        self._update_mode = update_mode
+        self._update_workers = update_workers
+        self._write_workers = write_workers
+        self._normalizer = normalizer or DocumentNormalizer()
+        self._serializer = TypeSerializer()
+        self._deserializer = TypeDeserializer()
+        self._compiled_expressions = OrderedDict()
+        self._endpoint_url = endpoint_url
 
         self._client_connector = None
         self._resource_connector = None
+        self._streams_connector = None
+        self._scan_executor = None
+        self._update_executor = None
+        self._write_executor = None
+        self._thread_local = threading.local()
         self._config = Config(retries={"total_max_attempts": 3, "mode": "legacy"})
         self._last_document = None
         self._last_evaluated_key = None
+        self._segment_keys = {}
+        self._exhausted_segments = set()
 
     @property
     def client_connector(self) -> BaseClient:
@@ -39,7 +161,9 @@ class DynamoDbClient(GenericClient):
         """
 
         if not self._client_connector:
-            self._client_connector = client("dynamodb", config=self._config)
+            self._client_connector = client(
+                "dynamodb", config=self._config, endpoint_url=self._endpoint_url
+            )
 
         return self._client_connector
 
@@ -51,16 +175,107 @@ class DynamoDbClient(GenericClient):
         """
 
         if not self._resource_connector:
-            self._resource_connector = resource("dynamodb", config=self._config)
+            self._resource_connector = resource(
+                "dynamodb", config=self._config, endpoint_url=self._endpoint_url
+            )
 
         return self._resource_connector
 
+    @property
+    def streams_connector(self) -> BaseClient:
+        """Creates a DynamoDB Streams client connection.
+
+        Returns: instance that represents streams client connection
+        """
+
+        if not self._streams_connector:
+            self._streams_connector = client(
+                "dynamodbstreams", config=self._config, endpoint_url=self._endpoint_url
+            )
+
+        return self._streams_connector
+
+    @property
+    def scan_executor(self) -> ThreadPoolExecutor:
+        """Creates a thread pool that reads scan segments in parallel.
+
+        Returns: thread pool executor instance
+        """
+
+        if not self._scan_executor:
+            self._scan_executor = ThreadPoolExecutor(
+                max_workers=self._scan_workers, thread_name_prefix="dynamodb-scan"
+            )
+
+        return self._scan_executor
+
+    @property
+    def update_executor(self) -> ThreadPoolExecutor:
+        """Creates a thread pool that sends updates in concurrent update mode.
+
+        Returns: thread pool executor instance
+        """
+
+        if not self._update_executor:
+            self._update_executor = ThreadPoolExecutor(
+                max_workers=self._update_workers, thread_name_prefix="dynamodb-update"
+            )
+
+        return self._update_executor
+
+    @property
+    def write_executor(self) -> ThreadPoolExecutor:
+        """Creates a thread pool that sends batch write chunks in parallel.
+
+        Returns: thread pool executor instance
+        """
+
+        if not self._write_executor:
+            self._write_executor = ThreadPoolExecutor(
+                max_workers=self._write_workers, thread_name_prefix="dynamodb-write"
+            )
+
+        return self._write_executor
+
+    @property
+    def batch_size(self) -> int:
+        """Returns the number of documents the next read should return."""
+
+        return self._batch_sizer.size if self._batch_sizer else self._batch_size
+
     @property
     def last_fetched_key(self) -> dict:
         """Returns last evaluated key"""
 
         return self._last_evaluated_key
 
+    @property
+    def segment_keys(self) -> Dict[int, Optional[dict]]:
+        """Returns last evaluated keys of the parallel scan segments"""
+
+        return {
+            segment: None if segment in self._exhausted_segments else self._segment_keys.get(segment)
+            for segment in range(self._scan_segments)
+        }
+
+    def set_segment_keys(
+        self, segment_keys: Dict[int, Optional[dict]], exhausted_segments: List[int] = None
+    ):
+        """Sets the last evaluated keys of parallel scan segments, e.g. when resuming from
+        checkpoints.
+
+        Args:
+            segment_keys: mapping of the segment number to its last evaluated key
+            exhausted_segments: list of segments that have been read completely
+
+        Returns: None
+        """
+
+        self._segment_keys = {
+            int(segment): key for segment, key in segment_keys.items() if key
+        }
+        self._exhausted_segments = set(exhausted_segments or [])
+
     def set_last_document(self, last_document: Union[dict, None]):
         """Sets data of the last document for pagination purposes.
 
@@ -78,69 +293,92 @@ class DynamoDbClient(GenericClient):
             self._last_evaluated_key = None
 
     def batch_write(
-        self, collection_name: str, documents: List[dict]
+        self, collection_name: str, documents: List[dict], load_mode: LoadMode = LoadMode.UPSERT
     ) -> WriteQueryResult:
         """Performs batch write operation by putting the passed in documents into the
-        database.
+        database. Documents are split into requests of at most 25 items and 16 MB, the
+        requests are sent in parallel and UnprocessedItems are resubmitted with backoff.
 
         Args:
             collection_name: name of the collection where write operation is performed
             documents: list of documents to be written
+            load_mode: ignored, PutRequest always replaces existing items
 
-        Returns: list of IDs of processed documents
+        Returns: WriteQueryResult instance with the written and the failed document ids
         """
 
-        inserted_document_ids = []
-        dynamodb_documents = self._prepare_batch_write_request(documents)
-
-        try:
-            response = self.client_connector.batch_write_item(
-                RequestItems={collection_name: dynamodb_documents}
+        # The latest version of a document wins, like it would in consecutive writes
+        documents = list({doc.get("id"): doc for doc in documents}.values())
+        chunks = self._chunk_write_requests(self._prepare_batch_write_request(documents))
+        futures = [
+            self.write_executor.submit(
+                self._write_chunk, collection_name=collection_name, write_requests=chunk
             )
+            for chunk in chunks
+        ]
 
-            unprocessed_ids = [
-                TypeDeserializer().deserialize(value=item["PutRequest"]["Item"]["id"])
-                for item in response.get(collection_name, [])
-            ]
+        written_ids, failed_ids = set(), set()
 
-            inserted_document_ids = [
-                doc.get("id")
-                for doc in documents
-                if doc.get("id") not in unprocessed_ids
-            ]
+        for future in futures:
+            chunk_written_ids, chunk_failed_ids = future.result()
+            written_ids.update(chunk_written_ids)
+            failed_ids.update(chunk_failed_ids)
 
-        except ClientError as exc:
-            logging.exception(
-                f"The following exception occurred "
-                f"when batch_write_item() was called on {collection_name} --> {exc}"
-            )
-
-        return WriteQueryResult(
-            inserted_document_ids=inserted_document_ids,
-            processed_count=len(inserted_document_ids),
-            processed_document_ids=inserted_document_ids
+        return self._compose_batch_write_result(
+            collection_name=collection_name,
+            documents=documents,
+            written_ids=written_ids,
+            failed_ids=failed_ids,
         )
 
-    def batch_update(self, collection_name: str, updates: List[dict]):
-        """A method that performs a batch update operation.
+    def batch_update(self, collection_name: str, updates: List[dict]) -> WriteQueryResult:
+        """A method that performs a batch update operation. Updates that failed with
+        retryable errors are reported rather than retried with long delays, so callers
+        can retry them in the background.
 
         Args:
             collection_name: name of the collection into which the documents will be written
             updates: list of dicts that contains key data and update field of the documents
 
-        Returns: None
+        Returns: WriteQueryResult instance with the updated and the failed document ids
         """
 
+        if self._update_mode == UpdateMode.CONCURRENT:
+            return self._concurrent_batch_update(
+                collection_name=collection_name, updates=updates
+            )
+
         # Batch updates in DynamoDB can be done by using transact_write_items()
         # transact_write_items() supports max 25 items in the batch, so many iterations may happen
 
         num_partitions = ceil(len(updates) / 25)
+        failed_document_ids = []
+        rejected_document_ids = []
 
         for i in range(num_partitions):
-            logging.info(f"Updating partition #{i+1} in collection={collection_name}")
-            self._partitioned_batch_update(
+            logging.debug(f"Updating partition #{i+1} in collection={collection_name}")
+            failed_ids, rejected = self._partitioned_batch_update(
                 collection_name=collection_name, updates=updates[25 * i : 25 * i + 25]
             )
+            failed_document_ids.extend(failed_ids)
+
+            if rejected:
+                rejected_document_ids.extend(failed_ids)
+
+        failed_ids = set(failed_document_ids)
+        updated_document_ids = [
+            update_data.get("id")
+            for update_data in updates
+            if update_data.get("id") not in failed_ids
+        ]
+
+        return WriteQueryResult(
+            inserted_document_ids=[],
+            processed_count=len(updated_document_ids),
+            processed_document_ids=updated_document_ids,
+            failed_document_ids=failed_document_ids,
+            rejected_document_ids=rejected_document_ids,
+        )
 
     def update(self, collection_name: str, update_data: dict):
         """A method that performs a update operation.
@@ -152,6 +390,11 @@ class DynamoDbClient(GenericClient):
         Returns: None
         """
 
+        self._governed_write(
+            self.client_connector.update_item,
+            **self._compose_update_item(collection_name=collection_name, update_data=update_data)
+        )
+
     @validate_arguments
     def find(
         self,
@@ -170,10 +413,43 @@ class DynamoDbClient(GenericClient):
         Returns: List of matched documents
         """
 
+        if self._read_mode == ReadMode.RAW:
+            request_params = self._compile_read_expressions(
+                queries=queries, query_index_name=query_index_name, find_all=find_all
+            )
+
+            if not query_index_name and self._scan_segments > 1:
+                return self._parallel_scan(
+                    collection_name=collection_name,
+                    filter_expression=None,
+                    find_all=find_all,
+                    request_params=request_params,
+                )
+
+            matched_docs = self._fetch_raw_document_batch(
+                collection_name=collection_name,
+                request_params=request_params,
+                query_index_name=query_index_name,
+            )
+
+            return ReadQueryResult(
+                has_more=self._last_evaluated_key is not None,
+                documents=matched_docs,
+                last_evaluated_key=self._last_evaluated_key,
+                normalized=True,
+            )
+
         merged_key_condition = self._merge_queries(
             queries, index_query=bool(query_index_name)
         )
 
+        if not query_index_name and self._scan_segments > 1:
+            return self._parallel_scan(
+                collection_name=collection_name,
+                filter_expression=merged_key_condition,
+                find_all=find_all,
+            )
+
         matched_docs = self._fetch_document_batch(
             collection_name=collection_name,
             key_or_filter_expression=merged_key_condition,
@@ -191,13 +467,23 @@ class DynamoDbClient(GenericClient):
         """find doc."""
 
         try:
-            doc_data = self.resource_connector.Table(collection_name).get_item(Key={"id": doc_id})
-            documents = [doc_data.get("Item")] if doc_data.get("Item") else []
+            if self._read_mode == ReadMode.RAW:
+                doc_data = self._governed_read(
+                    self.client_connector.get_item,
+                    TableName=collection_name, Key=self._serialize({"id": doc_id})
+                )
+                documents = self._read_items([doc_data["Item"]]) if doc_data.get("Item") else []
+            else:
+                doc_data = self._governed_read(
+                    self.resource_connector.Table(collection_name).get_item, Key={"id": doc_id}
+                )
+                documents = [doc_data.get("Item")] if doc_data.get("Item") else []
 
             return ReadQueryResult(
                 has_more=False,
                 documents=documents,
-                last_evaluated_key=None
+                last_evaluated_key=None,
+                normalized=self._read_mode == ReadMode.RAW,
             )
         except ClientError as exc:
             logging.exception(
@@ -205,6 +491,284 @@ class DynamoDbClient(GenericClient):
             )
             raise RetryableFetchingError from exc
 
+    def describe_size(
+        self, collection_name: str, index_name: str = None
+    ) -> Optional[CollectionSize]:
+        """Returns ItemCount and size of the table or of its global secondary index.
+        DynamoDB refreshes them about every six hours.
+
+        Args:
+            collection_name: name of the table
+            index_name: name of the global secondary index
+
+        Returns: CollectionSize instance or None if the table has no such index
+        """
+
+        table = self.client_connector.describe_table(TableName=collection_name)["Table"]
+
+        if index_name is None:
+            return CollectionSize(
+                item_count=table.get("ItemCount", 0), size_bytes=table.get("TableSizeBytes", 0)
+            )
+
+        for index in table.get("GlobalSecondaryIndexes", []):
+            if index["IndexName"] == index_name:
+                return CollectionSize(
+                    item_count=index.get("ItemCount", 0),
+                    size_bytes=index.get("IndexSizeBytes", 0),
+                )
+
+        return None
+
+    def stream_arn(self, collection_name: str) -> str:
+        """Returns the ARN of the latest stream of the table.
+
+        Args:
+            collection_name: name of the table
+
+        Returns: ARN of the stream
+
+        Raises: StreamNotEnabledError if the stream is disabled or has no new images
+        """
+
+        table = self.client_connector.describe_table(TableName=collection_name)["Table"]
+        stream_specification = table.get("StreamSpecification", {})
+
+        if not stream_specification.get("StreamEnabled"):
+            raise StreamNotEnabledError(f"Table {collection_name} has no stream enabled")
+        if stream_specification.get("StreamViewType") not in ("NEW_IMAGE", "NEW_AND_OLD_IMAGES"):
+            raise StreamNotEnabledError(
+                f"Stream of table {collection_name} should contain new images of the items"
+            )
+
+        return table["LatestStreamArn"]
+
+    def list_stream_shards(self, stream_arn: str) -> List[dict]:
+        """Lists all shards of the stream, open and closed ones.
+
+        Args:
+            stream_arn: ARN of the stream
+
+        Returns: List of shard descriptions with ShardId and ParentShardId
+        """
+
+        shards = []
+        request = {"StreamArn": stream_arn}
+
+        while True:
+            description = self.streams_connector.describe_stream(**request)["StreamDescription"]
+            shards.extend(description.get("Shards", []))
+
+            if not description.get("LastEvaluatedShardId"):
+                return shards
+
+            request["ExclusiveStartShardId"] = description["LastEvaluatedShardId"]
+
+    def get_shard_iterator(
+        self, stream_arn: str, shard_id: str, sequence_number: str = None
+    ) -> str:
+        """Returns an iterator positioned right after the sequence number, or at the
+        oldest record of the shard when no sequence number is given.
+
+        Args:
+            stream_arn: ARN of the stream
+            shard_id: id of the shard
+            sequence_number: sequence number of the last applied record
+
+        Returns: shard iterator
+        """
+
+        request = {"StreamArn": stream_arn, "ShardId": shard_id}
+
+        if sequence_number:
+            request.update(
+                ShardIteratorType="AFTER_SEQUENCE_NUMBER", SequenceNumber=sequence_number
+            )
+        else:
+            request["ShardIteratorType"] = "TRIM_HORIZON"
+
+        try:
+            return self.streams_connector.get_shard_iterator(**request)["ShardIterator"]
+        except ClientError as exc:
+            if exc.response.get("Error", {}).get("Code") == "TrimmedDataAccessException":
+                raise StreamRecordsTrimmedError(str(exc)) from exc
+
+            raise self._fetching_error(exc) from exc
+
+    def get_stream_records(self, shard_iterator: str) -> StreamReadResult:
+        """Reads the next records of a stream shard.
+
+        Args:
+            shard_iterator: iterator returned by get_shard_iterator() or the previous read
+
+        Returns: StreamReadResult instance
+        """
+
+        try:
+            response = self.streams_connector.get_records(
+                ShardIterator=shard_iterator, Limit=min(self.batch_size, 1000)
+            )
+        except ClientError as exc:
+            error_code = exc.response.get("Error", {}).get("Code")
+
+            if error_code == "ExpiredIteratorException":
+                raise ShardIteratorExpiredError(str(exc)) from exc
+            if error_code == "TrimmedDataAccessException":
+                raise StreamRecordsTrimmedError(str(exc)) from exc
+
+            raise self._fetching_error(exc) from exc
+
+        records = []
+
+        for record in response.get("Records", []):
+            change = record["dynamodb"]
+            records.append(
+                StreamRecord(
+                    event_name=record["eventName"],
+                    sequence_number=change["SequenceNumber"],
+                    keys=self._deserialize(change["Keys"]),
+                    document=self._read_items([change["NewImage"]])[0]
+                    if "NewImage" in change
+                    else None,
+                    old_document=self._read_items([change["OldImage"]])[0]
+                    if "OldImage" in change
+                    else None,
+                )
+            )
+
+        return StreamReadResult(
+            records=records,
+            next_iterator=response.get("NextShardIterator"),
+            normalized=self._read_mode == ReadMode.RAW,
+        )
+
+    def batch_get(self, collection_name: str, id_list: List[str]) -> ReadQueryResult:
+        """Reads documents by their IDs with BatchGetItem requests of up to 100 keys.
+        Like find_document(), documents are returned regardless of their migration
+        status.
+
+        Args:
+            collection_name: name of the collection
+            id_list: IDs of the documents
+
+        Returns: ReadQueryResult instance with the found documents
+        """
+
+        unique_ids = list(dict.fromkeys(id_list))
+        documents = []
+
+        for offset in range(0, len(unique_ids), BATCH_GET_MAX_KEYS):
+            documents.extend(
+                self._get_chunk(
+                    collection_name=collection_name,
+                    keys=[
+                        self._serialize({"id": doc_id})
+                        for doc_id in unique_ids[offset: offset + BATCH_GET_MAX_KEYS]
+                    ],
+                )
+            )
+
+        return ReadQueryResult(
+            has_more=False,
+            documents=documents,
+            last_evaluated_key=None,
+            normalized=self._read_mode == ReadMode.RAW,
+        )
+
+    @validate_arguments
+    def query_all(
+        self,
+        collection_name: str,
+        queries: List[FieldQuery],
+        query_index_name: str,
+        find_all: bool = False,
+    ) -> ReadQueryResult:
+        """Reads all pages of an index query. The pagination state is kept locally
+        instead of in the client, so queries can run concurrently on several threads.
+
+        Args:
+            collection_name: Name of the collection where the query is performed
+            queries: list of FieldQuery objects that describe the fields and values of the queries
+            query_index_name: name of the collection index the query will happen in
+            find_all: if True documents are read regardless of their migration status
+
+        Returns: ReadQueryResult instance with all matched documents
+        """
+
+        request = {
+            "TableName": collection_name,
+            "IndexName": query_index_name,
+            "ScanIndexForward": True,
+            **compile_read_expressions(
+                queries, index_query=True, check_migration_status=not find_all
+            ),
+        }
+        items = []
+
+        while True:
+            try:
+                query_response = self._governed_read(self.client_connector.query, **request)
+            except ClientError as exc:
+                logging.exception(f"Failed to query {collection_name} with {query_index_name}")
+                raise self._fetching_error(exc) from exc
+
+            items.extend(query_response["Items"])
+
+            if not query_response.get("LastEvaluatedKey"):
+                break
+
+            request["ExclusiveStartKey"] = query_response["LastEvaluatedKey"]
+
+        return ReadQueryResult(
+            has_more=False,
+            documents=self._read_items(items),
+            last_evaluated_key=None,
+            normalized=self._read_mode == ReadMode.RAW,
+        )
+
+    def _get_chunk(self, collection_name: str, keys: List[dict]) -> List[dict]:
+        """Sends a single BatchGetItem request and resubmits its UnprocessedKeys with
+        backoff until all items are read.
+
+        Args:
+            collection_name: name of the collection
+            keys: up to 100 keys in DynamoDB wire format
+
+        Returns: List of documents
+
+        Raises: ThrottlingError if keys are still unprocessed when the retry policy
+            gives up
+        """
+
+        items = []
+        attempt = 0
+
+        while keys:
+            attempt += 1
+
+            try:
+                response = self._governed_read(
+                    self.client_connector.batch_get_item,
+                    RequestItems={collection_name: {"Keys": keys}},
+                )
+            except ClientError as exc:
+                logging.exception(f"Failed to fetch {len(keys)} documents from {collection_name}")
+                raise self._fetching_error(exc) from exc
+
+            items.extend(response.get("Responses", {}).get(collection_name, []))
+            keys = response.get("UnprocessedKeys", {}).get(collection_name, {}).get("Keys", [])
+
+            if not keys:
+                break
+            if not self._retry_policy.should_retry(attempt, ErrorClass.THROTTLING):
+                raise ThrottlingError(
+                    f"{len(keys)} keys were left unprocessed in {collection_name}"
+                )
+
+            time.sleep(self._retry_policy.delay(attempt, ErrorClass.THROTTLING))
+
+        return self._read_items(items)
+
     def _fetch_document_batch(
         self, collection_name: str, key_or_filter_expression, query_index_name: str, find_all: bool = False
     ) -> List[dict]:
@@ -219,6 +783,7 @@ class DynamoDbClient(GenericClient):
         Returns: List of matched documents
         """
 
+        batch_size = self.batch_size
         fetched_documents = []
 
         fetched_documents.extend(
@@ -226,25 +791,25 @@ class DynamoDbClient(GenericClient):
                 collection_name=collection_name,
                 key_or_filter_expression=key_or_filter_expression,
                 query_index_name=query_index_name,
-                document_count=self._batch_size,
+                document_count=batch_size,
                 last_document_id_data=self._last_evaluated_key,
                 find_all=find_all
             )
         )
 
-        while len(fetched_documents) < self._batch_size and self._last_evaluated_key:
+        while len(fetched_documents) < batch_size and self._last_evaluated_key:
             fetched_documents.extend(
                 self._fetch_documents(
                     collection_name=collection_name,
                     key_or_filter_expression=key_or_filter_expression,
                     query_index_name=query_index_name,
                     last_document_id_data=self._last_evaluated_key,
-                    document_count=self._batch_size - len(fetched_documents),
+                    document_count=batch_size - len(fetched_documents),
                     find_all=find_all
                 )
             )
 
-            logging.info(f"Accumulated number of documents is {len(fetched_documents)}")
+            logging.debug(f"Accumulated number of documents is {len(fetched_documents)}")
 
         return fetched_documents
 
@@ -282,7 +847,8 @@ class DynamoDbClient(GenericClient):
 
         try:
             if query_index_name:
-                query_response = self.resource_connector.Table(collection_name).query(
+                query_response = self._governed_read(
+                    self.resource_connector.Table(collection_name).query,
                     IndexName=query_index_name,
                     KeyConditionExpression=key_or_filter_expression,
                     **common_query_settings,
@@ -296,24 +862,401 @@ class DynamoDbClient(GenericClient):
                     filter_expression &= fe
                     common_query_settings.pop("FilterExpression")
 
-                query_response = self.resource_connector.Table(collection_name).scan(
+                query_response = self._governed_read(
+                    self.resource_connector.Table(collection_name).scan,
                     FilterExpression=filter_expression, **common_query_settings
                 )
         except ClientError as exc:
             logging.exception(
                 f"Failed to fetch new batch. LastEvaluatedKey={self._last_evaluated_key}"
             )
-            raise RetryableFetchingError from exc
+            raise self._fetching_error(exc) from exc
 
         self._last_evaluated_key = query_response.get("LastEvaluatedKey")
-        logging.info(f"TEST::lek={self._last_evaluated_key}")
 
-        logging.info(
+        logging.debug(
             f"Fetched {len(query_response['Items'])} from collection {collection_name}"
         )
 
         return query_response["Items"]
 
+    def _compile_read_expressions(
+        self, queries: List[FieldQuery], query_index_name: str, find_all: bool
+    ) -> dict:
+        """Returns Query/Scan expression strings and attribute placeholders of the queries.
+        Compilation results are cached, so every document configuration is compiled once.
+
+        Args:
+            queries: list of FieldQuery objects that describe the fields and values of the queries
+            query_index_name: name of the collection index the query will happen in
+            find_all: if True documents are read regardless of their migration status
+
+        Returns: dictionary of Query/Scan request parameters
+        """
+
+        cache_key = (
+            query_index_name,
+            find_all,
+            tuple((q.field_name, q.operation.value, repr(q.value)) for q in queries),
+        )
+        request_params = self._compiled_expressions.get(cache_key)
+
+        if request_params is None:
+            request_params = compile_read_expressions(
+                queries,
+                index_query=bool(query_index_name),
+                check_migration_status=not find_all,
+            )
+            self._compiled_expressions[cache_key] = request_params
+
+            if len(self._compiled_expressions) > COMPILED_EXPRESSIONS_CACHE_SIZE:
+                self._compiled_expressions.popitem(last=False)
+        else:
+            self._compiled_expressions.move_to_end(cache_key)
+
+        return request_params
+
+    def _fetch_raw_document_batch(
+        self, collection_name: str, request_params: dict, query_index_name: str
+    ) -> List[dict]:
+        """Runs iterations of low-level queries in the database, until the configured
+        number of documents (batch_size) is not read.
+
+        Args:
+            collection_name: Name of the collection where the query is performed
+            request_params: compiled expressions of the request
+            query_index_name: name of the collection index the query will happen in
+
+        Returns: List of translated documents
+        """
+
+        batch_size = self.batch_size
+        fetched_documents = self._fetch_raw_documents(
+            collection_name=collection_name,
+            request_params=request_params,
+            query_index_name=query_index_name,
+            document_count=batch_size,
+        )
+
+        while len(fetched_documents) < batch_size and self._last_evaluated_key:
+            fetched_documents.extend(
+                self._fetch_raw_documents(
+                    collection_name=collection_name,
+                    request_params=request_params,
+                    query_index_name=query_index_name,
+                    document_count=batch_size - len(fetched_documents),
+                )
+            )
+
+        return fetched_documents
+
+    def _fetch_raw_documents(
+        self,
+        collection_name: str,
+        request_params: dict,
+        query_index_name: str,
+        document_count: int,
+    ) -> List[dict]:
+        """Runs a single low-level Query or Scan request and translates the returned
+        items straight into destination documents.
+
+        Args:
+            collection_name: Name of the collection where the query is performed
+            request_params: compiled expressions of the request
+            query_index_name: name of the collection index the query will happen in
+            document_count: number of documents to read in this iteration
+
+        Returns: List of translated documents
+        """
+
+        request = {"TableName": collection_name, "Limit": document_count, **request_params}
+
+        if self._last_evaluated_key:
+            request["ExclusiveStartKey"] = self._serialize(self._last_evaluated_key)
+
+        try:
+            if query_index_name:
+                query_response = self._governed_read(
+                    self.client_connector.query,
+                    IndexName=query_index_name, ScanIndexForward=True, **request
+                )
+            else:
+                query_response = self._governed_read(self.client_connector.scan, **request)
+        except ClientError as exc:
+            logging.exception(
+                f"Failed to fetch new batch. LastEvaluatedKey={self._last_evaluated_key}"
+            )
+            raise self._fetching_error(exc) from exc
+
+        next_key = query_response.get("LastEvaluatedKey")
+        self._last_evaluated_key = self._deserialize(next_key) if next_key else None
+
+        logging.debug(
+            f"Fetched {len(query_response['Items'])} from collection {collection_name}"
+        )
+
+        return self._read_items(query_response["Items"])
+
+    def _read_items(self, items: List[dict]) -> List[dict]:
+        """Converts items returned by the low-level client into documents. Raw reads
+        translate them into destination documents, other reads deserialize them into the
+        same types the resource layer returns.
+
+        Args:
+            items: items in DynamoDB wire format
+
+        Returns: List of documents
+        """
+
+        if self._read_mode == ReadMode.RAW:
+            translate_item = self._normalizer.translate_item
+            return [translate_item(item) for item in items]
+
+        return [self._deserialize(item) for item in items]
+
+    def _serialize(self, data: dict) -> dict:
+        """Serializes plain key data into DynamoDB typed format."""
+
+        return {k: self._serializer.serialize(v) for k, v in data.items()}
+
+    def _deserialize(self, item: dict) -> dict:
+        """Deserializes DynamoDB typed item into plain Python types."""
+
+        return {k: self._deserializer.deserialize(v) for k, v in item.items()}
+
+    def _parallel_scan(
+        self,
+        collection_name: str,
+        filter_expression,
+        find_all: bool = False,
+        request_params: dict = None,
+    ) -> ReadQueryResult:
+        """Reads the next batch of documents by scanning all unfinished segments of the
+        collection concurrently. Every segment keeps its own LastEvaluatedKey.
+
+        Args:
+            collection_name: Name of the collection where the scan is performed
+            filter_expression: DynamoDb-formatted Filter expression
+            find_all: if True documents are read regardless of their migration status
+            request_params: compiled expressions, given when the low-level client is used
+
+        Returns: ReadQueryResult instance with the keys of the segments read
+        """
+
+        if not find_all and request_params is None:
+            migration_filter = Attr("is_migrated").ne(True)
+            filter_expression = (
+                filter_expression & migration_filter
+                if filter_expression is not None
+                else migration_filter
+            )
+
+        previous_keys = dict(self._segment_keys)
+        previous_exhausted = set(self._exhausted_segments)
+
+        batch_size = self.batch_size
+        fetched_documents = []
+        segment_keys = {}
+        pending_segments = self._pending_segments
+
+        try:
+            while pending_segments and len(fetched_documents) < batch_size:
+                page_size = ceil(
+                    (batch_size - len(fetched_documents)) / len(pending_segments)
+                )
+                futures = {
+                    segment: self.scan_executor.submit(
+                        self._scan_segment,
+                        collection_name=collection_name,
+                        filter_expression=filter_expression,
+                        segment=segment,
+                        document_count=page_size,
+                        request_params=request_params,
+                    )
+                    for segment in pending_segments
+                }
+
+                for segment, future in futures.items():
+                    items, last_evaluated_key = future.result()
+
+                    fetched_documents.extend(items)
+                    segment_keys[segment] = last_evaluated_key
+
+                    if last_evaluated_key:
+                        self._segment_keys[segment] = last_evaluated_key
+                    else:
+                        self._exhausted_segments.add(segment)
+
+                pending_segments = self._pending_segments
+        except RetryableFetchingError:
+            # Pages read in this call are discarded, so segments must not move forward
+            self._segment_keys = previous_keys
+            self._exhausted_segments = previous_exhausted
+            raise
+
+        logging.debug(
+            f"Fetched {len(fetched_documents)} from collection {collection_name} "
+            f"with {self._scan_segments - len(pending_segments)}/{self._scan_segments} "
+            f"segments finished"
+        )
+
+        return ReadQueryResult(
+            has_more=bool(pending_segments),
+            documents=fetched_documents,
+            last_evaluated_key=None,
+            segment_keys=segment_keys,
+            normalized=request_params is not None,
+        )
+
+    @property
+    def _pending_segments(self) -> List[int]:
+        """Returns the list of scan segments that have not been read completely."""
+
+        return [
+            segment
+            for segment in range(self._scan_segments)
+            if segment not in self._exhausted_segments
+        ]
+
+    def _scan_segment(
+        self,
+        collection_name: str,
+        filter_expression,
+        segment: int,
+        document_count: int,
+        request_params: dict = None,
+    ) -> Tuple[List[dict], Optional[dict]]:
+        """Reads a single page of one scan segment. Runs inside the scan thread pool.
+
+        Args:
+            collection_name: Name of the collection where the scan is performed
+            filter_expression: DynamoDb-formatted Filter expression
+            segment: number of the segment to read
+            document_count: number of documents to read in this iteration
+            request_params: compiled expressions, given when the low-level client is used
+
+        Returns: tuple of the read documents and the LastEvaluatedKey of the segment
+        """
+
+        scan_settings = {
+            "Segment": segment,
+            "TotalSegments": self._scan_segments,
+            "Limit": document_count,
+        }
+        last_evaluated_key = self._segment_keys.get(segment)
+
+        try:
+            if request_params is not None:
+                if last_evaluated_key:
+                    scan_settings["ExclusiveStartKey"] = self._serialize(last_evaluated_key)
+
+                scan_response = self._governed_read(
+                    self.client_connector.scan,
+                    TableName=collection_name, **scan_settings, **request_params
+                )
+                next_key = scan_response.get("LastEvaluatedKey")
+
+                return (
+                    self._read_items(scan_response["Items"]),
+                    self._deserialize(next_key) if next_key else None,
+                )
+
+            if last_evaluated_key:
+                scan_settings["ExclusiveStartKey"] = last_evaluated_key
+            if filter_expression is not None:
+                scan_settings["FilterExpression"] = filter_expression
+
+            scan_response = self._governed_read(
+                self._thread_resource_connector.Table(collection_name).scan,
+                **scan_settings
+            )
+        except ClientError as exc:
+            logging.exception(
+                f"Failed to scan segment #{segment} of {collection_name}. "
+                f"LastEvaluatedKey={last_evaluated_key}"
+            )
+            raise self._fetching_error(exc) from exc
+
+        return scan_response["Items"], scan_response.get("LastEvaluatedKey")
+
+    def _governed_read(self, request: Callable, **kwargs) -> dict:
+        """Sends a read request within the read capacity budget. Duration of the request
+        is fed to the adaptive batch sizer.
+
+        Args:
+            request: client or table method that sends the request
+            **kwargs: request parameters
+
+        Returns: response of the request
+        """
+
+        if self._capacity_governor:
+            self._capacity_governor.acquire_read()
+            kwargs["ReturnConsumedCapacity"] = "TOTAL"
+
+        started_at = time.perf_counter()
+        response = request(**kwargs)
+
+        if self._batch_sizer:
+            self._batch_sizer.record(latency=time.perf_counter() - started_at)
+        if self._capacity_governor:
+            self._capacity_governor.charge_read(response.get("ConsumedCapacity"))
+
+        return response
+
+    def _governed_write(self, request: Callable, **kwargs) -> dict:
+        """Sends a write request within the write capacity budget.
+
+        Args:
+            request: client method that sends the request
+            **kwargs: request parameters
+
+        Returns: response of the request
+        """
+
+        if not self._capacity_governor:
+            return request(**kwargs)
+
+        self._capacity_governor.acquire_write()
+        response = request(ReturnConsumedCapacity="TOTAL", **kwargs)
+        self._capacity_governor.charge_write(response.get("ConsumedCapacity"))
+
+        return response
+
+    def _fetching_error(self, exc: ClientError) -> RetryableFetchingError:
+        """Classifies a failed read request. Throttled requests shrink the batch size.
+
+        Args:
+            exc: exception raised by the read request
+
+        Returns: ThrottlingError or RetryableFetchingError instance
+        """
+
+        if classify_error(exc) == ErrorClass.THROTTLING:
+            if self._batch_sizer:
+                self._batch_sizer.record_throttling()
+
+            return ThrottlingError(str(exc))
+
+        return RetryableFetchingError(str(exc))
+
+    @property
+    def _thread_resource_connector(self) -> ServiceResource:
+        """boto3 resources are not thread safe, so each scan thread creates its own.
+
+        Returns: instance that represents resource connection of the current thread
+        """
+
+        resource_connector = getattr(self._thread_local, "resource_connector", None)
+
+        if not resource_connector:
+            resource_connector = Session().resource(
+                "dynamodb", config=self._config, endpoint_url=self._endpoint_url
+            )
+            self._thread_local.resource_connector = resource_connector
+
+        return resource_connector
+
     def _prepare_batch_write_request(self, documents: List[dict]) -> List[dict]:
         """Converts the list of documents into a DynamoDB-friendly typed format.
 
@@ -329,14 +1272,136 @@ class DynamoDbClient(GenericClient):
             dynamodb_document = {"PutRequest": {"Item": {}}}
 
             for k, v in doc.items():
-                dynamodb_document["PutRequest"]["Item"][k] = TypeSerializer().serialize(
-                    value=v
+                dynamodb_document["PutRequest"]["Item"][k] = self._serializer.serialize(
+                    value=_floats_to_decimals(v)
                 )
 
             converted_documents.append(dynamodb_document)
 
         return converted_documents
 
+    def _chunk_write_requests(self, write_requests: List[dict]) -> List[List[dict]]:
+        """Splits write requests into BatchWriteItem-sized chunks. A chunk holds at most
+        25 items and 16 MB.
+
+        Args:
+            write_requests: list of PutRequest items
+
+        Returns: list of chunks
+        """
+
+        chunks = []
+        chunk, chunk_bytes = [], 0
+
+        for write_request in write_requests:
+            item_bytes = _estimate_item_size(write_request["PutRequest"]["Item"])
+
+            if chunk and (
+                len(chunk) >= BATCH_WRITE_MAX_ITEMS
+                or chunk_bytes + item_bytes > BATCH_WRITE_MAX_BYTES
+            ):
+                chunks.append(chunk)
+                chunk, chunk_bytes = [], 0
+
+            chunk.append(write_request)
+            chunk_bytes += item_bytes
+
+        if chunk:
+            chunks.append(chunk)
+
+        return chunks
+
+    def _write_chunk(
+        self, collection_name: str, write_requests: List[dict]
+    ) -> Tuple[List[str], List[str]]:
+        """Sends a single BatchWriteItem request and resubmits its UnprocessedItems with
+        backoff until they are written or the retry policy gives up. Runs inside the
+        write thread pool.
+
+        Args:
+            collection_name: name of the collection where write operation is performed
+            write_requests: chunk of PutRequest items
+
+        Returns: tuple of the written and the failed document ids
+        """
+
+        written_ids = []
+        attempt = 0
+
+        while write_requests:
+            pending_ids = [self._item_id(req["PutRequest"]["Item"]) for req in write_requests]
+            attempt += 1
+
+            try:
+                response = self._governed_write(
+                    self.client_connector.batch_write_item,
+                    RequestItems={collection_name: write_requests},
+                )
+            except (BotoCoreError, ClientError) as exc:
+                error_class = classify_error(exc)
+
+                if not self._retry_policy.should_retry(attempt, error_class):
+                    logging.exception(
+                        f"The following exception occurred "
+                        f"when batch_write_item() was called on {collection_name} --> {exc}"
+                    )
+                    return written_ids, pending_ids
+
+                time.sleep(self._retry_policy.delay(attempt, error_class))
+                continue
+
+            unprocessed = response.get("UnprocessedItems", {}).get(collection_name, [])
+            unprocessed_ids = {self._item_id(req["PutRequest"]["Item"]) for req in unprocessed}
+            written_ids.extend(doc_id for doc_id in pending_ids if doc_id not in unprocessed_ids)
+            write_requests = unprocessed
+
+            if not unprocessed:
+                break
+            if not self._retry_policy.should_retry(attempt, ErrorClass.THROTTLING):
+                logging.info(
+                    f"{len(unprocessed)} items were left unprocessed in {collection_name}"
+                )
+                return written_ids, list(unprocessed_ids)
+
+            time.sleep(self._retry_policy.delay(attempt, ErrorClass.THROTTLING))
+
+        return written_ids, []
+
+    def _compose_batch_write_result(
+        self, collection_name: str, documents: List[dict], written_ids: set, failed_ids: set
+    ) -> WriteQueryResult:
+        """Composes the write result in the order of the given documents.
+
+        Args:
+            collection_name: name of the collection where write operation is performed
+            documents: list of documents that were written
+            written_ids: ids of the documents that landed in the database
+            failed_ids: ids of the documents that could not be written
+
+        Returns: WriteQueryResult instance
+        """
+
+        inserted_document_ids = [
+            doc.get("id") for doc in documents if doc.get("id") in written_ids
+        ]
+
+        logging.debug(
+            f"Totally processed {len(inserted_document_ids)} documents into collection "
+            f"{collection_name}, {len(failed_ids)} failed"
+        )
+
+        return WriteQueryResult(
+            inserted_document_ids=inserted_document_ids,
+            processed_count=len(inserted_document_ids),
+            processed_document_ids=inserted_document_ids,
+            failed_document_ids=[doc.get("id") for doc in documents if doc.get("id") in failed_ids],
+        )
+
+    def _item_id(self, item: dict) -> str:
+        """Returns deserialized id of an item in DynamoDB wire format."""
+
+        return self._deserializer.deserialize(item["id"])
+
     def _merge_queries(self, queries: List[FieldQuery], index_query: bool):
         """Merges all queries from the query list.
 
@@ -346,15 +1411,8 @@ class DynamoDbClient(GenericClient):
 
         Returns: Dynamodb query object
         """
-        merged_query = None
 
-        for q in queries:
-            if not merged_query:
-                merged_query = q.export_query(index_query=index_query)
-            else:
-                merged_query &= q.export_query(index_query=index_query)
-
-        return merged_query
+        return merge_queries(queries, index_query=index_query)
 
     def _extract_key_data(self, data_dict: dict) -> dict:
         """Extract key data and serializes to make it DynamoDB-specific.
@@ -396,14 +1454,14 @@ class DynamoDbClient(GenericClient):
         update_expression = update_expression.rstrip(",")
         return update_expression, expression_attr_names, expression_attr_values
 
-    def _partitioned_batch_update(self, collection_name: str, updates: List[dict]):
-        """A method that performs a batch update operation on a limited 25 items.
+    def _compose_transact_items(self, collection_name: str, updates: List[dict]) -> List[dict]:
+        """Composes transact_write_items() payload for the given updates.
 
         Args:
             collection_name: name of the collection into which the documents will be written
             updates: list of dicts that contains key data and update field of the documents
 
-        Returns: None
+        Returns: list of transaction items
         """
 
         transact_items = []
@@ -412,6 +1470,8 @@ class DynamoDbClient(GenericClient):
             transact_item = {"Update": {"Key": {}, "TableName": collection_name}}
             transact_item["Update"]["Key"] = self._extract_key_data(update_data)
 
+            # Callers read the ids of the updates after the transaction
+            update_data = dict(update_data)
             update_data.pop("id")
 
             (
@@ -426,23 +1486,134 @@ class DynamoDbClient(GenericClient):
 
             transact_items.append(transact_item)
 
+        return transact_items
+
+    def _compose_update_item(self, collection_name: str, update_data: dict) -> dict:
+        """Composes update_item() payload for the given update.
+
+        Args:
+            collection_name: name of the collection into which the document will be written
+            update_data: dict that contains key data and update field of the document
+
+        Returns: update_item() keyword arguments
+        """
+
+        update_data = dict(update_data)
+        key_data = self._extract_key_data(update_data)
+        update_data.pop("id")
+
+        (
+            update_expr,
+            expr_attr_names,
+            expr_attr_values,
+        ) = self._generate_data_for_transact_update(data_dict=update_data)
+
+        return {
+            "TableName": collection_name,
+            "Key": key_data,
+            "UpdateExpression": update_expr,
+            "ExpressionAttributeNames": expr_attr_names,
+            "ExpressionAttributeValues": expr_attr_values,
+        }
+
+    def _concurrent_batch_update(
+        self, collection_name: str, updates: List[dict]
+    ) -> WriteQueryResult:
+        """Sends one UpdateItem per document from the update thread pool. Marks have no
+        cross-item atomicity requirement, so every item is retried on its own.
+
+        Args:
+            collection_name: name of the collection into which the documents will be written
+            updates: list of dicts that contains key data and update field of the documents
+
+        Returns: WriteQueryResult instance with the updated and the failed document ids
+        """
+
+        futures = {
+            update_data.get("id"): self.update_executor.submit(
+                self._update_with_retries,
+                collection_name=collection_name,
+                update_data=update_data,
+            )
+            for update_data in updates
+        }
+
+        errors = {doc_id: future.result() for doc_id, future in futures.items()}
+        updated_document_ids = [doc_id for doc_id, error in errors.items() if error is None]
+        failed_document_ids = [doc_id for doc_id, error in errors.items() if error is not None]
+        rejected_document_ids = [
+            doc_id for doc_id, error in errors.items() if error == ErrorClass.FATAL
+        ]
+
+        if failed_document_ids:
+            logging.info(
+                f"Failed to update {len(failed_document_ids)} documents "
+                f"in collection={collection_name} --> {failed_document_ids}"
+            )
+
+        return WriteQueryResult(
+            inserted_document_ids=[],
+            processed_count=len(updated_document_ids),
+            processed_document_ids=updated_document_ids,
+            failed_document_ids=failed_document_ids,
+            rejected_document_ids=rejected_document_ids,
+        )
+
+    def _update_with_retries(
+        self, collection_name: str, update_data: dict
+    ) -> Optional[ErrorClass]:
+        """Updates a single document, retrying according to the retry policy.
+
+        Args:
+            collection_name: name of the collection into which the document will be written
+            update_data: dict that contains key data and update field of the document
+
+        Returns: None if the document was updated, otherwise the class of the last error
+        """
+
+        payload = self._compose_update_item(
+            collection_name=collection_name, update_data=update_data
+        )
+
         try:
-            self.client_connector.transact_write_items(TransactItems=transact_items)
-        except ClientError as exc:
-            if exc.response["Error"]["Code"] != "ValidationError":
-                i = 0
+            retry_call(
+                partial(self._governed_write, self.client_connector.update_item, **payload),
+                policy=self._retry_policy,
+                description=f"Update of id={update_data.get('id')}",
+            )
+        except (BotoCoreError, ClientError) as exc:
+            return classify_error(exc)
 
-                while i < 3:
-                    i += 1
-                    logging.info(f"Batch update attempt #{i} started...")
+        return None
 
-                    time.sleep(i * 60)
+    def _partitioned_batch_update(
+        self, collection_name: str, updates: List[dict]
+    ) -> Tuple[List[str], bool]:
+        """A method that performs a batch update operation on a limited 25 items.
 
-                    try:
-                        self.client_connector.transact_write_items(TransactItems=transact_items)
-                        return
-                    except ClientError:
-                        logging.info(f"Batch update attempt #{i} failed...")
-                        continue
+        Args:
+            collection_name: name of the collection into which the documents will be written
+            updates: list of dicts that contains key data and update field of the documents
+
+        Returns: list of document ids of a failed transaction and whether the transaction
+            was rejected with a non-retryable error
+        """
 
+        document_ids = [update_data.get("id") for update_data in updates]
+        transact_items = self._compose_transact_items(
+            collection_name=collection_name, updates=updates
+        )
+
+        try:
+            self._governed_write(
+                self.client_connector.transact_write_items, TransactItems=transact_items
+            )
+        except (BotoCoreError, ClientError) as exc:
+            if classify_error(exc) == ErrorClass.FATAL:
                 logging.info(f"Failed to finish the following transaction --> {transact_items}")
+                return document_ids, True
+
+            logging.info(f"Batch update of {len(document_ids)} documents failed --> {exc}")
+            return document_ids, False
+
+        return [], False
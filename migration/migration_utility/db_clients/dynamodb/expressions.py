@@ -0,0 +1,87 @@
+from typing import List
+
+from boto3.dynamodb.conditions import Attr, ConditionExpressionBuilder
+from boto3.dynamodb.types import TypeSerializer
+
+from migration.migration_utility.db_clients.dynamodb.data_types import FieldQuery
+
+
+def merge_queries(queries: List[FieldQuery], index_query: bool):
+    """Merges all queries from the query list.
+
+    Args:
+        queries: List of FieldQuery instances
+        index_query: indicates whether the performed query is an index query or scan
+
+    Returns: Dynamodb query object
+    """
+
+    merged_query = None
+
+    for q in queries:
+        if merged_query is None:
+            merged_query = q.export_query(index_query=index_query)
+        else:
+            merged_query &= q.export_query(index_query=index_query)
+
+    return merged_query
+
+
+def compile_read_expressions(
+    queries: List[FieldQuery], index_query: bool, check_migration_status: bool = True
+) -> dict:
+    """Compiles queries into the expression strings and attribute placeholders accepted
+    by the low-level DynamoDB client Query and Scan calls.
+
+    Args:
+        queries: List of FieldQuery instances
+        index_query: indicates whether the performed query is an index query or scan
+        check_migration_status: if True only documents not marked as migrated are matched
+
+    Returns: dictionary of Query/Scan request parameters
+    """
+
+    # A single builder keeps placeholders unique across key and filter expressions
+    builder = ConditionExpressionBuilder()
+    serializer = TypeSerializer()
+
+    key_or_filter_expression = merge_queries(queries, index_query=index_query)
+    migration_filter = Attr("is_migrated").ne(True) if check_migration_status else None
+
+    request_params = {}
+    attribute_names = {}
+    attribute_values = {}
+
+    if index_query:
+        key_condition = builder.build_expression(
+            key_or_filter_expression, is_key_condition=True
+        )
+        request_params["KeyConditionExpression"] = key_condition.condition_expression
+        attribute_names.update(key_condition.attribute_name_placeholders)
+        attribute_values.update(key_condition.attribute_value_placeholders)
+
+        filter_expression = migration_filter
+    elif key_or_filter_expression is not None and migration_filter is not None:
+        filter_expression = key_or_filter_expression & migration_filter
+    else:
+        filter_expression = (
+            key_or_filter_expression
+            if key_or_filter_expression is not None
+            else migration_filter
+        )
+
+    if filter_expression is not None:
+        filter_condition = builder.build_expression(filter_expression)
+        request_params["FilterExpression"] = filter_condition.condition_expression
+        attribute_names.update(filter_condition.attribute_name_placeholders)
+        attribute_values.update(filter_condition.attribute_value_placeholders)
+
+    if attribute_names:
+        request_params["ExpressionAttributeNames"] = attribute_names
+    if attribute_values:
+        request_params["ExpressionAttributeValues"] = {
+            placeholder: serializer.serialize(value)
+            for placeholder, value in attribute_values.items()
+        }
+
+    return request_params
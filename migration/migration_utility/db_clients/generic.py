@@ -1,7 +1,13 @@
 from abc import ABC, abstractmethod
-from typing import List, Union
+from typing import AsyncIterator, Dict, List, Optional, Union
 
-from migration_utility.data_types import FieldQuery, ReadQueryResult, WriteQueryResult
+from migration_utility.data_types import (
+    CollectionSize,
+    FieldQuery,
+    ReadQueryResult,
+    WriteQueryResult,
+)
+from migration_utility.enums import LoadMode
 
 
 class GenericClient(ABC):
@@ -36,7 +42,7 @@ class GenericClient(ABC):
 
     @abstractmethod
     def batch_write(
-        self, collection_name: str, documents: List[dict]
+        self, collection_name: str, documents: List[dict], load_mode: LoadMode = LoadMode.UPSERT
     ) -> WriteQueryResult:
         """Abstract method that is intended to perform batch write operation on the list
         of documents provided.
@@ -44,6 +50,7 @@ class GenericClient(ABC):
         Args:
             collection_name: name of the collection into which the documents will be written
             documents: list of documents that are going to be written into the collection
+            load_mode: whether documents are upserted or inserted into a fresh collection
 
         Returns: WriteQueryResult instance
         """
@@ -71,6 +78,19 @@ class GenericClient(ABC):
 
         raise NotImplementedError("Method should be overwritten")
 
+    @abstractmethod
+    def set_segment_keys(
+        self, segment_keys: Dict[int, Optional[dict]], exhausted_segments: List[int] = None
+    ):
+        """Sets the last evaluated keys of parallel scan segments.
+
+        Args:
+            segment_keys: mapping of the segment number to its last evaluated key
+            exhausted_segments: list of segments that have been read completely
+        """
+
+        raise NotImplementedError("Method should be overwritten")
+
     @abstractmethod
     def update(self, collection_name: str, update_data: dict):
         """Abstract method that is intended to perform a update operation.
@@ -118,3 +138,144 @@ class GenericClient(ABC):
         """
 
         raise NotImplementedError("Method should be overwritten")
+
+    def describe_size(
+        self, collection_name: str, index_name: str = None
+    ) -> Optional[CollectionSize]:
+        """Returns the size of the collection kept in the metadata of the database
+        without reading the documents.
+
+        Args:
+            collection_name: name of the collection
+            index_name: name of the index whose size is requested instead
+
+        Returns: CollectionSize instance or None if the database keeps no sizes
+        """
+
+        return None
+
+
+class AsyncGenericClient(ABC):
+    """Abstract class that defines asyncio-native interface for database clients."""
+
+    @abstractmethod
+    async def aconnect(self):
+        """Opens connections of the client.
+
+        Raises: NotImplementedError
+        """
+
+        raise NotImplementedError("Method should be overwritten")
+
+    @abstractmethod
+    async def aclose(self):
+        """Closes connections of the client.
+
+        Raises: NotImplementedError
+        """
+
+        raise NotImplementedError("Method should be overwritten")
+
+    @abstractmethod
+    async def abatch_write(
+        self, collection_name: str, documents: List[dict], load_mode: LoadMode = LoadMode.UPSERT
+    ) -> WriteQueryResult:
+        """Asynchronously performs batch write operation on the list of documents
+        provided.
+
+        Args:
+            collection_name: name of the collection into which the documents will be written
+            documents: list of documents that are going to be written into the collection
+            load_mode: whether documents are upserted or inserted into a fresh collection
+
+        Returns: WriteQueryResult instance
+        """
+
+        raise NotImplementedError("Method should be overwritten")
+
+    @abstractmethod
+    async def abatch_update(
+        self, collection_name: str, updates: List[dict]
+    ) -> Union[WriteQueryResult, None]:
+        """Asynchronously performs a batch update operation.
+
+        Args:
+            collection_name: name of the collection into which the documents will be written
+            updates: list of dicts that contain key data and update fields of the document
+
+        Returns: WriteQueryResult instance or None depending on the client
+        """
+
+        raise NotImplementedError("Method should be overwritten")
+
+    @abstractmethod
+    async def aupdate(self, collection_name: str, update_data: dict):
+        """Asynchronously performs a update operation.
+
+        Args:
+            collection_name: name of the collection into which the documents will be written
+            update_data: dict that contains key data and update field of the document
+        """
+
+        raise NotImplementedError("Method should be overwritten")
+
+    @abstractmethod
+    async def afind(
+        self,
+        collection_name: str,
+        queries: List[FieldQuery],
+        query_index_name: str = None,
+        find_all: bool = False,
+        last_evaluated_key: dict = None,
+    ) -> ReadQueryResult:
+        """Asynchronously reads the next batch of documents matching the queries.
+
+        Args:
+            collection_name: name of the collection to search for documents in
+            queries: queries to be performed
+            query_index_name: name of the collection index the query will happen in
+            find_all: if True documents are read regardless of their migration status
+            last_evaluated_key: key data the read is continued from
+
+        Returns: ReadQueryResult instance
+        """
+
+        raise NotImplementedError("Method should be overwritten")
+
+    @abstractmethod
+    async def afind_document(
+        self, collection_name: str, doc_id: str
+    ) -> Union[ReadQueryResult, dict, None]:
+        """Asynchronously finds one document that corresponds to the requested id.
+
+        Args:
+            collection_name: name of the collection
+            doc_id: id of the document
+
+        Returns: matched document data or None
+        """
+
+        raise NotImplementedError("Method should be overwritten")
+
+    @abstractmethod
+    def aiter_pages(
+        self,
+        collection_name: str,
+        queries: List[FieldQuery],
+        query_index_name: str = None,
+        find_all: bool = False,
+        last_evaluated_key: dict = None,
+    ) -> AsyncIterator[ReadQueryResult]:
+        """Iterates asynchronously over batches of documents matching the queries.
+
+        Args:
+            collection_name: name of the collection to search for documents in
+            queries: queries to be performed
+            query_index_name: name of the collection index the query will happen in
+            find_all: if True documents are read regardless of their migration status
+            last_evaluated_key: key data the read is continued from
+
+        Returns: async iterator of ReadQueryResult instances
+        """
+
+        raise NotImplementedError("Method should be overwritten")
@@ -0,0 +1,244 @@
+from typing import AsyncIterator, List, Union
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from migration.migration_utility import logging
+from migration.migration_utility.db_clients.generic import AsyncGenericClient
+from migration.migration_utility.db_clients.mongodb.mongodb_client import MongoDbClient
+from migration_utility.data_types import ReadQueryResult, WriteQueryResult
+from migration_utility.db_clients.mongodb.data_types import FieldQuery
+from migration_utility.enums import LoadMode
+from migration_utility.exceptions import InsertionWasCancelledError
+
+
+class AsyncMongoDbClient(MongoDbClient, AsyncGenericClient):
+    """MongoDB client class that performs operations with MongoDB on the asyncio event
+    loop.
+    """
+
+    def __init__(
+        self, batch_size: int, connection_string: str, database_name: str, ordered: bool = True
+    ):
+        super().__init__(
+            batch_size=batch_size,
+            connection_string=connection_string,
+            database_name=database_name,
+            ordered=ordered,
+        )
+
+        self._async_client_connector = None
+
+    @property
+    def async_client_connector(self):
+        """Returns the asynchronous MongoDB database connection opened by aconnect()."""
+
+        if not self._async_client_connector:
+            raise RuntimeError("aconnect() should be awaited before using the client")
+
+        return self._async_client_connector[self._database_name]
+
+    async def aconnect(self):
+        """Creates the asynchronous MongoDB client connection.
+
+        Returns: instance that represents database connection
+        """
+
+        if not self._async_client_connector:
+            self._async_client_connector = AsyncIOMotorClient(host=self._connection_string)
+
+        return self.async_client_connector
+
+    async def aclose(self):
+        """Closes the asynchronous MongoDB client connection."""
+
+        if self._async_client_connector:
+            self._async_client_connector.close()
+
+        self._async_client_connector = None
+
+    async def abatch_write(
+        self, collection_name: str, documents: List[dict], load_mode: LoadMode = LoadMode.UPSERT
+    ) -> WriteQueryResult:
+        """Performs batch write operation by putting the passed in documents into the
+        database.
+
+        Args:
+            collection_name: name of the collection where write operation is performed
+            documents: list of documents to be written
+            load_mode: whether documents are upserted or inserted into a fresh collection
+
+        Returns: WriteQueryResult instance
+        """
+
+        if load_mode == LoadMode.INSERT:
+            return await self._ainsert_bulk(collection_name=collection_name, documents=documents)
+
+        documents = self._inject_id_field(documents=documents)
+        bulk_list = self._compose_bulk_update_payload(documents=documents)
+
+        try:
+            logging.debug(f"Starting insertion...")
+
+            response = await self.async_client_connector[collection_name].bulk_write(
+                bulk_list, ordered=self._ordered
+            )
+        except BulkWriteError as exc:
+            self._cancel_insertion(exc=exc, documents=documents)
+
+        return self._compose_write_result(
+            response=response, collection_name=collection_name, documents=documents
+        )
+
+    async def _ainsert_bulk(
+        self, collection_name: str, documents: List[dict]
+    ) -> WriteQueryResult:
+        """Asynchronous version of _insert_bulk().
+
+        Args:
+            collection_name: name of the collection where write operation is performed
+            documents: list of documents to be written
+
+        Returns: WriteQueryResult instance
+        """
+
+        documents = self._inject_id_field(documents=documents)
+        bulk_list = self._compose_bulk_insert_payload(documents=documents)
+        duplicate_documents = []
+
+        try:
+            logging.debug(f"Starting insertion...")
+
+            await self.async_client_connector[collection_name].bulk_write(
+                bulk_list, ordered=False
+            )
+        except BulkWriteError as exc:
+            duplicate_documents, failed_documents = self._split_insert_errors(
+                exc=exc, documents=documents
+            )
+
+            if failed_documents:
+                self._cancel_insert_bulk(
+                    exc=exc, documents=documents, failed_documents=failed_documents
+                )
+
+        upsert_res = None
+
+        if duplicate_documents:
+            logging.info(
+                f"{len(duplicate_documents)} document(s) already exist in collection "
+                f"{collection_name}, falling back to upserts"
+            )
+
+            try:
+                upsert_res = await self.abatch_write(
+                    collection_name=collection_name, documents=duplicate_documents
+                )
+            except InsertionWasCancelledError as exc:
+                duplicate_ids = {doc["_id"] for doc in duplicate_documents}
+                raise InsertionWasCancelledError(
+                    cancelled_documents=exc.cancelled_documents,
+                    inserted_documents=[
+                        doc for doc in documents if doc["_id"] not in duplicate_ids
+                    ] + exc.inserted_documents,
+                    exception_details=exc.exception_details,
+                ) from exc
+
+        return self._compose_insert_result(
+            collection_name=collection_name,
+            documents=documents,
+            duplicate_documents=duplicate_documents,
+            upsert_res=upsert_res,
+        )
+
+    async def abatch_update(
+        self, collection_name: str, updates: List[dict]
+    ) -> Union[WriteQueryResult, None]:
+        """Implements batch update."""
+
+    async def aupdate(self, collection_name: str, update_data: dict):
+        """Updates a single document in the database.
+
+        Args:
+            collection_name: name of the collection
+            update_data: document data
+
+        Returns: None
+        """
+
+        key_data = {"_id": update_data.get("_id")}
+        update_data.pop("_id")
+
+        await self.async_client_connector[collection_name].update_one(
+            key_data, {"$set": update_data}, upsert=True
+        )
+
+    async def afind(
+        self,
+        collection_name: str,
+        queries: List[FieldQuery],
+        query_index_name: str = None,
+        find_all: bool = False,
+        last_evaluated_key: dict = None,
+    ) -> ReadQueryResult:
+        """MongoDB is not supported as a migration source."""
+
+        raise NotImplementedError("MongoDB is not supported as a migration source")
+
+    async def afind_document(self, collection_name: str, doc_id: str) -> Union[dict, None]:
+        """Finds one document that corresponds to the requested id.
+
+        Args:
+            collection_name: name of the collection
+            doc_id: id of the document
+
+        Returns: matched document or None
+        """
+
+        return await self.async_client_connector[collection_name].find_one({"_id": doc_id})
+
+    async def afind_ids(self, collection_name: str, id_list: List[str]) -> List[str]:
+        """Finds which of the given IDs exist in the collection.
+
+        Args:
+            collection_name: name of the collection
+            id_list: list of IDs to look for
+
+        Returns: list of existing IDs
+        """
+
+        cursor = self.async_client_connector[collection_name].find(
+            {"_id": {"$in": id_list}}, {"_id": 1}
+        )
+
+        return [doc["_id"] async for doc in cursor]
+
+    async def aupsert_ids(self, collection_name: str, id_list: List[str], fields: dict):
+        """Upserts one document per ID with the same fields.
+
+        Args:
+            collection_name: name of the collection
+            id_list: list of document IDs
+            fields: fields set on every document
+
+        Returns: None
+        """
+
+        if id_list:
+            await self.async_client_connector[collection_name].bulk_write(
+                [UpdateOne({"_id": doc_id}, {"$set": fields}, upsert=True) for doc_id in id_list],
+                ordered=False,
+            )
+
+    def aiter_pages(
+        self,
+        collection_name: str,
+        queries: List[FieldQuery],
+        query_index_name: str = None,
+        find_all: bool = False,
+        last_evaluated_key: dict = None,
+    ) -> AsyncIterator[ReadQueryResult]:
+        """MongoDB is not supported as a migration source."""
+
+        raise NotImplementedError("MongoDB is not supported as a migration source")
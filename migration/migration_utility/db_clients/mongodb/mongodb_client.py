@@ -1,22 +1,45 @@
-from copy import deepcopy
-from typing import List, Union
+import time
+from typing import Dict, Iterator, List, Optional, Union
 
-from migration_utility.data_types import ReadQueryResult, WriteQueryResult
+from migration_utility.data_types import BucketDigest, ReadQueryResult, WriteQueryResult
 from migration_utility.db_clients.generic import GenericClient
-from pymongo import MongoClient, UpdateOne
-from pymongo.errors import BulkWriteError
+from pymongo import InsertOne, MongoClient, ReplaceOne, UpdateOne
+from pymongo.results import BulkWriteResult
+from pymongo.errors import BulkWriteError, OperationFailure
 from migration.migration_utility import logging
+from migration.migration_utility.batch_sizing import AdaptiveBatchSizer
 from migration_utility.db_clients.mongodb.data_types import FieldQuery
+from migration_utility.enums import LoadMode
 from migration_utility.exceptions import InsertionWasCancelledError
+from migration.migration_utility.hashing import (
+    CHECKSUM_MODULUS,
+    DECIMAL_TAG,
+    DOUBLE_TAG,
+    EXACT_NUMBERS_DEPTH,
+)
+
+# Error code of MongoDB write errors caused by an already existing _id
+DUPLICATE_KEY_ERROR_CODE = 11000
+# Source fields that mark migrated documents and are not written into MongoDB
+MIGRATION_MARKER_FIELDS = ("is_migrated", "migrated_at")
 
 
 class MongoDbClient(GenericClient):
     """DynamoDB client class that ensure connectivity and operations with DynamoDB."""
 
-    def __init__(self, batch_size: int, connection_string: str, database_name: str):
+    def __init__(
+        self,
+        batch_size: int,
+        connection_string: str,
+        database_name: str,
+        batch_sizer: AdaptiveBatchSizer = None,
+        ordered: bool = True,
+    ):
         self._client_connector = None
         self._last_document = None
         self._batch_size = batch_size
+        self._batch_sizer = batch_sizer
+        self._ordered = ordered
         self._connection_string = connection_string
         self._database_name = database_name
 
@@ -41,11 +64,16 @@ class MongoDbClient(GenericClient):
     def set_last_document(self, last_document: dict):
         """setting."""
 
+    def set_segment_keys(
+        self, segment_keys: Dict[int, Optional[dict]], exhausted_segments: List[int] = None
+    ):
+        """MongoDB is not read with parallel scans."""
+
     def last_fetched_key(self):
         """last"""
 
     def batch_write(
-        self, collection_name: str, documents: List[dict]
+        self, collection_name: str, documents: List[dict], load_mode: LoadMode = LoadMode.UPSERT
     ) -> WriteQueryResult:
         """Performs batch write operation by putting the passed in documents into the
         database.
@@ -53,57 +81,108 @@ class MongoDbClient(GenericClient):
         Args:
             collection_name: name of the collection where write operation is performed
             documents: list of documents to be written
+            load_mode: whether documents are upserted or inserted into a fresh collection
 
         Returns: list of IDs of processed documents
         """
 
+        if self._batch_sizer:
+            return self._adaptive_batch_write(
+                collection_name=collection_name, documents=documents, load_mode=load_mode
+            )
+
+        return self._write_bulk(
+            collection_name=collection_name, documents=documents, load_mode=load_mode
+        )
+
+    def _write_bulk(
+        self, collection_name: str, documents: List[dict], load_mode: LoadMode = LoadMode.UPSERT
+    ) -> WriteQueryResult:
+        """Upserts the documents with a single bulk write.
+
+        Args:
+            collection_name: name of the collection where write operation is performed
+            documents: list of documents to be written
+            load_mode: whether documents are upserted or inserted into a fresh collection
+
+        Returns: WriteQueryResult instance
+        """
+
+        if load_mode == LoadMode.INSERT:
+            return self._insert_bulk(collection_name=collection_name, documents=documents)
+
         documents = self._inject_id_field(documents=documents)
         bulk_list = self._compose_bulk_update_payload(documents=documents)
 
         try:
-            logging.info(f"Starting insertion...")
+            logging.debug(f"Starting insertion...")
 
-            response = self.client_connector[collection_name].bulk_write(bulk_list)
+            response = self.client_connector[collection_name].bulk_write(
+                bulk_list, ordered=self._ordered
+            )
+        except BulkWriteError as exc:
+            self._cancel_insertion(exc=exc, documents=documents)
 
-            if not response.matched_count:
-                processed_count = response.upserted_count
-            elif response.matched_count == len(documents):
-                processed_count = response.matched_count
-            else:
-                processed_count = response.upserted_count + response.matched_count
+        return self._compose_write_result(
+            response=response, collection_name=collection_name, documents=documents
+        )
 
-            logging.info(f"Insertion successfully finished...")
-            logging.info(
-                f"matched_count = {response.matched_count}; upserted_count = {response.upserted_count}; "
-                f"modified_count = {response.modified_count}\n"
-                f"Totally processed {processed_count} documents into collection {collection_name}"
-            )
+    def _insert_bulk(self, collection_name: str, documents: List[dict]) -> WriteQueryResult:
+        """Inserts the documents with a single unordered bulk write. Inserts skip the
+        _id lookup of upserts, so they are faster on a fresh collection. Documents that
+        already exist fail with a duplicate key error and are upserted afterwards.
 
-        except BulkWriteError as exc:
-            if not exc.details.get("nMatched"):
-                processed_count = exc.details.get("nUpserted")
-            elif exc.details.get("nMatched") == len(documents):
-                processed_count = exc.details.get("nMatched")
-            else:
-                processed_count = exc.details.get("nUpserted") + exc.details.get("nMatched")
+        Args:
+            collection_name: name of the collection where write operation is performed
+            documents: list of documents to be written
+
+        Returns: WriteQueryResult instance
+        """
+
+        documents = self._inject_id_field(documents=documents)
+        bulk_list = self._compose_bulk_insert_payload(documents=documents)
+        duplicate_documents = []
+
+        try:
+            logging.debug(f"Starting insertion...")
 
-            logging.exception(
-                f"Insertion failed after inserting {processed_count} document(s)"
+            self.client_connector[collection_name].bulk_write(bulk_list, ordered=False)
+        except BulkWriteError as exc:
+            duplicate_documents, failed_documents = self._split_insert_errors(
+                exc=exc, documents=documents
             )
+
+            if failed_documents:
+                self._cancel_insert_bulk(
+                    exc=exc, documents=documents, failed_documents=failed_documents
+                )
+
+        upsert_res = None
+
+        if duplicate_documents:
             logging.info(
-                f"Canceling insertion of the remaining batch into DESTINATION. "
-                f"Canceled document IDs will be saved in the internal database"
+                f"{len(duplicate_documents)} document(s) already exist in collection "
+                f"{collection_name}, falling back to upserts"
             )
-            raise InsertionWasCancelledError(
-                cancelled_documents=documents[processed_count:],
-                inserted_documents=documents[:processed_count],
-                exception_details=exc.details,
-            ) from exc
-
-        return WriteQueryResult(
-            inserted_document_ids=list(response.upserted_ids.values()),
-            processed_count=processed_count,
-            processed_document_ids=[doc["_id"] for doc in documents[:processed_count]]
+            try:
+                upsert_res = self._write_bulk(
+                    collection_name=collection_name, documents=duplicate_documents
+                )
+            except InsertionWasCancelledError as exc:
+                duplicate_ids = {doc["_id"] for doc in duplicate_documents}
+                raise InsertionWasCancelledError(
+                    cancelled_documents=exc.cancelled_documents,
+                    inserted_documents=[
+                        doc for doc in documents if doc["_id"] not in duplicate_ids
+                    ] + exc.inserted_documents,
+                    exception_details=exc.exception_details,
+                ) from exc
+
+        return self._compose_insert_result(
+            collection_name=collection_name,
+            documents=documents,
+            duplicate_documents=duplicate_documents,
+            upsert_res=upsert_res,
         )
 
     def batch_update(
@@ -144,6 +223,513 @@ class MongoDbClient(GenericClient):
 
         return self.client_connector[collection_name].find_one({"_id": doc_id})
 
+    def find_ids(self, collection_name: str, id_list: List[str]) -> List[str]:
+        """Finds which of the given IDs exist in the collection.
+
+        Args:
+            collection_name: name of the collection
+            id_list: list of IDs to look for
+
+        Returns: list of existing IDs
+        """
+
+        return [
+            doc["_id"]
+            for doc in self.client_connector[collection_name].find(
+                {"_id": {"$in": id_list}}, {"_id": 1}
+            )
+        ]
+
+    def upsert_ids(self, collection_name: str, id_list: List[str], fields: dict):
+        """Upserts one document per ID with the same fields.
+
+        Args:
+            collection_name: name of the collection
+            id_list: list of document IDs
+            fields: fields set on every document
+
+        Returns: None
+        """
+
+        if id_list:
+            self.client_connector[collection_name].bulk_write(
+                [UpdateOne({"_id": doc_id}, {"$set": fields}, upsert=True) for doc_id in id_list],
+                ordered=False,
+            )
+
+    def delete_ids(self, collection_name: str, id_list: List[str]):
+        """Deletes documents with the given IDs.
+
+        Args:
+            collection_name: name of the collection
+            id_list: list of document IDs
+
+        Returns: None
+        """
+
+        if id_list:
+            self.client_connector[collection_name].delete_many({"_id": {"$in": id_list}})
+
+    def replace_documents(self, collection_name: str, documents: List[dict]):
+        """Replaces whole documents with a single unordered bulk, inserting missing
+        ones. Unlike upserts of batch_write(), fields absent from the new documents are
+        removed.
+
+        Args:
+            collection_name: name of the collection
+            documents: list of documents in the destination format
+
+        Returns: None
+        """
+
+        if not documents:
+            return
+
+        documents = self._inject_id_field(documents=documents)
+        self.client_connector[collection_name].bulk_write(
+            [
+                ReplaceOne(
+                    {"_id": doc["_id"]},
+                    self._project_document(doc, MIGRATION_MARKER_FIELDS),
+                    upsert=True,
+                )
+                for doc in documents
+            ],
+            ordered=False,
+        )
+
+    def id_bucket_digests(
+        self,
+        collection_name: str,
+        prefix: str,
+        excluded_fields: List[str],
+        checksums: bool = True,
+    ) -> Dict[str, BucketDigest]:
+        """Computes digests of the documents whose IDs start with the prefix, grouped by
+        the prefix one character longer, with a single aggregation on the server.
+
+        Args:
+            collection_name: name of the collection
+            prefix: common prefix of the IDs, empty for the whole collection
+            excluded_fields: top-level fields left out of the digests
+            checksums: if False only counts and sizes are computed
+
+        Returns: dict of BucketDigest instances keyed by the longer prefixes. IDs equal to
+            the prefix are keyed by themselves
+        """
+
+        fields = {
+            "$filter": {
+                "input": {"$objectToArray": "$$ROOT"},
+                "cond": {"$not": [{"$in": ["$$this.k", list(excluded_fields)]}]},
+            }
+        }
+        group = {
+            "_id": {"$substrCP": ["$_id", 0, len(prefix) + 1]},
+            "count": {"$sum": 1},
+            "size_bytes": {"$sum": {"$bsonSize": {"$arrayToObject": "$fields"}}},
+        }
+
+        if checksums:
+            # Same checksum as hashing.document_checksum(), {k, v} pairs are hashed
+            # one by one, so it does not depend on the order of the fields
+            group["checksum"] = {
+                "$sum": {
+                    "$mod": [
+                        {
+                            "$sum": {
+                                "$map": {
+                                    "input": "$fields",
+                                    "in": {
+                                        "$mod": [
+                                            _field_hash_expression("$$this"),
+                                            CHECKSUM_MODULUS,
+                                        ]
+                                    },
+                                }
+                            }
+                        },
+                        CHECKSUM_MODULUS,
+                    ]
+                }
+            }
+            # Same as hashing.inexact_checksum()
+            group["inexact_count"] = {
+                "$sum": {
+                    "$cond": [
+                        {
+                            "$anyElementTrue": [
+                                {
+                                    "$map": {
+                                        "input": "$fields",
+                                        "in": _exceeds_depth_expression("$$this.v"),
+                                    }
+                                }
+                            ]
+                        },
+                        1,
+                        0,
+                    ]
+                }
+            }
+
+        pipeline = [{"$project": {"fields": fields}}, {"$group": group}]
+
+        if prefix:
+            pipeline.insert(0, {"$match": self._id_bucket_filter(prefix)})
+
+        return {
+            bucket["_id"]: BucketDigest(
+                count=bucket["count"],
+                size_bytes=bucket["size_bytes"],
+                checksum=bucket.get("checksum"),
+                inexact_count=bucket.get("inexact_count", 0),
+            )
+            for bucket in self.client_connector[collection_name].aggregate(
+                pipeline, allowDiskUse=True
+            )
+        }
+
+    def iter_id_bucket(
+        self, collection_name: str, bucket: str, exact: bool = False, projection: dict = None
+    ) -> Iterator[dict]:
+        """Iterates over the documents whose IDs start with the bucket prefix, in the
+        order of their IDs.
+
+        Args:
+            collection_name: name of the collection
+            bucket: prefix of the IDs
+            exact: if True only the document whose ID equals the prefix is returned
+            projection: MongoDB projection of the returned documents
+
+        Returns: iterator of documents
+        """
+
+        return self.client_connector[collection_name].find(
+            {"_id": bucket} if exact else self._id_bucket_filter(bucket),
+            projection,
+            sort=[("_id", 1)],
+            batch_size=self._batch_size,
+        )
+
+    def field_hashes(self, collection_name: str, fields: List[dict]) -> Optional[List[int]]:
+        """Hashes {k, v} field pairs on the server the way the checksums of
+        id_bucket_digests() hash the fields of documents.
+
+        Args:
+            collection_name: name of a collection with at least one document
+            fields: {k, v} pairs with BSON-ready values
+
+        Returns: list of hashes or None if the server cannot hash them
+        """
+
+        try:
+            result = list(
+                self.client_connector[collection_name].aggregate(
+                    [
+                        {"$limit": 1},
+                        {
+                            "$project": {
+                                "_id": 0,
+                                "keys": [
+                                    {
+                                        "$let": {
+                                            "vars": {"field": {"$literal": field}},
+                                            "in": _field_hash_expression("$$field"),
+                                        }
+                                    }
+                                    for field in fields
+                                ],
+                            }
+                        },
+                    ]
+                )
+            )
+        except OperationFailure as exc:
+            logging.info(f"Server cannot hash values --> {exc}")
+            return None
+
+        return result[0]["keys"] if result else None
+
+    @staticmethod
+    def _id_bucket_filter(prefix: str) -> dict:
+        """Returns a filter of the IDs starting with the prefix, served by the _id index."""
+
+        return {"_id": {"$gte": prefix, "$lt": prefix[:-1] + chr(ord(prefix[-1]) + 1)}}
+
+    def _adaptive_batch_write(
+        self, collection_name: str, documents: List[dict], load_mode: LoadMode = LoadMode.UPSERT
+    ) -> WriteQueryResult:
+        """Writes the documents in bulks whose size follows the bulk response times.
+
+        Args:
+            collection_name: name of the collection where write operation is performed
+            documents: list of documents to be written
+            load_mode: whether documents are upserted or inserted into a fresh collection
+
+        Returns: WriteQueryResult instance of all bulks
+        """
+
+        inserted_document_ids = []
+        processed_document_ids = []
+        inserted_documents = []
+        cancellation = None
+        offset = 0
+
+        while offset < len(documents):
+            chunk = documents[offset: offset + self._batch_sizer.size]
+            started_at = time.perf_counter()
+
+            try:
+                write_res = self._write_bulk(
+                    collection_name=collection_name, documents=chunk, load_mode=load_mode
+                )
+            except InsertionWasCancelledError as exc:
+                if self._ordered and load_mode == LoadMode.UPSERT:
+                    raise InsertionWasCancelledError(
+                        cancelled_documents=exc.cancelled_documents + documents[offset + len(chunk):],
+                        inserted_documents=inserted_documents + exc.inserted_documents,
+                        exception_details=exc.exception_details,
+                    ) from exc
+
+                # Unordered writes go on with the next bulks and cancel failed documents only
+                cancellation = InsertionWasCancelledError(
+                    cancelled_documents=(
+                        cancellation.cancelled_documents if cancellation else []
+                    ) + exc.cancelled_documents,
+                    inserted_documents=[],
+                    exception_details=exc.exception_details,
+                )
+                inserted_documents.extend(exc.inserted_documents)
+                offset += len(chunk)
+                continue
+
+            self._batch_sizer.record(latency=time.perf_counter() - started_at)
+            inserted_document_ids.extend(write_res.inserted_document_ids)
+            processed_document_ids.extend(write_res.processed_document_ids)
+            processed_ids = set(write_res.processed_document_ids)
+            inserted_documents.extend(doc for doc in chunk if doc["_id"] in processed_ids)
+            offset += len(chunk)
+
+        if cancellation:
+            cancellation.inserted_documents = inserted_documents
+            raise cancellation
+
+        return WriteQueryResult(
+            inserted_document_ids=inserted_document_ids,
+            processed_count=len(processed_document_ids),
+            processed_document_ids=processed_document_ids,
+        )
+
+    def _compose_write_result(
+        self, response: BulkWriteResult, collection_name: str, documents: List[dict]
+    ) -> WriteQueryResult:
+        """Composes the write result from the response of a successful bulk write.
+
+        Args:
+            response: result of the bulk write operation
+            collection_name: name of the collection where write operation is performed
+            documents: list of written documents
+
+        Returns: WriteQueryResult instance
+        """
+
+        if not self._ordered:
+            # Unordered writes raise for any failing document, so all were processed
+            processed_count = len(documents)
+        elif not response.matched_count:
+            processed_count = response.upserted_count
+        elif response.matched_count == len(documents):
+            processed_count = response.matched_count
+        else:
+            processed_count = response.upserted_count + response.matched_count
+
+        logging.debug(f"Insertion successfully finished...")
+        logging.debug(
+            f"matched_count = {response.matched_count}; upserted_count = {response.upserted_count}; "
+            f"modified_count = {response.modified_count}\n"
+            f"Totally processed {processed_count} documents into collection {collection_name}"
+        )
+
+        return WriteQueryResult(
+            inserted_document_ids=list(response.upserted_ids.values()),
+            processed_count=processed_count,
+            processed_document_ids=[doc["_id"] for doc in documents[:processed_count]]
+        )
+
+    def _cancel_insertion(self, exc: BulkWriteError, documents: List[dict]):
+        """Cancels insertion of the documents that were not processed by the failed bulk
+        write.
+
+        Args:
+            exc: exception raised by the bulk write operation
+            documents: list of documents that were being written
+
+        Raises: InsertionWasCancelledError
+        """
+
+        if not self._ordered:
+            self._cancel_failed_documents(exc=exc, documents=documents)
+
+        if not exc.details.get("nMatched"):
+            processed_count = exc.details.get("nUpserted")
+        elif exc.details.get("nMatched") == len(documents):
+            processed_count = exc.details.get("nMatched")
+        else:
+            processed_count = exc.details.get("nUpserted") + exc.details.get("nMatched")
+
+        logging.exception(
+            f"Insertion failed after inserting {processed_count} document(s)"
+        )
+        logging.info(
+            f"Canceling insertion of the remaining batch into DESTINATION. "
+            f"Canceled document IDs will be saved in the internal database"
+        )
+        raise InsertionWasCancelledError(
+            cancelled_documents=documents[processed_count:],
+            inserted_documents=documents[:processed_count],
+            exception_details=exc.details,
+        ) from exc
+
+    def _cancel_failed_documents(self, exc: BulkWriteError, documents: List[dict]):
+        """Cancels insertion of the documents reported in writeErrors of a failed
+        unordered bulk write. The server applied all other documents, so the outcome of
+        every document is exact.
+
+        Args:
+            exc: exception raised by the bulk write operation
+            documents: list of documents that were being written
+
+        Raises: InsertionWasCancelledError
+        """
+
+        failed_indexes = {error["index"] for error in exc.details.get("writeErrors", [])}
+
+        if exc.details.get("writeConcernErrors"):
+            # Without the write concern none of the documents is known to be durable
+            failed_indexes = set(range(len(documents)))
+
+        logging.exception(
+            f"Insertion of {len(failed_indexes)} out of {len(documents)} document(s) failed"
+        )
+        logging.info(
+            f"Canceling insertion of the failed documents into DESTINATION. "
+            f"Canceled document IDs will be saved in the internal database"
+        )
+        raise InsertionWasCancelledError(
+            cancelled_documents=[
+                doc for index, doc in enumerate(documents) if index in failed_indexes
+            ],
+            inserted_documents=[
+                doc for index, doc in enumerate(documents) if index not in failed_indexes
+            ],
+            exception_details=exc.details,
+        ) from exc
+
+    @staticmethod
+    def _split_insert_errors(exc: BulkWriteError, documents: List[dict]) -> tuple:
+        """Splits documents rejected by an unordered insert into the ones that already
+        exist and the ones that failed for other reasons.
+
+        Args:
+            exc: exception raised by the bulk write operation
+            documents: list of documents that were being inserted
+
+        Returns: tuple of duplicate documents and failed documents
+        """
+
+        duplicate_documents, failed_documents = [], []
+
+        for error in exc.details.get("writeErrors", []):
+            if error.get("code") == DUPLICATE_KEY_ERROR_CODE:
+                duplicate_documents.append(documents[error["index"]])
+            else:
+                failed_documents.append(documents[error["index"]])
+
+        if exc.details.get("writeConcernErrors"):
+            # Without the write concern none of the documents is known to be durable
+            return [], list(documents)
+
+        return duplicate_documents, failed_documents
+
+    @staticmethod
+    def _cancel_insert_bulk(
+        exc: BulkWriteError, documents: List[dict], failed_documents: List[dict]
+    ):
+        """Cancels insertion of the documents that failed with other than duplicate key
+        errors. Duplicates are cancelled as well, they were not upserted yet.
+
+        Args:
+            exc: exception raised by the bulk write operation
+            documents: list of documents that were being inserted
+            failed_documents: list of documents that failed with other errors
+
+        Raises: InsertionWasCancelledError
+        """
+
+        rejected_indexes = {error["index"] for error in exc.details.get("writeErrors", [])}
+
+        if exc.details.get("writeConcernErrors"):
+            rejected_indexes = set(range(len(documents)))
+
+        logging.exception(
+            f"Insertion of {len(failed_documents)} out of {len(documents)} document(s) failed"
+        )
+        logging.info(
+            f"Canceling insertion of the failed documents into DESTINATION. "
+            f"Canceled document IDs will be saved in the internal database"
+        )
+        raise InsertionWasCancelledError(
+            cancelled_documents=[
+                doc for index, doc in enumerate(documents) if index in rejected_indexes
+            ],
+            inserted_documents=[
+                doc for index, doc in enumerate(documents) if index not in rejected_indexes
+            ],
+            exception_details=exc.details,
+        ) from exc
+
+    @staticmethod
+    def _compose_insert_result(
+        collection_name: str,
+        documents: List[dict],
+        duplicate_documents: List[dict],
+        upsert_res: Optional[WriteQueryResult],
+    ) -> WriteQueryResult:
+        """Composes the write result of an insert bulk and its upsert fallback.
+
+        Args:
+            collection_name: name of the collection where write operation is performed
+            documents: list of documents that were being inserted
+            duplicate_documents: list of documents that were upserted instead
+            upsert_res: WriteQueryResult of the upsert fallback
+
+        Returns: WriteQueryResult instance
+        """
+
+        duplicate_ids = {doc["_id"] for doc in duplicate_documents}
+        inserted_document_ids = [
+            doc["_id"] for doc in documents if doc["_id"] not in duplicate_ids
+        ]
+        processed_document_ids = inserted_document_ids + (
+            upsert_res.processed_document_ids if upsert_res else []
+        )
+
+        logging.debug(f"Insertion successfully finished...")
+        logging.debug(
+            f"inserted_count = {len(inserted_document_ids)}; "
+            f"upserted_count = {len(processed_document_ids) - len(inserted_document_ids)}\n"
+            f"Totally processed {len(processed_document_ids)} documents into collection "
+            f"{collection_name}"
+        )
+
+        return WriteQueryResult(
+            inserted_document_ids=inserted_document_ids
+            + (upsert_res.inserted_document_ids if upsert_res else []),
+            processed_count=len(processed_document_ids),
+            processed_document_ids=processed_document_ids,
+        )
+
     def _inject_id_field(self, documents: List[dict]) -> List[dict]:
         """The original document already contains field named 'id'. MongoDB also created
         _id, which should be the same as 'id'.
@@ -159,9 +745,26 @@ class MongoDbClient(GenericClient):
 
         return documents
 
+    @staticmethod
+    def _compose_bulk_insert_payload(documents: List[dict]) -> list:
+        """Composes a payload for bulk write operation, where documents will be inserted.
+
+        Args:
+            documents: list of documents to be written
+
+        Returns: list of bulk insert items
+        """
+
+        return [
+            InsertOne(MongoDbClient._project_document(doc, MIGRATION_MARKER_FIELDS))
+            for doc in documents
+        ]
+
     def _compose_bulk_update_payload(self, documents: List[dict]) -> list:
         """
-        Composes a payload for bulk write operation, where documents will be upserted
+        Composes a payload for bulk write operation, where documents will be upserted.
+        Payloads are shallow projections, the documents and their nested values are
+        neither copied nor modified
         Args:
             documents: list of documents to be written
 
@@ -171,19 +774,227 @@ class MongoDbClient(GenericClient):
 
         bulk_list = []
 
-        for doc in deepcopy(documents):
-            doc_id = doc["_id"]
+        for doc in documents:
+            excluded_fields = [field for field in MIGRATION_MARKER_FIELDS if doc.get(field)]
 
             if doc.get("is_migrated") is True:
                 # Means this is actually an update
-                doc.pop("_id")
+                excluded_fields.append("_id")
+
+            bulk_list.append(
+                UpdateOne(
+                    {"_id": doc["_id"]},
+                    {"$set": self._project_document(doc, excluded_fields)},
+                    upsert=True,
+                )
+            )
+
+        return bulk_list
 
-            if doc.get("is_migrated"):
-                doc.pop("is_migrated")
+    @staticmethod
+    def _project_document(doc: dict, excluded_fields) -> dict:
+        """Returns the document without the excluded top-level fields. The document
+        itself is returned when none of the fields is present.
 
-            if doc.get("migrated_at"):
-                doc.pop("migrated_at")
+        Args:
+            doc: document to project
+            excluded_fields: names of the fields left out of the projection
 
-            bulk_list.append(UpdateOne({"_id": doc_id}, {"$set": doc}, upsert=True))
+        Returns: the document or its shallow projection
+        """
 
-        return bulk_list
+        if not any(field in doc for field in excluded_fields):
+            return doc
+
+        return {key: value for key, value in doc.items() if key not in excluded_fields}
+
+
+def _field_hash_expression(field: str) -> dict:
+    """Returns an aggregation expression that hashes a {k, v} field pair like
+    hashing.field_hash()."""
+
+    return {
+        "$toHashedIndexKey": {
+            "k": f"{field}.k",
+            "v": _exact_numbers_expression(f"{field}.v", depth=0),
+        }
+    }
+
+
+def _exact_numbers_expression(value: str, depth: int) -> dict:
+    """Returns an aggregation expression that replaces numbers like
+    hashing.exact_numbers(). Containers are replaced recursively, so the expression
+    doubles in size with every level of EXACT_NUMBERS_DEPTH.
+
+    Args:
+        value: expression of the value, e.g. a variable
+        depth: nesting depth of the value
+
+    Returns: aggregation expression
+    """
+
+    branches = [
+        {
+            "case": {"$eq": [{"$type": value}, "double"]},
+            "then": {
+                "$cond": [_inexact_number_condition(value), _double_expression(value), value]
+            },
+        },
+        {
+            "case": {"$eq": [{"$type": value}, "decimal"]},
+            "then": {
+                "$cond": [
+                    _inexact_number_condition(value),
+                    [DECIMAL_TAG, {"$toString": value}],
+                    value,
+                ]
+            },
+        },
+    ]
+
+    if depth < EXACT_NUMBERS_DEPTH:
+        entry, item = f"$$entry{depth}", f"$$item{depth}"
+        branches += [
+            {
+                "case": {"$eq": [{"$type": value}, "object"]},
+                "then": {
+                    "$arrayToObject": {
+                        "$map": {
+                            "input": {"$objectToArray": value},
+                            "as": entry[2:],
+                            "in": {
+                                "k": f"{entry}.k",
+                                "v": _exact_numbers_expression(f"{entry}.v", depth + 1),
+                            },
+                        }
+                    }
+                },
+            },
+            {
+                "case": {"$eq": [{"$type": value}, "array"]},
+                "then": {
+                    "$map": {
+                        "input": value,
+                        "as": item[2:],
+                        "in": _exact_numbers_expression(item, depth + 1),
+                    }
+                },
+            },
+        ]
+
+    return {"$switch": {"branches": branches, "default": value}}
+
+
+def _inexact_number_condition(value: str) -> dict:
+    """Returns an aggregation expression that checks whether a finite number is not a
+    whole number in the 64-bit integer range, so hashing would truncate it."""
+
+    return {
+        "$and": [
+            {"$lt": [{"$abs": value}, {"$literal": float("inf")}]},
+            {
+                "$or": [
+                    {"$ne": [value, {"$trunc": value}]},
+                    {"$gte": [{"$abs": value}, 2.0 ** 63]},
+                ]
+            },
+        ]
+    }
+
+
+def _double_expression(value: str) -> dict:
+    """Returns an aggregation expression of the exact mantissa and exponent of a
+    finite non-zero double, like math.frexp() in hashing.exact_numbers(). The
+    logarithm only estimates the exponent, which is corrected with exact powers of 2."""
+
+    return {
+        "$let": {
+            "vars": {"estimate": {"$floor": {"$log": [{"$abs": value}, 2]}}},
+            "in": {
+                "$let": {
+                    "vars": {
+                        "exponent": {
+                            "$add": [
+                                "$$estimate",
+                                {
+                                    "$cond": [
+                                        {"$gt": [{"$pow": [2, "$$estimate"]}, {"$abs": value}]},
+                                        -1,
+                                        0,
+                                    ]
+                                },
+                                {
+                                    "$cond": [
+                                        {
+                                            "$lte": [
+                                                {"$pow": [2, {"$add": ["$$estimate", 1]}]},
+                                                {"$abs": value},
+                                            ]
+                                        },
+                                        1,
+                                        0,
+                                    ]
+                                },
+                            ]
+                        }
+                    },
+                    "in": [
+                        DOUBLE_TAG,
+                        {
+                            "$multiply": [
+                                {"$divide": [value, {"$pow": [2, "$$exponent"]}]},
+                                2.0 ** 52,
+                            ]
+                        },
+                        "$$exponent",
+                    ],
+                }
+            },
+        }
+    }
+
+
+def _exceeds_depth_expression(value: str, depth: int = 0) -> dict:
+    """Returns an aggregation expression that checks for containers nested deeper
+    than EXACT_NUMBERS_DEPTH, like hashing.exceeds_exact_numbers_depth()."""
+
+    if depth >= EXACT_NUMBERS_DEPTH:
+        return {"$in": [{"$type": value}, ["object", "array"]]}
+
+    entry, item = f"$$entry{depth}", f"$$item{depth}"
+
+    return {
+        "$switch": {
+            "branches": [
+                {
+                    "case": {"$eq": [{"$type": value}, "object"]},
+                    "then": {
+                        "$anyElementTrue": [
+                            {
+                                "$map": {
+                                    "input": {"$objectToArray": value},
+                                    "as": entry[2:],
+                                    "in": _exceeds_depth_expression(f"{entry}.v", depth + 1),
+                                }
+                            }
+                        ]
+                    },
+                },
+                {
+                    "case": {"$eq": [{"$type": value}, "array"]},
+                    "then": {
+                        "$anyElementTrue": [
+                            {
+                                "$map": {
+                                    "input": value,
+                                    "as": item[2:],
+                                    "in": _exceeds_depth_expression(item, depth + 1),
+                                }
+                            }
+                        ]
+                    },
+                },
+            ],
+            "default": False,
+        }
+    }
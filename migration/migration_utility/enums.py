@@ -29,3 +29,79 @@ class FlowNames(str, Enum):
 
     FLAT = "flat"
     HIERARCHICAL = "hierarchical"
+
+
+class NumberMode(str, Enum):
+    """Enum with destination types of DynamoDB numbers."""
+
+    INT = "int"
+    FLOAT = "float"
+    DECIMAL128 = "decimal128"
+
+
+class ReadMode(str, Enum):
+    """Enum with DynamoDB read modes."""
+
+    RESOURCE = "resource"
+    RAW = "raw"
+
+
+class UpdateMode(str, Enum):
+    """Enum with DynamoDB batch update modes."""
+
+    TRANSACTIONAL = "transactional"
+    CONCURRENT = "concurrent"
+
+
+class LoadMode(str, Enum):
+    """Enum with ways of writing documents into MongoDB."""
+
+    UPSERT = "upsert"
+    INSERT = "insert"
+
+
+class ErrorClass(str, Enum):
+    """Enum with classes of errors that decide how an operation is retried."""
+
+    THROTTLING = "throttling"
+    TRANSIENT = "transient"
+    FATAL = "fatal"
+
+
+class MarkingMode(str, Enum):
+    """Enum with ways of remembering which documents were migrated."""
+
+    SOURCE = "source"
+    LEDGER = "ledger"
+
+
+class WorkUnitKind(str, Enum):
+    """Enum with kinds of work units leased by workers of a multi-node migration."""
+
+    SEGMENT = "segment"
+    ID_RANGE = "id_range"
+    COLLECTION = "collection"
+
+
+class WorkUnitStatus(str, Enum):
+    """Enum with states of work units."""
+
+    PENDING = "pending"
+    LEASED = "leased"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class MetricsExporterKind(str, Enum):
+    """Enum with ways of exporting migration metrics."""
+
+    PROMETHEUS = "prometheus"
+    JSON = "json"
+
+
+class MismatchKind(str, Enum):
+    """Enum with differences between source and destination found by a verification."""
+
+    MISSING = "missing"
+    EXTRA = "extra"
+    DIFFERENT = "different"
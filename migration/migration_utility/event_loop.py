@@ -0,0 +1,26 @@
+import asyncio
+from typing import Any, Coroutine
+
+from migration.migration_utility import logging
+
+
+def run(coroutine: Coroutine, use_uvloop: bool = True) -> Any:
+    """Runs the coroutine until it completes, on uvloop when it is installed and
+    requested, otherwise on the default asyncio event loop.
+
+    Args:
+        coroutine: coroutine to run
+        use_uvloop: indicates whether uvloop should be used as the event loop
+
+    Returns: result of the coroutine
+    """
+
+    if use_uvloop:
+        try:
+            import uvloop
+
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        except ImportError:
+            logging.info("uvloop is not installed, using the default asyncio event loop")
+
+    return asyncio.run(coroutine)
@@ -27,5 +27,33 @@ class RetryableFetchingError(Exception):
     """Raised when document fetching fails, but can be retried."""
 
 
+class ThrottlingError(RetryableFetchingError):
+    """Raised when the database throttles a request because capacity is exceeded."""
+
+
+class RetryableWriteError(Exception):
+    """Raised when some documents were not written, but writing them can be retried."""
+
+
 class FetchingTerminatedError(Exception):
     """Raised when fetching still fails and we are not going to retry."""
+
+
+class MigrationShardFailedError(Exception):
+    """Raised when a worker process of a sharded migration failed."""
+
+
+class StreamNotEnabledError(Exception):
+    """Raised when change data capture is requested for a table without a stream."""
+
+
+class ShardIteratorExpiredError(Exception):
+    """Raised when a stream shard iterator expired and has to be requested again."""
+
+
+class StreamRecordsTrimmedError(Exception):
+    """Raised when stream records after a checkpoint were removed by the retention period."""
+
+
+class VerificationNotSupportedError(Exception):
+    """Raised when the destination database cannot compute digests of its documents."""
@@ -0,0 +1,279 @@
+import hashlib
+import math
+import struct
+from decimal import ROUND_HALF_EVEN, Decimal
+from typing import Iterable
+
+import bson
+from bson.decimal128 import Decimal128
+
+# Per-field checksums are reduced modulo this value, so sums of millions of them
+# neither overflow 64-bit integers in Python nor in MongoDB
+CHECKSUM_MODULUS = 2 ** 31
+
+# Depth of the containers whose numbers are hashed exactly. Numbers of containers
+# nested deeper are truncated like by hash64(), see exact_numbers()
+EXACT_NUMBERS_DEPTH = 4
+# Tags of the arrays that replace numbers hash64() cannot hash exactly
+DOUBLE_TAG = "#double"
+DECIMAL_TAG = "#decimal"
+
+_INT64_MIN = -(2 ** 63)
+_INT64_MAX = 2 ** 63 - 1
+_DECIMAL_INT64_LIMIT = Decimal(2 ** 63)
+
+# BSON type codes of numbers, hashed as 64-bit integers
+_NUMBER_TYPES = frozenset([0x01, 0x10, 0x12, 0x13])
+
+# Canonical types of the BSON type codes, as MongoDB orders and hashes them
+_CANONICAL_TYPES = {
+    0xFF: -1,  # MinKey
+    0x06: 0,  # Undefined
+    0x0A: 5,  # Null
+    0x01: 10,  # Double
+    0x10: 10,  # Int32
+    0x12: 10,  # Int64
+    0x13: 10,  # Decimal128
+    0x02: 15,  # String
+    0x0E: 15,  # Symbol
+    0x03: 20,  # Object
+    0x04: 25,  # Array
+    0x05: 30,  # Binary
+    0x07: 35,  # ObjectId
+    0x08: 40,  # Boolean
+    0x09: 45,  # Date
+    0x11: 47,  # Timestamp
+    0x0B: 50,  # Regular expression
+    0x0C: 55,  # DBPointer
+    0x0D: 60,  # JavaScript code
+    0x0F: 65,  # JavaScript code with scope
+    0x7F: 127,  # MaxKey
+}
+_OBJECT_CANONICAL_TYPE = struct.pack("<i", 20)
+_ARRAY_CANONICAL_TYPE = struct.pack("<i", 25)
+_NUMBER_CANONICAL_TYPE = struct.pack("<i", 10)
+# Terminator of objects and arrays, hashed as canonical type 0 without a name and value
+_END_OF_OBJECT = struct.pack("<i", 0)
+
+
+def hash64(value, seed: int = 0) -> int:
+    """Hashes a value like MongoDB hashes values of hashed indexes and the
+    $toHashedIndexKey aggregation operator. Numbers are truncated to 64-bit integers
+    before they are hashed, so 2.3 and 2.9 have equal hashes unless the value is passed
+    through exact_numbers() first.
+
+    Args:
+        value: BSON-ready value
+        seed: hash seed, MongoDB uses 0
+
+    Returns: signed 64-bit hash
+    """
+
+    md5 = hashlib.md5(struct.pack("<i", seed))
+    _hash_element(md5, value, field_name=None)
+
+    return struct.unpack("<q", md5.digest()[:8])[0]
+
+
+def truncated_mod(value: int, modulus: int = CHECKSUM_MODULUS) -> int:
+    """Returns the remainder with the sign of the value, like $mod of MongoDB."""
+
+    remainder = abs(value) % modulus
+
+    return remainder if value >= 0 else -remainder
+
+
+def exact_numbers(value, depth: int = 0):
+    """Returns the value with the numbers hash64() would truncate, e.g. 2.3 or 2 ** 70,
+    replaced by arrays of their exact representation: the mantissa and exponent of
+    doubles and the string of decimals. MongoDbClient replaces them the same way in
+    aggregations. Containers nested deeper than EXACT_NUMBERS_DEPTH are left as they are.
+
+    Args:
+        value: BSON-ready value
+        depth: nesting depth of the value
+
+    Returns: value that hash64() hashes without losing numeric values
+    """
+
+    if isinstance(value, dict):
+        if depth >= EXACT_NUMBERS_DEPTH:
+            return value
+
+        return {name: exact_numbers(item, depth + 1) for name, item in value.items()}
+
+    if isinstance(value, (list, tuple)):
+        if depth >= EXACT_NUMBERS_DEPTH:
+            return value
+
+        return [exact_numbers(item, depth + 1) for item in value]
+
+    if isinstance(value, float):
+        if math.isfinite(value) and (not value.is_integer() or abs(value) >= 2.0 ** 63):
+            mantissa, exponent = math.frexp(value)
+            return [DOUBLE_TAG, mantissa * 2.0 ** 53, exponent - 1]
+
+        return value
+
+    if isinstance(value, Decimal128):
+        number = value.to_decimal()
+
+        if number.is_finite() and (
+            number != number.to_integral_value() or abs(number) >= _DECIMAL_INT64_LIMIT
+        ):
+            return [DECIMAL_TAG, str(value)]
+
+    return value
+
+
+def exceeds_exact_numbers_depth(value, depth: int = 0) -> bool:
+    """Checks whether the value holds containers nested deeper than exact_numbers()
+    replaces numbers in."""
+
+    if isinstance(value, dict):
+        items = value.values()
+    elif isinstance(value, (list, tuple)):
+        items = value
+    else:
+        return False
+
+    if depth >= EXACT_NUMBERS_DEPTH:
+        return True
+
+    return any(exceeds_exact_numbers_depth(item, depth + 1) for item in items)
+
+
+def field_hash(name: str, value) -> int:
+    """Hashes a top-level field as a {k, v} pair, the way $objectToArray returns it,
+    with exact numbers."""
+
+    return hash64({"k": name, "v": exact_numbers(value)})
+
+
+def document_checksum(document: dict, excluded_fields: Iterable[str] = ()) -> int:
+    """Returns a checksum of the top-level fields of the document that does not depend
+    on their order. Every field is hashed with field_hash(), so MongoDB computes the
+    same checksum in an aggregation.
+
+    Args:
+        document: document in the destination format
+        excluded_fields: names of the fields left out of the checksum
+
+    Returns: checksum between -CHECKSUM_MODULUS and CHECKSUM_MODULUS
+    """
+
+    return truncated_mod(
+        sum(
+            truncated_mod(field_hash(name, value))
+            for name, value in document.items()
+            if name not in excluded_fields
+        )
+    )
+
+
+def inexact_checksum(document: dict, excluded_fields: Iterable[str] = ()) -> bool:
+    """Checks whether the checksum of the document may miss changed numbers, because
+    they are nested deeper than EXACT_NUMBERS_DEPTH.
+
+    Args:
+        document: document in the destination format
+        excluded_fields: names of the fields left out of the checksum
+
+    Returns: True if the document should be compared by its content hash
+    """
+
+    return any(
+        exceeds_exact_numbers_depth(value)
+        for name, value in document.items()
+        if name not in excluded_fields
+    )
+
+
+def document_size(document: dict) -> int:
+    """Returns the size of the BSON encoding of the document, equal to $bsonSize."""
+
+    return len(bson.encode(document))
+
+
+def content_hash(document: dict) -> bytes:
+    """Returns an exact hash of the document content. Top-level fields are hashed in
+    the order of their names, since upserts keep the order of an existing document.
+
+    Args:
+        document: document in the destination format
+
+    Returns: 16-byte digest
+    """
+
+    return hashlib.blake2b(
+        bson.encode({name: document[name] for name in sorted(document)}), digest_size=16
+    ).digest()
+
+
+def _hash_element(md5, value, field_name):
+    """Adds a BSON element to the hash the way BSONElementHasher::recursiveHash does."""
+
+    if isinstance(value, dict):
+        md5.update(_OBJECT_CANONICAL_TYPE)
+        _hash_field_name(md5, field_name)
+
+        for name, item in value.items():
+            _hash_element(md5, item, field_name=name)
+
+        md5.update(_END_OF_OBJECT)
+        return
+
+    if isinstance(value, (list, tuple)):
+        md5.update(_ARRAY_CANONICAL_TYPE)
+        _hash_field_name(md5, field_name)
+
+        for index, item in enumerate(value):
+            _hash_element(md5, item, field_name=str(index))
+
+        md5.update(_END_OF_OBJECT)
+        return
+
+    # Type code and value bytes of scalars are taken from their encoding in {"": value}
+    encoded = bson.encode({"": value})
+    type_code = encoded[4]
+
+    if type_code in _NUMBER_TYPES:
+        md5.update(_NUMBER_CANONICAL_TYPE)
+        _hash_field_name(md5, field_name)
+        md5.update(struct.pack("<q", _safe_number_long(value)))
+        return
+
+    md5.update(struct.pack("<i", _CANONICAL_TYPES[type_code]))
+    _hash_field_name(md5, field_name)
+    md5.update(encoded[6:-1])
+
+
+def _hash_field_name(md5, field_name):
+    """Adds the null-terminated name of a field nested in an object or array."""
+
+    if field_name is not None:
+        md5.update(field_name.encode() + b"\x00")
+
+
+def _safe_number_long(value) -> int:
+    """Converts a number into a 64-bit integer like BSONElement::safeNumberLong."""
+
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+
+        if value.is_nan():
+            return 0
+        if value.is_infinite():
+            return _INT64_MAX if value > 0 else _INT64_MIN
+
+        return min(max(int(value.to_integral_value(rounding=ROUND_HALF_EVEN)), _INT64_MIN), _INT64_MAX)
+
+    if isinstance(value, float):
+        if value != value:
+            return 0
+        if value >= 2.0 ** 63:
+            return _INT64_MAX
+        if value < -(2.0 ** 63):
+            return _INT64_MIN
+
+    return int(value)
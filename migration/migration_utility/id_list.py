@@ -0,0 +1,68 @@
+import re
+from typing import Iterator, Union
+
+# IDs of migrated documents are mostly UUIDs without dashes
+_UUID_HEX_RE = re.compile(r"[0-9a-f]{32}")
+
+
+class CompactIdSet:
+    """Set of document IDs that keeps 32-digit lowercase hex IDs as 128-bit integers,
+    which takes about half the memory of the strings. Other IDs are kept as they are,
+    so membership is always exact.
+    """
+
+    def __init__(self):
+        self._keys = set()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return self._key(doc_id) in self._keys
+
+    def add(self, doc_id: str) -> bool:
+        """Adds the ID to the set.
+
+        Args:
+            doc_id: document ID
+
+        Returns: True if the ID was not in the set yet
+        """
+
+        key = self._key(doc_id)
+
+        if key in self._keys:
+            return False
+
+        self._keys.add(key)
+
+        return True
+
+    @staticmethod
+    def _key(doc_id: str) -> Union[int, str]:
+        """Returns the compact representation of the ID."""
+
+        if _UUID_HEX_RE.fullmatch(doc_id):
+            return int(doc_id, 16)
+
+        return doc_id
+
+
+def read_id_list(path: str) -> Iterator[str]:
+    """Reads IDs from a file with one ID per line. The file is streamed line by line,
+    blank lines are skipped and repeated IDs are yielded once.
+
+    Args:
+        path: path to the ID file
+
+    Returns: iterator of unique IDs in the file order
+    """
+
+    seen_ids = CompactIdSet()
+
+    with open(path) as fh:
+        for line in fh:
+            doc_id = line.strip()
+
+            if doc_id and seen_ids.add(doc_id):
+                yield doc_id
@@ -0,0 +1,448 @@
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from migration.migration_utility import logging
+
+# Quantiles reported for every latency histogram
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+# Stages of the migration that report metrics
+STAGES = ("fetch", "convert", "write", "mark", "checkpoint")
+
+
+def estimate_size(value) -> int:
+    """Estimates the size of a plain document value in bytes, roughly the size of its
+    BSON encoding without encoding it."""
+
+    if isinstance(value, dict):
+        return sum(len(key) + estimate_size(item) for key, item in value.items()) + 5
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(item) for item in value) + 5
+    if isinstance(value, (str, bytes)):
+        return len(value) + 5
+    if isinstance(value, Decimal):
+        return 16
+
+    return 8
+
+
+class LatencyHistogram:
+    """HDR-style histogram of latencies. Values are counted in log-linear buckets, each
+    power of two is split into sub-buckets, so percentiles keep the same relative
+    precision from microseconds to minutes with a few hundred buckets at most.
+    """
+
+    def __init__(self, sub_bucket_bits: int = 4, unit: float = 1e-6):
+        """Initializes an empty histogram.
+
+        Args:
+            sub_bucket_bits: log2 of the number of sub-buckets per power of two. 4 keeps
+                the relative error below 1/16
+            unit: smallest distinguished latency in seconds
+        """
+
+        self.sub_bucket_bits = sub_bucket_bits
+        self.unit = unit
+
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._buckets: Dict[int, int] = {}
+
+    def record(self, seconds: float):
+        """Counts a latency. Not thread safe, the registry holds its lock."""
+
+        units = max(int(seconds / self.unit), 0)
+        shift = max(units.bit_length() - 1 - self.sub_bucket_bits, 0)
+        lower_bound = (units >> shift) << shift
+
+        self._buckets[lower_bound] = self._buckets.get(lower_bound, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, quantile: float) -> float:
+        """Returns the latency below which the given share of the latencies falls.
+
+        Args:
+            quantile: share between 0 and 1
+
+        Returns: latency in seconds, the middle of the bucket the percentile falls into
+        """
+
+        if not self.count:
+            return 0.0
+
+        rank = quantile * self.count
+        seen = 0
+
+        for lower_bound in sorted(self._buckets):
+            seen += self._buckets[lower_bound]
+
+            if seen >= rank:
+                shift = max(lower_bound.bit_length() - 1 - self.sub_bucket_bits, 0)
+                return min((lower_bound + (1 << shift) / 2) * self.unit, self.max)
+
+        return self.max
+
+
+class StageOperation:
+    """Single operation of a stage, e.g. a fetched page, measured by
+    MetricsRegistry.track()."""
+
+    def __init__(self, registry: "MetricsRegistry", stage: str, collection: str):
+        """Initializes the operation.
+
+        Args:
+            registry: MetricsRegistry the operation is reported to
+            stage: name of the stage
+            collection: name of the collection the operation works on
+        """
+
+        self.registry = registry
+        self.stage = stage
+        self.collection = collection
+        self.documents = 0
+        self.bytes = 0
+
+    def add(self, documents: List[dict]):
+        """Counts documents processed by the operation."""
+
+        self.documents += len(documents)
+
+        if self.registry.track_bytes:
+            self.bytes += sum(estimate_size(document) for document in documents)
+
+    def __enter__(self) -> "StageOperation":
+        self.registry.add_in_flight(self.stage, self.collection, 1)
+        self._started_at = time.perf_counter()
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.registry.record(
+            stage=self.stage,
+            collection=self.collection,
+            seconds=time.perf_counter() - self._started_at,
+            documents=self.documents,
+            byte_count=self.bytes,
+            failed=exc_type is not None,
+        )
+        self.registry.add_in_flight(self.stage, self.collection, -1)
+
+
+class MetricsRegistry:
+    """Thread-safe registry of the per-stage metrics of a migration, split by
+    collection: operation, document, byte and error counters, in-flight gauges and
+    latency histograms."""
+
+    def __init__(self, track_bytes: bool = False):
+        """Initializes an empty registry.
+
+        Args:
+            track_bytes: if True sizes of the processed documents are estimated
+        """
+
+        self.track_bytes = track_bytes
+
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, str, str], float] = {}
+        self._in_flight: Dict[Tuple[str, str], int] = {}
+        self._latencies: Dict[Tuple[str, str], LatencyHistogram] = {}
+
+    def track(self, stage: str, collection: str) -> StageOperation:
+        """Returns a context manager that measures a single operation of the stage.
+
+        Args:
+            stage: name of the stage, one of STAGES
+            collection: name of the collection the operation works on
+
+        Returns: StageOperation instance
+        """
+
+        return StageOperation(registry=self, stage=stage, collection=collection)
+
+    def record(
+        self,
+        stage: str,
+        collection: str,
+        seconds: float,
+        documents: int = 0,
+        byte_count: int = 0,
+        failed: bool = False,
+    ):
+        """Records a finished operation of the stage.
+
+        Args:
+            stage: name of the stage
+            collection: name of the collection the operation worked on
+            seconds: duration of the operation
+            documents: number of processed documents
+            byte_count: estimated size of the processed documents
+            failed: indicates whether the operation raised
+
+        Returns: None
+        """
+
+        key = (stage, collection)
+
+        with self._lock:
+            for name, value in (
+                ("operations", 1),
+                ("documents", documents),
+                ("bytes", byte_count),
+                ("errors", int(failed)),
+            ):
+                self._counters[(name, *key)] = self._counters.get((name, *key), 0) + value
+
+            histogram = self._latencies.get(key)
+
+            if histogram is None:
+                histogram = self._latencies[key] = LatencyHistogram()
+
+            histogram.record(seconds)
+
+    def add_in_flight(self, stage: str, collection: str, delta: int):
+        """Changes the number of operations of the stage in flight."""
+
+        with self._lock:
+            self._in_flight[(stage, collection)] = self._in_flight.get((stage, collection), 0) + delta
+
+    def snapshot(self) -> dict:
+        """Returns all metrics as a JSON-serializable dict grouped by stage and collection."""
+
+        stages = {}
+
+        with self._lock:
+            keys = set(self._latencies) | set(self._in_flight)
+
+            for stage, collection in sorted(keys):
+                histogram = self._latencies.get((stage, collection)) or LatencyHistogram()
+                stages.setdefault(stage, {})[collection] = {
+                    "operations": self._counters.get(("operations", stage, collection), 0),
+                    "documents": self._counters.get(("documents", stage, collection), 0),
+                    "bytes": self._counters.get(("bytes", stage, collection), 0),
+                    "errors": self._counters.get(("errors", stage, collection), 0),
+                    "in_flight": self._in_flight.get((stage, collection), 0),
+                    "latency_seconds": {
+                        "count": histogram.count,
+                        "sum": round(histogram.total, 6),
+                        "max": round(histogram.max, 6),
+                        **{
+                            f"p{quantile * 100:g}": round(histogram.percentile(quantile), 6)
+                            for quantile in QUANTILES
+                        },
+                    },
+                }
+
+        return {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "stages": stages,
+        }
+
+    def render_prometheus(self) -> str:
+        """Returns all metrics in the Prometheus text exposition format."""
+
+        snapshot = self.snapshot()["stages"]
+        lines = []
+        series = [
+            (stage, collection, metrics)
+            for stage, collections in snapshot.items()
+            for collection, metrics in collections.items()
+        ]
+
+        for name, metric_type, help_text in (
+            ("operations", "counter", "Operations finished by a migration stage"),
+            ("documents", "counter", "Documents processed by a migration stage"),
+            ("bytes", "counter", "Estimated bytes of documents processed by a migration stage"),
+            ("errors", "counter", "Operations of a migration stage that raised"),
+            ("in_flight", "gauge", "Operations of a migration stage in flight"),
+        ):
+            metric_name = f"migration_{name}" + ("_total" if metric_type == "counter" else "")
+            lines.append(f"# HELP {metric_name} {help_text}")
+            lines.append(f"# TYPE {metric_name} {metric_type}")
+
+            for stage, collection, metrics in series:
+                lines.append(f"{metric_name}{{{_labels(stage, collection)}}} {metrics[name]}")
+
+        lines.append("# HELP migration_latency_seconds Latency of operations of a migration stage")
+        lines.append("# TYPE migration_latency_seconds summary")
+
+        for stage, collection, metrics in series:
+            labels = _labels(stage, collection)
+            latency = metrics["latency_seconds"]
+
+            for quantile in QUANTILES:
+                lines.append(
+                    f'migration_latency_seconds{{{labels},quantile="{quantile:g}"}} '
+                    f'{latency[f"p{quantile * 100:g}"]}'
+                )
+
+            lines.append(f"migration_latency_seconds_sum{{{labels}}} {latency['sum']}")
+            lines.append(f"migration_latency_seconds_count{{{labels}}} {latency['count']}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _labels(stage: str, collection: str) -> str:
+    """Formats the labels of a series, escaped as the exposition format requires."""
+
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return f'stage="{escape(stage)}",collection="{escape(collection)}"'
+
+
+class MetricsExporter(ABC):
+    """Publishes the metrics of a registry while the migration runs."""
+
+    def __init__(self, registry: MetricsRegistry):
+        """Initializes the exporter.
+
+        Args:
+            registry: MetricsRegistry whose metrics are published
+        """
+
+        self.registry = registry
+
+    @abstractmethod
+    def start(self):
+        """Starts publishing the metrics."""
+
+    @abstractmethod
+    def close(self):
+        """Stops publishing the metrics."""
+
+    def __enter__(self) -> "MetricsExporter":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class PrometheusExporter(MetricsExporter):
+    """Serves the metrics in the Prometheus text format on /metrics."""
+
+    def __init__(self, registry: MetricsRegistry, port: int, host: str = "0.0.0.0"):
+        """Initializes the exporter.
+
+        Args:
+            registry: MetricsRegistry whose metrics are served
+            port: port of the HTTP endpoint
+            host: interface the HTTP endpoint listens on
+        """
+
+        super().__init__(registry=registry)
+
+        self.port = port
+        self.host = host
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def start(self):
+        """Starts the HTTP endpoint on a background thread. A port that is already in use
+        is logged, the migration runs without the endpoint."""
+
+        registry = self.registry
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+
+                body = registry.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+        except OSError as exc:
+            logging.info(f"Metrics endpoint could not listen on port {self.port} --> {exc}")
+            return
+
+        self._server.daemon_threads = True
+        threading.Thread(
+            target=self._server.serve_forever, name="metrics-endpoint", daemon=True
+        ).start()
+
+        logging.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    def close(self):
+        """Stops the HTTP endpoint."""
+
+        server, self._server = self._server, None
+
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+
+class JsonSnapshotExporter(MetricsExporter):
+    """Writes a JSON snapshot of the metrics into a file on a timer and when closed. The
+    file is replaced atomically, so readers never see a partial snapshot."""
+
+    def __init__(self, registry: MetricsRegistry, path: str, interval: float = 10.0):
+        """Initializes the exporter.
+
+        Args:
+            registry: MetricsRegistry whose metrics are written
+            path: path of the snapshot file
+            interval: seconds between two snapshots
+        """
+
+        super().__init__(registry=registry)
+
+        self.path = path
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Starts writing snapshots from a background thread."""
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-snapshot", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stops the background thread and writes the final snapshot."""
+
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join()
+            self._thread = None
+
+        self.write()
+
+    def write(self):
+        """Writes the current snapshot."""
+
+        temporary_path = f"{self.path}.tmp"
+
+        with open(temporary_path, "w") as snapshot_file:
+            json.dump(self.registry.snapshot(), snapshot_file, indent=2)
+
+        os.replace(temporary_path, self.path)
+
+    def _run(self):
+        """Writes snapshots until the exporter is closed."""
+
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.write()
+            except OSError as exc:
+                logging.info(f"Writing metrics snapshot failed --> {exc!r}")
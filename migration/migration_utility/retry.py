@@ -0,0 +1,369 @@
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict
+
+from botocore.exceptions import BotoCoreError, ClientError
+from pydantic import BaseModel, Field
+from pymongo.errors import AutoReconnect, ConnectionFailure, ExecutionTimeout, WTimeoutError
+
+from migration.migration_utility import logging
+from migration_utility.enums import ErrorClass
+from migration_utility.exceptions import (
+    RetryableFetchingError,
+    RetryableWriteError,
+    ThrottlingError,
+)
+
+# Error codes returned when DynamoDB throttles a request
+THROTTLING_ERROR_CODES = frozenset(
+    ["ProvisionedThroughputExceededException", "ThrottlingException", "RequestLimitExceeded"]
+)
+# Error codes that will fail again on retry
+NON_RETRYABLE_ERROR_CODES = frozenset(
+    ["ValidationException", "ValidationError", "ConditionalCheckFailedException"]
+)
+
+
+def classify_error(exc: BaseException) -> ErrorClass:
+    """Tells whether the error is worth retrying and how.
+
+    Args:
+        exc: raised exception
+
+    Returns: ErrorClass of the exception
+    """
+
+    if isinstance(exc, ThrottlingError):
+        return ErrorClass.THROTTLING
+    if isinstance(exc, (RetryableFetchingError, RetryableWriteError)):
+        cause = exc.__cause__
+        return classify_error(cause) if cause is not None else ErrorClass.TRANSIENT
+    if isinstance(exc, ClientError):
+        code = exc.response.get("Error", {}).get("Code")
+
+        if code in THROTTLING_ERROR_CODES:
+            return ErrorClass.THROTTLING
+        if code in NON_RETRYABLE_ERROR_CODES:
+            return ErrorClass.FATAL
+
+        return ErrorClass.TRANSIENT
+    if isinstance(exc, (BotoCoreError, AutoReconnect, ConnectionFailure, ExecutionTimeout, WTimeoutError)):
+        return ErrorClass.TRANSIENT
+
+    return ErrorClass.FATAL
+
+
+class RetryPolicy(BaseModel):
+    """Model that holds exponential backoff settings of retried operations."""
+
+    max_attempts: int = Field(
+        5, description="max number of attempts, including the first one"
+    )
+    base_delay: float = Field(1.0, description="delay before the first retry in seconds")
+    max_delay: float = Field(60.0, description="upper bound of a single delay in seconds")
+    multiplier: float = Field(2.0, description="growth factor of consecutive delays")
+    throttling_multiplier: float = Field(
+        2.0, description="extra factor applied to delays after throttling errors"
+    )
+    jitter: bool = Field(
+        True, description="randomizes delays so that parallel retries do not synchronize"
+    )
+
+    def delay(self, attempt: int, error_class: ErrorClass = ErrorClass.TRANSIENT) -> float:
+        """Returns the delay before the given retry attempt.
+
+        Args:
+            attempt: number of the retry, starting from 1
+            error_class: class of the error that caused the retry
+
+        Returns: delay in seconds
+        """
+
+        delay = self.base_delay * self.multiplier ** (attempt - 1)
+
+        if error_class == ErrorClass.THROTTLING:
+            delay *= self.throttling_multiplier
+
+        delay = min(self.max_delay, delay)
+
+        # Full jitter keeps the expected delay at half of the exponential one
+        return random.uniform(0, delay) if self.jitter else delay
+
+    def should_retry(self, attempt: int, error_class: ErrorClass) -> bool:
+        """Tells whether another attempt is allowed after the given failed attempt."""
+
+        return error_class != ErrorClass.FATAL and attempt < self.max_attempts
+
+
+class RetryCounters:
+    """Thread-safe counters of retried operations per error class."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = Counter()
+
+    def increment(self, error_class: ErrorClass, outcome: str):
+        """Increments the counter of the error class and outcome.
+
+        Args:
+            error_class: class of the error
+            outcome: one of retried, recovered, exhausted
+
+        Returns: None
+        """
+
+        with self._lock:
+            self._counters[(error_class.value, outcome)] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Returns the counters grouped by error class."""
+
+        with self._lock:
+            counters = dict(self._counters)
+
+        snapshot = {}
+
+        for (error_class, outcome), count in counters.items():
+            snapshot.setdefault(error_class, {})[outcome] = count
+
+        return snapshot
+
+
+def retry_call(
+    func: Callable,
+    policy: RetryPolicy,
+    counters: RetryCounters = None,
+    description: str = None,
+) -> Any:
+    """Calls the function, retrying retryable errors with exponential backoff on the
+    calling thread.
+
+    Args:
+        func: function without arguments
+        policy: RetryPolicy instance
+        counters: RetryCounters instance that records the retries
+        description: description of the operation used in logs
+
+    Returns: result of the function
+    """
+
+    attempt = 1
+    error_class = None
+
+    while True:
+        try:
+            result = func()
+        except Exception as exc:
+            error_class = classify_error(exc)
+
+            if not policy.should_retry(attempt, error_class):
+                if counters:
+                    counters.increment(error_class, "exhausted")
+                raise
+
+            delay = policy.delay(attempt, error_class)
+            logging.info(
+                f"{description or 'Operation'} failed with {error_class.value} error, "
+                f"retry #{attempt} in {delay:.1f}s"
+            )
+
+            if counters:
+                counters.increment(error_class, "retried")
+
+            time.sleep(delay)
+            attempt += 1
+            continue
+
+        if error_class and counters:
+            counters.increment(error_class, "recovered")
+
+        return result
+
+
+async def aretry_call(
+    func: Callable,
+    policy: RetryPolicy,
+    counters: RetryCounters = None,
+    description: str = None,
+) -> Any:
+    """Asynchronous version of retry_call(). func should return an awaitable."""
+
+    attempt = 1
+    error_class = None
+
+    while True:
+        try:
+            result = await func()
+        except Exception as exc:
+            error_class = classify_error(exc)
+
+            if not policy.should_retry(attempt, error_class):
+                if counters:
+                    counters.increment(error_class, "exhausted")
+                raise
+
+            delay = policy.delay(attempt, error_class)
+            logging.info(
+                f"{description or 'Operation'} failed with {error_class.value} error, "
+                f"retry #{attempt} in {delay:.1f}s"
+            )
+
+            if counters:
+                counters.increment(error_class, "retried")
+
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+
+        if error_class and counters:
+            counters.increment(error_class, "recovered")
+
+        return result
+
+
+class RetryQueue:
+    """Parks failed work and retries it on background threads, so healthy batches keep
+    flowing. Every task is retried according to the policy until it succeeds or its
+    attempts are exhausted.
+    """
+
+    def __init__(self, policy: RetryPolicy, counters: RetryCounters = None, workers: int = 1):
+        """Initializes the queue. Worker threads are started with the first task.
+
+        Args:
+            policy: RetryPolicy instance
+            counters: RetryCounters instance that records the retries
+            workers: number of threads executing parked tasks
+        """
+
+        self.policy = policy
+        self.counters = counters or RetryCounters()
+
+        self._workers = workers
+        self._threads = []
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._unfinished = 0
+        self._closed = False
+
+    @property
+    def pending(self) -> int:
+        """Returns the number of parked tasks that are not finished yet."""
+
+        return self._unfinished
+
+    def submit(self, task: Callable, error: BaseException, description: str = None):
+        """Parks a task that failed on its first attempt.
+
+        Args:
+            task: function without arguments that retries the work
+            error: exception raised by the first attempt
+            description: description of the task used in logs
+
+        Returns: None
+        """
+
+        error_class = classify_error(error)
+
+        if not self.policy.should_retry(1, error_class):
+            self.counters.increment(error_class, "exhausted")
+            logging.info(f"{description or 'Task'} failed with {error_class.value} error --> {error}")
+            return
+
+        with self._condition:
+            self._start_workers()
+            self._unfinished += 1
+            self._schedule(task, attempt=1, error_class=error_class, description=description)
+
+    def join(self):
+        """Blocks until all parked tasks are finished."""
+
+        with self._condition:
+            while self._unfinished:
+                self._condition.wait()
+
+    def close(self):
+        """Finishes parked tasks and stops the worker threads."""
+
+        self.join()
+
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+        for thread in self._threads:
+            thread.join()
+
+        self._threads = []
+        self._closed = False
+
+    def _start_workers(self):
+        """Starts the worker threads unless they are running."""
+
+        if self._threads:
+            return
+
+        for i in range(self._workers):
+            thread = threading.Thread(target=self._run_worker, name=f"retry-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _schedule(self, task: Callable, attempt: int, error_class: ErrorClass, description: str):
+        """Puts the task into the heap with the due time of its next attempt."""
+
+        self.counters.increment(error_class, "retried")
+        due_time = time.monotonic() + self.policy.delay(attempt, error_class)
+        heapq.heappush(
+            self._heap,
+            (due_time, next(self._sequence), task, attempt, error_class, description),
+        )
+        self._condition.notify_all()
+
+    def _run_worker(self):
+        """Executes parked tasks when they become due."""
+
+        while True:
+            with self._condition:
+                while not self._closed and (
+                    not self._heap or self._heap[0][0] > time.monotonic()
+                ):
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._condition.wait(timeout=timeout)
+
+                if self._closed:
+                    return
+
+                _, _, task, attempt, error_class, description = heapq.heappop(self._heap)
+
+            try:
+                task()
+            except Exception as exc:
+                error_class = classify_error(exc)
+
+                with self._condition:
+                    if self.policy.should_retry(attempt + 1, error_class):
+                        self._schedule(task, attempt + 1, error_class, description)
+                        continue
+
+                    self.counters.increment(error_class, "exhausted")
+                    self._finish()
+
+                logging.exception(f"{description or 'Task'} failed after {attempt + 1} attempts")
+                continue
+
+            self.counters.increment(error_class, "recovered")
+
+            with self._condition:
+                self._finish()
+
+    def _finish(self):
+        """Marks a parked task as finished. Should be called holding the condition."""
+
+        self._unfinished -= 1
+        self._condition.notify_all()
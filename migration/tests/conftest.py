@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Modules import both migration.migration_utility and migration_utility
+MIGRATION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for path in (os.path.dirname(MIGRATION_DIR), MIGRATION_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,169 @@
+"""Tests of change data capture against DynamoDB Local streams and a local mongod.
+
+Set DYNAMODB_TEST_ENDPOINT_URL and MONGO_TEST_CONNECTION_STRING to run them against
+other servers, they are skipped when either server is not reachable.
+"""
+
+import os
+import uuid
+
+import boto3
+import pytest
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+# DynamoDB Local accepts any credentials
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "local")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "local")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from migration.migration_utility.configuration.db_configuration import DbConfigurator
+from migration.migration_utility.configuration.document_configuration import (
+    DocumentConfiguration,
+)
+from migration.migration_utility.configuration.migration_configuration import (
+    MigrationConfigurator,
+)
+from migration.migration_utility.controller.migration_controller import MigrationController
+
+ENDPOINT_URL = os.environ.get("DYNAMODB_TEST_ENDPOINT_URL", "http://localhost:8000")
+CONNECTION_STRING = os.environ.get("MONGO_TEST_CONNECTION_STRING", "mongodb://localhost:27017")
+# Stream reads until all records written before the replication are applied
+REPLICATION_DURATION = 3
+
+
+def dynamodb_local():
+    return boto3.client(
+        "dynamodb",
+        endpoint_url=ENDPOINT_URL,
+        config=Config(connect_timeout=1, read_timeout=5, retries={"max_attempts": 1}),
+    )
+
+
+def servers_available() -> bool:
+    try:
+        dynamodb_local().list_tables()
+        MongoClient(CONNECTION_STRING, serverSelectionTimeoutMS=500).admin.command("ping")
+    except (BotoCoreError, ClientError, PyMongoError):
+        return False
+
+    return True
+
+
+pytestmark = pytest.mark.skipif(
+    not servers_available(), reason="no DynamoDB Local or local mongod"
+)
+
+
+@pytest.fixture
+def table_name():
+    table_name = f"cdc_items_{uuid.uuid4().hex[:8]}"
+    dynamodb = dynamodb_local()
+    dynamodb.create_table(
+        TableName=table_name,
+        KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "id", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+        StreamSpecification={"StreamEnabled": True, "StreamViewType": "NEW_AND_OLD_IMAGES"},
+    )
+    dynamodb.get_waiter("table_exists").wait(TableName=table_name)
+
+    yield table_name
+
+    dynamodb.delete_table(TableName=table_name)
+
+
+@pytest.fixture
+def database_name():
+    database_name = f"cdc_test_{uuid.uuid4().hex[:8]}"
+
+    yield database_name
+
+    MongoClient(CONNECTION_STRING).drop_database(database_name)
+
+
+def document_configs(table_name: str):
+    return [
+        DocumentConfiguration(
+            type=model_type.lower(),
+            collection_name=table_name,
+            dest_db_suffix=f"_{model_type.lower()}",
+            queries=[{"field_name": "model_type", "operation": "eq", "value": model_type}],
+        )
+        for model_type in ("USER", "ORDER")
+    ]
+
+
+def replicate(table_name: str, database_name: str) -> int:
+    mongo_config = {
+        "database": "mongodb",
+        "connection_string": CONNECTION_STRING,
+        "database_name": database_name,
+        "batch_size": 25,
+    }
+    controller = MigrationController(
+        source_db_config=DbConfigurator(
+            database="dynamodb", batch_size=25, endpoint_url=ENDPOINT_URL
+        ),
+        destination_db_config=DbConfigurator(**mongo_config),
+        internal_db_config=DbConfigurator(**mongo_config),
+        document_configs=document_configs(table_name),
+        migration_config=MigrationConfigurator(
+            stream_poll_interval=0.1, stream_refresh_interval=0.5
+        ),
+    )
+
+    return controller.replicate_changes(duration=REPLICATION_DURATION).applied_count
+
+
+def put(table_name: str, doc_id: str, model_type: str, name: str):
+    dynamodb_local().put_item(
+        TableName=table_name,
+        Item={"id": {"S": doc_id}, "model_type": {"S": model_type}, "name": {"S": name}},
+    )
+
+
+def delete(table_name: str, doc_id: str):
+    dynamodb_local().delete_item(TableName=table_name, Key={"id": {"S": doc_id}})
+
+
+def destination(table_name: str, database_name: str, model_type: str) -> dict:
+    collection = MongoClient(CONNECTION_STRING)[database_name][
+        f"{table_name}_{model_type.lower()}"
+    ]
+
+    return {doc["_id"]: doc["name"] for doc in collection.find()}
+
+
+def test_changes_are_routed_by_their_configuration(table_name, database_name):
+    put(table_name, "u1", "USER", "ann")
+    put(table_name, "u2", "USER", "bob")
+    put(table_name, "o1", "ORDER", "book")
+    # MODIFY of a field
+    put(table_name, "u1", "USER", "anna")
+    # MODIFY that moves the document into another destination
+    put(table_name, "o1", "USER", "carl")
+    # REMOVE
+    delete(table_name, "u2")
+
+    replicate(table_name, database_name)
+
+    assert destination(table_name, database_name, "USER") == {"u1": "anna", "o1": "carl"}
+    assert destination(table_name, database_name, "ORDER") == {}
+
+
+def test_replication_resumes_after_the_checkpoint(table_name, database_name):
+    put(table_name, "u1", "USER", "ann")
+    put(table_name, "o1", "ORDER", "book")
+
+    assert replicate(table_name, database_name) == 2
+
+    put(table_name, "u2", "USER", "bob")
+    delete(table_name, "o1")
+
+    # Only the changes after the checkpointed sequence number are applied again
+    assert replicate(table_name, database_name) == 2
+    assert destination(table_name, database_name, "USER") == {"u1": "ann", "u2": "bob"}
+    assert destination(table_name, database_name, "ORDER") == {}
@@ -0,0 +1,220 @@
+"""Tests of the work queue of multi-node runs against a local mongod.
+
+Set MONGO_TEST_CONNECTION_STRING to run them against another server, they are skipped
+when no server is reachable.
+"""
+
+import os
+import time
+import uuid
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from migration.migration_utility.configuration.document_configuration import (
+    DocumentConfiguration,
+)
+from migration.migration_utility.configuration.migration_configuration import (
+    MigrationConfigurator,
+)
+from migration.migration_utility.controller.work_queue import (
+    SEEDED_MARKER_ID,
+    LeaseHeartbeat,
+    MongoWorkQueue,
+    WorkQueueRunner,
+)
+from migration.migration_utility.db_clients.mongodb.mongodb_client import MongoDbClient
+from migration_utility.enums import WorkUnitStatus
+
+CONNECTION_STRING = os.environ.get("MONGO_TEST_CONNECTION_STRING", "mongodb://localhost:27017")
+
+
+def mongod_available() -> bool:
+    try:
+        MongoClient(CONNECTION_STRING, serverSelectionTimeoutMS=500).admin.command("ping")
+    except PyMongoError:
+        return False
+
+    return True
+
+
+pytestmark = pytest.mark.skipif(not mongod_available(), reason="no local mongod")
+
+
+@pytest.fixture
+def db_client():
+    database_name = f"work_queue_test_{uuid.uuid4().hex[:8]}"
+    db_client = MongoDbClient(
+        batch_size=25, connection_string=CONNECTION_STRING, database_name=database_name
+    )
+
+    yield db_client
+
+    db_client.client_connector.client.drop_database(database_name)
+
+
+def make_queue(db_client, lease_duration: float = 30, max_attempts: int = 3) -> MongoWorkQueue:
+    return MongoWorkQueue(
+        db_client=db_client, lease_duration=lease_duration, max_attempts=max_attempts
+    )
+
+
+def document_configs():
+    return [
+        DocumentConfiguration(type="user", collection_name="users", queries=[]),
+        DocumentConfiguration(type="order", collection_name="orders", queries=[]),
+        DocumentConfiguration(type="order_copy", collection_name="orders", queries=[]),
+    ]
+
+
+def seed(work_queue: MongoWorkQueue, configs=None) -> int:
+    return work_queue.seed(
+        document_configs=configs if configs is not None else document_configs(),
+        scan_segments=1,
+        id_range_chunks=4,
+    )
+
+
+def unit_status(work_queue: MongoWorkQueue, unit_id: str) -> str:
+    return work_queue.collection.find_one({"_id": unit_id})["status"]
+
+
+def test_seed_is_idempotent(db_client):
+    work_queue = make_queue(db_client)
+
+    # Configurations with the same destination collection share a unit
+    assert seed(work_queue) == 2
+    assert seed(work_queue) == 0
+    assert work_queue.unfinished_count() == 2
+
+
+def test_concurrent_seed_does_not_duplicate_units(db_client):
+    work_queue = make_queue(db_client)
+    seed(work_queue)
+    # A worker that started seeding before the marker was written
+    work_queue.collection.delete_one({"_id": SEEDED_MARKER_ID})
+
+    assert seed(work_queue) == 0
+    assert work_queue.unfinished_count() == 2
+
+
+def test_lease_takes_pending_units_once(db_client):
+    work_queue = make_queue(db_client)
+    seed(work_queue)
+
+    first = work_queue.lease(worker_id="a")
+    second = work_queue.lease(worker_id="b")
+
+    assert {first.unit_id, second.unit_id} == {"collection:orders", "collection:users"}
+    assert first.attempts == second.attempts == 1
+    assert work_queue.lease(worker_id="c") is None
+
+
+def test_expired_lease_is_taken_over(db_client):
+    work_queue = make_queue(db_client, lease_duration=0.2)
+    seed(work_queue, configs=document_configs()[:1])
+
+    unit = work_queue.lease(worker_id="a")
+    assert work_queue.lease(worker_id="b") is None
+
+    time.sleep(0.3)
+    taken_over = work_queue.lease(worker_id="b")
+
+    assert taken_over.unit_id == unit.unit_id
+    assert taken_over.owner == "b"
+    assert taken_over.attempts == 2
+    assert not work_queue.complete(unit=unit, worker_id="a")
+    assert work_queue.complete(unit=taken_over, worker_id="b")
+    assert work_queue.unfinished_count() == 0
+
+
+def test_expired_lease_without_attempts_left_is_failed(db_client):
+    work_queue = make_queue(db_client, lease_duration=0.2, max_attempts=1)
+    seed(work_queue, configs=document_configs()[:1])
+
+    unit = work_queue.lease(worker_id="a")
+    time.sleep(0.3)
+
+    assert work_queue.lease(worker_id="b") is None
+    assert unit_status(work_queue, unit.unit_id) == WorkUnitStatus.FAILED.value
+    assert work_queue.unfinished_count() == 0
+
+
+def test_fail_marks_unit_failed_after_max_attempts(db_client):
+    work_queue = make_queue(db_client, max_attempts=2)
+    seed(work_queue, configs=document_configs()[:1])
+
+    unit = work_queue.lease(worker_id="a")
+    assert work_queue.fail(unit=unit, worker_id="a", error="first")
+    assert unit_status(work_queue, unit.unit_id) == WorkUnitStatus.PENDING.value
+
+    unit = work_queue.lease(worker_id="b")
+    assert unit.attempts == 2
+    assert work_queue.fail(unit=unit, worker_id="b", error="second")
+    assert unit_status(work_queue, unit.unit_id) == WorkUnitStatus.FAILED.value
+
+    assert work_queue.lease(worker_id="c") is None
+    assert work_queue.failed_count() == 1
+
+
+def test_heartbeat_extends_lease(db_client):
+    work_queue = make_queue(db_client, lease_duration=0.3)
+    seed(work_queue, configs=document_configs()[:1])
+    unit = work_queue.lease(worker_id="a")
+
+    with LeaseHeartbeat(work_queue=work_queue, unit=unit, worker_id="a", interval=0.05) as hb:
+        time.sleep(0.5)
+        assert work_queue.lease(worker_id="b") is None
+
+    assert not hb.lost
+    assert work_queue.complete(unit=unit, worker_id="a")
+
+
+def test_heartbeat_detects_lost_lease(db_client):
+    work_queue = make_queue(db_client)
+    seed(work_queue, configs=document_configs()[:1])
+    unit = work_queue.lease(worker_id="a")
+
+    with LeaseHeartbeat(work_queue=work_queue, unit=unit, worker_id="a", interval=0.05) as hb:
+        work_queue.collection.update_one({"_id": unit.unit_id}, {"$set": {"owner": "b"}})
+        time.sleep(0.2)
+
+    assert hb.lost
+
+
+class LeaseStealingController:
+    """Controller double whose unit is taken over by another worker mid-migration."""
+
+    def __init__(self, work_queue: MongoWorkQueue):
+        self.work_queue = work_queue
+        self.current_doc_cfg = None
+        self.migrated_total = 0
+
+    def assign(self, document_configs, assignment):
+        self.current_doc_cfg = next(iter(document_configs), None)
+        self.unit = assignment.unit
+
+    def migrate(self, force_migration: bool = False):
+        self.work_queue.collection.update_one({"_id": self.unit.unit_id}, {"$set": {"owner": "b"}})
+        time.sleep(0.2)
+
+
+def test_runner_does_not_complete_lost_unit(db_client):
+    work_queue = make_queue(db_client)
+    seed(work_queue, configs=document_configs()[:1])
+    runner = WorkQueueRunner(
+        work_queue=work_queue,
+        migration_config=MigrationConfigurator(
+            work_queue=True, lease_duration=1, heartbeat_interval=0.05
+        ),
+        document_configs_factory=lambda: document_configs()[:1],
+        controller_factory=lambda **kwargs: LeaseStealingController(work_queue),
+        scan_segments=1,
+        worker_id="a",
+    )
+
+    runner._run_unit(unit=work_queue.lease(worker_id="a"), force_migration=False)
+
+    assert unit_status(work_queue, "collection:users") == WorkUnitStatus.LEASED.value
+    assert work_queue.unfinished_count() == 1